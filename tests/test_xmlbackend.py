@@ -0,0 +1,117 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Conformance tests for the XML backends: every backend has to produce the same model and keys.
+
+Run with 'python -m unittest discover tests' from the repository root.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from enum import Enum
+
+from uml2latex import xmlbackend
+from uml2latex.bench import make_model, write_model
+from uml2latex.diagrams import make_all_single_class_diagrams
+from uml2latex.parse import UMLData
+from uml2latex.store import index_model_elements, diagram_key
+
+# Attribute order, namespace prefixes, comments and whitespace between elements
+# are the kind of things the backends may represent differently
+_snippet = b"""<?xml version="1.0" encoding="UTF-8"?>
+<XMI xmlns:UML="http://schema.omg.org/spec/UML/1.4" xmi.version="1.2">
+  <!-- a comment -->
+  <UML:Class name="Gr\xc3\xb6\xc3\x9fe &amp; Co" xmi.id="c1" comment="line&#10;break" visibility="public">
+    <UML:Classifier.feature>
+      <UML:Attribute xmi.id="a1" type="c1" name="self"/>
+    </UML:Classifier.feature>
+  </UML:Class>
+  <diagram name="d" xmi.id="d1"><widgets><classwidget xmi.id="c1" x="1" y="2"/></widgets></diagram>
+</XMI>
+"""
+
+def _plain(value):
+    """Turn parsed model objects into plain data that can be compared with ==."""
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if hasattr(value, "__dict__"):
+        return {k: _plain(v) for k, v in vars(value).items()}
+    return value
+
+def _model(umlData):
+    return {
+        "elements": [(xmiId, _plain(el)) for xmiId, el in umlData.elements.items()],
+        "packages": [(package.attrib["name"], [cl.xmiId for cl in classes])
+            for package, classes in umlData.packages.items()],
+        "class_diagrams": [d.attrib["name"] for d in umlData.class_diagram_list],
+        "sequence_diagrams": [d.attrib["name"] for d in umlData.sequence_diagram_list],
+        "names": umlData.names,
+    }
+
+class BackendConformanceTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if "lxml" not in xmlbackend.available_backends():
+            raise unittest.SkipTest("lxml is not installed, there is only one XML backend")
+        cls.default = xmlbackend.backend
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = write_model(make_model(300, 6), cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        xmlbackend.use(cls.default)
+        cls.directory.cleanup()
+
+    def _each_backend(self, function):
+        results = {}
+        for name in ("stdlib", "lxml"):
+            xmlbackend.use(name)
+            results[name] = function()
+        xmlbackend.use(self.default)
+        return results
+
+    def test_canonical(self):
+        results = self._each_backend(lambda: [xmlbackend.canonical(el)
+            for el in xmlbackend.parse(io.BytesIO(_snippet)).getroot().iter() if xmlbackend.is_element(el)])
+        self.assertEqual(results["stdlib"], results["lxml"])
+
+    def test_parsed_model(self):
+        results = self._each_backend(lambda: _model(UMLData.parse_uml(self.path)))
+        self.assertEqual(results["stdlib"], results["lxml"])
+
+    def test_diagram_keys(self):
+        def keys():
+            umlData = UMLData.parse_uml(self.path)
+            make_all_single_class_diagrams(umlData.tree, umlData.elements, {})
+            model_elements = index_model_elements(umlData.tree)
+            return {diagram.attrib["name"]: diagram_key(diagram, model_elements, "test")
+                    for diagram in umlData.tree.getroot().iter("diagram")}
+        results = self._each_backend(keys)
+        self.assertGreater(len(results["lxml"]), 300)
+        self.assertEqual(results["stdlib"], results["lxml"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A Python API for generating documentation in-process, independent of the command line.
+
+Typical use in a long-running build process:
+
+    from uml2latex.api import Project
+
+    project = Project("design.xmi")  # or the file's contents as bytes
+    result = project.generate({"%NOREF": "Foo\n"}, image_dir="outImages")
+    result.text    # The generated LaTeX
+    result.images  # The PDF files of all diagrams by diagram name
+    result.failures  # The diagrams that couldn't be rendered (empty if all were)
+
+The parsed model is kept by the Project, so it can generate any number of documents
+(e.g. with different overrides) without reading the XMI again.
+Several documents that share one set of rendered diagrams are generated with generate_targets:
+
+    project.generate_targets([Target("doc_de.tex"), Target("doc_en.tex", strings="en")],
+            image_dir="outImages")
+"""
+
+from uml2latex.parse import UMLData
+from uml2latex.override import Override
+
+class Result:
+    """The outcome of generating a document.
+
+    Attributes:
+        text: The generated LaTeX.
+        images: A dict of diagram names and the paths of the PDF files they were rendered to.
+            It is empty if no images were rendered.
+        pages: A dict of single class diagram names and their pages in the batched classes.pdf,
+            or None if diagrams were not batched.
+        failures: A list of the diagrams that couldn't be rendered, as dicts with the payload
+            of their diagram_failed events (name, tool and code, see events.py).
+            Their PDF files are missing or out of date; the list is empty if every diagram was rendered.
+    """
+
+    def __init__(self, text, images, pages, failures=None):
+        self.text = text
+        self.images = images
+        self.pages = pages
+        self.failures = failures if failures is not None else []
+
+class Target:
+    """One of several documents generated from the same project and images (see Project.generate_targets).
+
+    Attributes:
+        output: Where to write the generated LaTeX to (see Project.generate).
+        overrides: The template overrides of the document (see Project.generate).
+        strings: The string table of the document: the name of a built-in table,
+            the path of a JSON file or a dict (see tex/strings.py).
+    """
+
+    def __init__(self, output=None, overrides=None, strings="de"):
+        self.output = output
+        self.overrides = overrides
+        self.strings = strings
+
+def _make_strings(strings):
+    from uml2latex.tex.strings import load_strings
+
+    return strings if isinstance(strings, dict) else load_strings(strings)
+
+def _make_override(overrides):
+    if overrides is None:
+        return Override()
+    if isinstance(overrides, Override):
+        return overrides
+    if isinstance(overrides, str):
+        return Override(overrides)
+    return Override.from_mapping(overrides)
+
+def _write_output(text, output):
+    if output is None:
+        return
+    if callable(output):
+        output(text)
+    elif isinstance(output, str):
+        with open(output, "w") as f:
+            f.write(text)
+    else:
+        output.write(text)
+
+class Project:
+    """An Umbrello project that is parsed once and can then generate documents repeatedly.
+
+    Attributes:
+        umlData: The parsed UMLData of the project.
+    """
+
+    def __init__(self, xmi):
+        """Parse an Umbrello project.
+
+        Args:
+            xmi: The path of the XMI file, or its contents as bytes (optionally compressed).
+        """
+        self.umlData = UMLData.parse_uml(xmi)
+
+    def generate(self, overrides=None, image_dir=None, output=None, jobs=1, batch_classes=False, store=None,
+            compress_temp=False, converter="rsvg", compact=False, strings="de", fragments=None, scheduler=None):
+        """Generate the LaTeX documentation of the project.
+
+        Returns a Result.
+
+        Args:
+            overrides: The template overrides to use. Either an Override, a dict of override file names
+                and their contents, the path of an override directory, or None for no overrides.
+            image_dir: The directory to render diagrams into. If it is None, no diagrams are rendered
+                (like --no-pics) and nothing is written to the file system.
+            output: Where to write the generated LaTeX to in addition to returning it:
+                A path, a file object, a callable taking the text, or None.
+            jobs: The number of processes to generate class descriptions with.
+            batch_classes: Whether to convert all single class diagrams into one multi-page PDF.
+            store: An optional ImageStore to share rendered diagrams through.
+            compress_temp: Whether to pass the project to Umbrello as a compressed archive.
+            converter: The SVG converter to use ("rsvg" or "builtin", see images.converters).
+            compact: Whether to write class descriptions with the macros of the compact preamble.
+            strings: The string table to write the document with: the name of a built-in table,
+                the path of a JSON file or a dict (see tex/strings.py).
+            fragments: A FragmentCache (see tex/fragments.py) or the path of its file
+                to reuse unchanged class sections and module listings from, or None.
+                The cache is saved once the document is generated.
+            scheduler: The ToolScheduler (see scheduler.py) to run Umbrello and rsvg-convert with,
+                or None to use one with the default limits.
+        """
+        return self.generate_targets([Target(output, overrides, strings)], image_dir, jobs, batch_classes, store,
+                compress_temp, converter, compact, fragments, scheduler)[0]
+
+    def generate_targets(self, targets, image_dir=None, jobs=1, batch_classes=False, store=None,
+            compress_temp=False, converter="rsvg", compact=False, fragments=None, scheduler=None):
+        """Generate several documents of the project, rendering the diagrams only once.
+
+        The diagrams are rendered with the overrides of the first target.
+        Returns a list of Results, one for each target.
+
+        Args:
+            targets: A list of Targets.
+            For the other arguments, see generate.
+        """
+        from uml2latex.tex.generate import generate_latex
+        from uml2latex.tex.fragments import FragmentCache
+
+        if isinstance(fragments, str):
+            fragments = FragmentCache(fragments)
+        targets = [(target, _make_override(target.overrides), _make_strings(target.strings)) for target in targets]
+        images = {}
+        pages = None
+        failures = []
+        if image_dir is not None and targets:
+            (images, pages, failures) = self._render(targets[0][1], image_dir, batch_classes, store, compress_temp,
+                    converter, scheduler)
+        results = []
+        for target, override, strings in targets:
+            text = generate_latex(self.umlData, image_dir if image_dir is not None else "outImages",
+                    override, None, jobs, pages, compact, strings, fragments)
+            _write_output(text, target.output)
+            results.append(Result(text, images, pages, failures))
+        if fragments is not None:
+            fragments.save()
+        return results
+
+    def _render(self, override, image_dir, batch_classes, store, compress_temp, converter, scheduler):
+        from uml2latex.diagrams import make_all_single_class_diagrams, remove_single_class_diagrams
+        from uml2latex.images import render_images, load_page_index
+        from uml2latex import events
+
+        tree = self.umlData.tree
+        # The single class diagrams depend on the overrides, so they only stay in the tree for this run
+        diagrams = make_all_single_class_diagrams(tree, self.umlData.elements, override.custom_width)
+        failures = []
+        collect = lambda event: failures.append(event.payload) if event.kind == "diagram_failed" else None
+        events.subscribe(collect)
+        try:
+            batch = [d.attrib["name"] for d in diagrams] if batch_classes else None
+            images = render_images(tree, image_dir, store, compress_temp, batch, converter, scheduler)
+        finally:
+            events.unsubscribe(collect)
+            remove_single_class_diagrams(tree, diagrams)
+        return (images, load_page_index(image_dir) if batch_classes else None, failures)
+
+def generate(xmi, overrides=None, image_dir=None, output=None, **options):
+    """Parse an Umbrello project and generate its documentation in one go.
+
+    Returns a Result. See Project.generate for the arguments.
+    """
+    return Project(xmi).generate(overrides, image_dir, output, **options)
@@ -0,0 +1,654 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmarks for uml2latex on synthetic Umbrello models.
+
+Run with 'python -m uml2latex.bench <benchmark>'.
+"""
+
+import os
+import sys
+import time
+import subprocess
+import random
+import argparse
+import tempfile
+import xml.etree.ElementTree as ET
+
+_umlSchema = "{http://schema.omg.org/spec/UML/1.4}"
+
+def make_model(class_count, package_count, seed=0):
+    """Build a synthetic Umbrello XML tree with the project structure uml2latex expects.
+
+    Args:
+        class_count: The number of classes, interfaces and enums to create.
+        package_count: The number of packages to distribute them over.
+        seed: The seed for the random choices made while building the model.
+    """
+    rnd = random.Random(seed)
+    ET.register_namespace("UML", _umlSchema[1:-1])
+    root = ET.Element("XMI", {"xmi.version": "1.2"})
+    ET.SubElement(root, "XMI.header")
+    content = ET.SubElement(root, "XMI.content")
+    model = ET.SubElement(content, _umlSchema + "Model", {"xmi.id": "m1", "name": "UML Model"})
+    owned = ET.SubElement(model, _umlSchema + "Namespace.ownedElement")
+    for stereotype in ["folder", "datatype", "interface", "enum"]:
+        ET.SubElement(owned, _umlSchema + "Stereotype", {"xmi.id": stereotype, "name": stereotype})
+    logical_view = ET.SubElement(owned, _umlSchema + "Model", {"xmi.id": "Logical_View", "name": "Logical View"})
+    namespace = ET.SubElement(logical_view, _umlSchema + "Namespace.ownedElement")
+
+    datatypes = ET.SubElement(namespace, _umlSchema + "Package",
+            {"xmi.id": "Datatypes", "name": "Datatypes", "stereotype": "folder"})
+    datatype_namespace = ET.SubElement(datatypes, _umlSchema + "Namespace.ownedElement")
+    types = []
+    for name in ["int", "bool", "double", "std::vector<Foo>"]:
+        ET.SubElement(datatype_namespace, _umlSchema + "DataType", {"xmi.id": "dt_" + name, "name": name})
+        types.append("dt_" + name)
+
+    sequences = ET.SubElement(namespace, _umlSchema + "Package",
+            {"xmi.id": "Sequenzdiagramme", "name": "Sequenzdiagramme", "stereotype": "folder"})
+    ET.SubElement(sequences, _umlSchema + "Namespace.ownedElement")
+    sequence_diagrams = ET.SubElement(ET.SubElement(sequences, "XMI.extension", {"xmi.extender": "umbrello"}), "diagrams")
+    ET.SubElement(sequence_diagrams, "diagram", {"xmi.id": "seq1", "name": "Startup", "documentation": "", "type": "3"})
+
+    per_package = max(1, class_count // package_count)
+    classes = []
+    for p in range(package_count):
+        package = ET.SubElement(namespace, _umlSchema + "Package",
+                {"xmi.id": "pkg{}".format(p), "name": "package{}".format(p), "comment": "Package {}.".format(p)})
+        package_namespace = ET.SubElement(package, _umlSchema + "Namespace.ownedElement")
+        for c in range(per_package):
+            xmiId = "cls{}_{}".format(p, c)
+            tag = rnd.choice(["Class", "Class", "Class", "Interface", "Enumeration"])
+            cl = ET.SubElement(package_namespace, _umlSchema + tag,
+                    {"xmi.id": xmiId, "name": "Package{}Class{}".format(p, c), "comment": "Class {}.".format(c)})
+            classes.append(xmiId)
+            feature = ET.SubElement(cl, _umlSchema + "Classifier.feature")
+            for o in range(rnd.randint(0, 6)):
+                op = ET.SubElement(feature, _umlSchema + "Operation",
+                        {"xmi.id": "{}_op{}".format(xmiId, o), "name": "operation{}".format(o), "comment": "Does things."})
+                params = ET.SubElement(op, _umlSchema + "BehavioralFeature.parameter")
+                ET.SubElement(params, _umlSchema + "Parameter", {"xmi.id": "{}_op{}_ret".format(xmiId, o),
+                    "kind": "return", "type": rnd.choice(types + classes)})
+                for a in range(rnd.randint(0, 3)):
+                    ET.SubElement(params, _umlSchema + "Parameter", {"xmi.id": "{}_op{}_p{}".format(xmiId, o, a),
+                        "name": "arg{}".format(a), "type": rnd.choice(types + classes)})
+            for a in range(rnd.randint(0, 4)):
+                ET.SubElement(feature, _umlSchema + "Attribute", {"xmi.id": "{}_at{}".format(xmiId, a),
+                    "name": "attribute{}".format(a), "type": rnd.choice(types + classes)})
+
+    for i, xmiId in enumerate(classes[1:], 1):
+        r = rnd.random()
+        if r < 0.2:
+            ET.SubElement(namespace, _umlSchema + "Generalization",
+                    {"xmi.id": "gen{}".format(i), "child": xmiId, "parent": rnd.choice(classes[:i])})
+        elif r < 0.4:
+            ET.SubElement(namespace, _umlSchema + "Dependency",
+                    {"xmi.id": "dep{}".format(i), "client": xmiId, "supplier": rnd.choice(classes)})
+        elif r < 0.55:
+            association = ET.SubElement(namespace, _umlSchema + "Association",
+                    {"xmi.id": "assoc{}".format(i), "name": "association{}".format(i)})
+            connection = ET.SubElement(association, _umlSchema + "Association.connection")
+            ET.SubElement(connection, _umlSchema + "AssociationEnd", {"xmi.id": "assoc{}_a".format(i),
+                "type": xmiId, "name": "", "isNavigable": "false"})
+            ET.SubElement(connection, _umlSchema + "AssociationEnd", {"xmi.id": "assoc{}_b".format(i),
+                "type": rnd.choice(classes), "name": "target", "isNavigable": "true", "multiplicity": "0..*"})
+
+    class_diagrams = ET.SubElement(ET.SubElement(logical_view, "XMI.extension", {"xmi.extender": "umbrello"}), "diagrams")
+    for p in range(package_count):
+        diagram = ET.SubElement(class_diagrams, "diagram", {"xmi.id": "diag{}".format(p),
+            "name": "package{}".format(p), "documentation": "Package {}.".format(p), "type": "1"})
+        widgets = ET.SubElement(diagram, "widgets")
+        for xmiId in classes[p * per_package:p * per_package + 5]:
+            ET.SubElement(widgets, "classwidget", {"xmi.id": xmiId, "localid": "w" + xmiId})
+        ET.SubElement(diagram, "messages")
+        ET.SubElement(diagram, "associations")
+    return ET.ElementTree(root)
+
+def write_model(tree, directory):
+    """Write a synthetic model to a file in the given directory and return its path."""
+    path = os.path.join(directory, "model.xmi")
+    tree.write(path, xml_declaration=True, encoding="utf-8")
+    return path
+
+def measure(function, repeat):
+    """Call function repeat times and return the median run time in seconds and the last result."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return (times[len(times) // 2], result)
+
+def bench_descriptions(args):
+    """Compare serial and multi-process class description generation."""
+    from uml2latex.parse import UMLData
+    from uml2latex.override import Override
+    from uml2latex.tex.generate import generate_latex
+
+    with tempfile.TemporaryDirectory() as directory:
+        umlData = UMLData.parse_uml(write_model(make_model(args.classes, args.packages), directory))
+        # Heavy class overrides, which make the description stage expensive
+        override_dir = os.path.join(directory, "template_override")
+        os.mkdir(override_dir)
+        for cl in [el for el in umlData.elements.values() if hasattr(el, "package")]:
+            with open(os.path.join(override_dir, cl.name + "%CLASS"), "w") as f:
+                f.write("%HEADER\n%DESCRIPTION\n%FULL\n%OPERATIONS\n%USEDBY\n")
+        override = Override(override_dir)
+
+        (serial, expected) = measure(lambda: generate_latex(umlData, "outImages", override, jobs=1), args.repeat)
+        (parallel, result) = measure(lambda: generate_latex(umlData, "outImages", override, jobs=args.jobs), args.repeat)
+    if result != expected:
+        print("Output of the parallel run differs from the serial run!", file=sys.stderr)
+        return 1
+    print("descriptions: {} classes, {} packages".format(args.classes, args.packages))
+    print("  serial:    {:.3f}s".format(serial))
+    print("  {} jobs:    {:.3f}s ({:.2f}x)".format(args.jobs, parallel, serial / parallel))
+    return 0
+
+def _findall_parse(file):
+    """Parse a model the way parse_uml did before it walked the model once (see parse._ModelVisitor).
+
+    Kept as the reference the parse benchmark compares parse_uml against.
+    Every kind of element is looked up with its own find/findall scan of the package namespaces.
+    """
+    from uml2latex import xmlbackend
+    from uml2latex.compression import open_xmi
+    from uml2latex.data import ElementType, ClassType, Class, DataType, Template, Dependency, Association
+    from uml2latex.parse import UMLData, find_logical_view
+    from uml2latex.sizing import estimate_class_sizes
+    from uml2latex.utils import escape
+
+    with open_xmi(file) as f:
+        tree = xmlbackend.parse(f)
+    model_view = find_logical_view(tree)
+    namespace_root = model_view.find(_umlSchema + "Namespace.ownedElement")
+
+    package_list = [el for el in namespace_root.findall(_umlSchema + "Package")
+            if "stereotype" not in el.attrib or el.attrib["name"] != "Datatypes"]
+    package_list.append(model_view)
+    class_diagram_list = list(model_view.find("XMI.extension")[0].findall("diagram"))
+    sequence_root = next(el for el in namespace_root.findall(_umlSchema + "Package")
+            if el.attrib["name"] == "Sequenzdiagramme").find("XMI.extension")
+    sequence_diagram_list = list(sequence_root[0].findall("diagram")) if sequence_root is not None else []
+
+    elements = {}
+    packages = {}
+    for package in package_list:
+        package_namespace = package.find(_umlSchema + "Namespace.ownedElement")
+        class_list = package_namespace.findall(_umlSchema + "Class")
+        class_list.extend(package_namespace.findall(_umlSchema + "Interface"))
+        class_list.extend(package_namespace.findall(_umlSchema + "Enumeration"))
+        classes = []
+        for cl in class_list:
+            operations = []
+            attributes = []
+            template = None
+            classifier = cl.find(_umlSchema + "Classifier.feature")
+            if classifier is not None:
+                operations = [UMLData._parse_operation(op) for op in classifier.findall(_umlSchema + "Operation")]
+                attributes = [UMLData._parse_attribute(at) for at in classifier.findall(_umlSchema + "Attribute")]
+            model_element = cl.find(_umlSchema + "ModelElement.templateParameter")
+            if model_element is not None:
+                att = model_element[0].attrib
+                elements[att["xmi.id"]] = Template(escape(att["name"]), att["xmi.id"], att.get("type"),
+                        att.get("comment"))
+                template = att["xmi.id"]
+            class_type = ClassType.CLASS if "Class" in cl.tag else (
+                    ClassType.INTERFACE if "Interface" in cl.tag else ClassType.ENUM)
+            classes.append(Class(class_type, escape(cl.attrib["name"]), package.attrib["name"], cl.attrib["xmi.id"],
+                operations, attributes, None, template, cl.attrib.get("comment")))
+            elements[cl.attrib["xmi.id"]] = classes[-1]
+        packages[package] = [cl for cl in classes if cl.ty == ElementType.CLASS]
+
+    for datatype in namespace_root.find("./{0}Package/{0}Namespace.ownedElement".format(_umlSchema))\
+            .findall(_umlSchema + "DataType"):
+        elements[datatype.attrib["xmi.id"]] = DataType(escape(datatype.attrib["name"]), datatype.attrib["xmi.id"],
+                datatype.attrib.get("comment"))
+
+    for abstraction in namespace_root.findall(_umlSchema + "Abstraction"):
+        elements[abstraction.attrib["client"]].abstraction = abstraction.attrib["supplier"]
+        elements[abstraction.attrib["supplier"]].children.append(abstraction.attrib["client"])
+    for generalization in namespace_root.findall(_umlSchema + "Generalization"):
+        elements[generalization.attrib["child"]].abstraction = generalization.attrib["parent"]
+        elements[generalization.attrib["parent"]].children.append(generalization.attrib["child"])
+    for dependency in namespace_root.findall(_umlSchema + "Dependency"):
+        if dependency.attrib["client"] in elements and dependency.attrib["supplier"] in elements:
+            elements[dependency.attrib["client"]].dependencies.append(Dependency(dependency.attrib["supplier"],
+                dependency.attrib.get("comment")))
+    for association in namespace_root.findall(_umlSchema + "Association"):
+        for start in association[0]:
+            for end in association[0]:
+                client = start.attrib["type"]
+                target = end.attrib["type"]
+                if start == end or client not in elements or target not in elements \
+                        or any(a.target == target for a in elements[target].associations) \
+                        or end.attrib["isNavigable"] == "false":
+                    continue
+                elements[client].associations.append(Association(
+                    end.attrib["name"] if len(end.attrib["name"]) > 0 else association.attrib["name"],
+                    target, end.attrib.get("multiplicity"), end.attrib.get("comment")))
+
+    UMLData._index_usages(elements)
+    UMLData._index_inheritance(elements)
+    names = {el.attrib["xmi.id"]: el.attrib["name"] for el in namespace_root.iter()
+            if "xmi.id" in el.attrib and "name" in el.attrib}
+    estimate_class_sizes([el for el in elements.values() if el.ty == ElementType.CLASS], names)
+    return UMLData(tree, packages, elements, class_diagram_list, sequence_diagram_list, names)
+
+def bench_parse(args):
+    """Compare parsing a synthetic model with parse_uml and with the findall-based reference parser.
+
+    The LaTeX generated from both models has to be identical.
+    """
+    from uml2latex.parse import UMLData
+    from uml2latex.override import Override
+    from uml2latex.tex.generate import generate_latex
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_model(make_model(args.classes, args.packages), directory)
+        (reference, expected) = measure(lambda: _findall_parse(path), args.repeat)
+        (duration, umlData) = measure(lambda: UMLData.parse_uml(path), args.repeat)
+        override = Override(os.path.join(directory, "template_override"))
+        if generate_latex(umlData, "outImages", override) != generate_latex(expected, "outImages", override):
+            print("parse_uml and the reference parser produce different output!", file=sys.stderr)
+            return 1
+    print("parse: {} classes, {} packages".format(args.classes, args.packages))
+    print("  findall:   {:.3f}s".format(reference))
+    print("  parse_uml: {:.3f}s ({} elements, {:.2f}x)".format(duration, len(umlData.elements),
+        reference / duration))
+    return 0
+
+def import_time(arguments):
+    """Run uml2latex with the given arguments under 'python -X importtime'.
+
+    Returns the total import time in seconds and a list of (cumulative time, module) pairs
+    for the top-level imports, slowest first.
+    """
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uml2latex.py")
+    result = subprocess.run([sys.executable, "-X", "importtime", script] + arguments,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    total = 0
+    top_level = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, module = line[len("import time:"):].split("|")
+        total += int(own)
+        # Top-level imports are indented by a single space
+        if not module.startswith("  "):
+            top_level.append((int(cumulative) / 1e6, module.strip()))
+    top_level.sort(reverse=True)
+    return (total / 1e6, top_level)
+
+def bench_startup(args):
+    """Report the import time of uml2latex's startup paths."""
+    with tempfile.TemporaryDirectory() as directory:
+        model = write_model(make_model(10, 2), directory)
+        output = os.path.join(directory, "out.tex")
+        modes = [
+            ("--help", ["--help"]),
+            ("--no-pics", ["-n", "-t", directory, "-o", output, model]),
+        ]
+        print("startup import time (python -X importtime)")
+        for name, arguments in modes:
+            (total, top_level) = min((import_time(arguments) for _ in range(args.repeat)), key=lambda x: x[0])
+            print("  {:<10} {:.1f}ms".format(name, total * 1000))
+            for cumulative, module in top_level[:5]:
+                print("      {:7.1f}ms {}".format(cumulative * 1000, module))
+    return 0
+
+def make_class_svg(cl, names):
+    """Return an SVG document like the one Umbrello exports for a single class diagram.
+
+    The markup follows the output of Qt's SVG generator: nested groups with transforms
+    and presentation attributes, a rect for the class box, polylines between compartments
+    and one text element per line.
+    """
+    from uml2latex.sizing import class_lines, line_height
+
+    height = line_height()
+    (width, box_height) = (cl.approx_width, cl.approx_height)
+    group = ('<g fill="{0}" fill-opacity="1" stroke="{1}" stroke-opacity="1" stroke-width="1" '
+            'stroke-linecap="square" stroke-linejoin="bevel" transform="matrix(1,0,0,1,0,0)" '
+            'font-family="Noto Sans Mono" font-size="12" font-weight="{2}" font-style="normal">')
+    body = group.format("#ffffc0", "#ff0000", "400")
+    body += '<rect x="0" y="0" width="{}" height="{}"/>'.format(width, box_height)
+    body += "</g>"
+    y = 5
+    for compartment in class_lines(cl, names):
+        if y > 5:
+            body += group.format("none", "#ff0000", "400")
+            body += '<polyline fill="none" vector-effect="none" points="0,{0} {1},{0}"/></g>'.format(y, width)
+        for line in compartment:
+            y += height
+            body += group.format("#000000", "none", "700" if y - height <= 5 else "400")
+            body += '<text fill="#000000" fill-opacity="1" stroke="none" xml:space="preserve" x="5" y="{}" ' \
+                    'font-family="Noto Sans Mono" font-size="12" font-weight="400" font-style="normal">{}</text></g>' \
+                    .format(y - 4, line.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;"))
+        y += 10
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+            '<svg width="{0}" height="{1}" viewBox="0 0 {0} {1}" xmlns="http://www.w3.org/2000/svg" '
+            'version="1.2" baseProfile="tiny"><title>Diagram</title><desc>Generated with Qt</desc>'
+            '<defs></defs>{2}</svg>\n').format(width + 20, box_height + 20, body)
+
+def bench_convert(args):
+    """Compare the built-in SVG converter with rsvg-convert processes.
+
+    Converts --diagrams single class diagrams of a synthetic model (or the SVG files in --svgs).
+    """
+    import glob
+    import shutil
+    from uml2latex.images import convert_svg
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.svgs is not None:
+            sources = sorted(glob.glob(os.path.join(args.svgs, "*.svg")))
+        else:
+            from uml2latex.parse import UMLData
+            from uml2latex.data import ElementType
+
+            umlData = UMLData.parse_uml(write_model(make_model(args.diagrams, 4), directory))
+            names = {xmiId: el.name.replace("\\_", "_") for xmiId, el in umlData.elements.items()}
+            sources = []
+            for i, cl in enumerate(el for el in umlData.elements.values() if el.ty == ElementType.CLASS):
+                sources.append(os.path.join(directory, "source{}.svg".format(i)))
+                with open(sources[-1], "w") as f:
+                    f.write(make_class_svg(cl, names))
+
+        work = os.path.join(directory, "work")
+        os.mkdir(work)
+        files = [shutil.copy(source, os.path.join(work, "{}.svg".format(i))) for i, source in enumerate(sources)]
+        converters = ["builtin"] + (["rsvg"] if shutil.which("rsvg-convert") else [])
+        print("convert: {} diagrams".format(len(files)))
+        for converter in converters:
+            (duration, _) = measure(lambda: [convert_svg(file, converter) for file in files], args.repeat)
+            size = sum(os.path.getsize(file[:-3] + "pdf") for file in files)
+            print("  {:<8} {:.3f}s ({:.0f} diagrams/s, {} KiB of PDF)".format(converter, duration,
+                len(files) / duration, size // 1024))
+    return 0
+
+def bench_xml(args):
+    """Compare parsing and writing a synthetic model with every available XML backend.
+
+    The LaTeX generated from the trees of all backends has to be identical,
+    and so do the image store keys of all diagrams (including the single class diagrams).
+    """
+    import io
+    from uml2latex import xmlbackend
+    from uml2latex.diagrams import make_all_single_class_diagrams
+    from uml2latex.store import index_model_elements, diagram_key
+    from uml2latex.parse import UMLData
+    from uml2latex.override import Override
+    from uml2latex.tex.generate import generate_latex
+
+    default = xmlbackend.backend
+    outputs = {}
+    keys = {}
+    print("xml: {} classes, {} packages".format(args.classes, args.packages))
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_model(make_model(args.classes, args.packages), directory)
+        override = Override(os.path.join(directory, "template_override"))
+        for name in xmlbackend.available_backends():
+            xmlbackend.use(name)
+            (parse_time, umlData) = measure(lambda: UMLData.parse_uml(path), args.repeat)
+            (write_time, _) = measure(lambda: xmlbackend.write(umlData.tree, io.BytesIO()), args.repeat)
+            outputs[name] = generate_latex(umlData, "outImages", override)
+            make_all_single_class_diagrams(umlData.tree, umlData.elements, override.custom_width)
+            model_elements = index_model_elements(umlData.tree)
+            keys[name] = {diagram.attrib["name"]: diagram_key(diagram, model_elements, "bench")
+                    for diagram in umlData.tree.getroot().iter("diagram")}
+            print("  {}: parse {:.3f}s, write {:.3f}s".format(name, parse_time, write_time))
+    xmlbackend.use(default)
+    if len(set(outputs.values())) > 1:
+        print("The XML backends produce different output!", file=sys.stderr)
+        return 1
+    if any(backend_keys != keys[default] for backend_keys in keys.values()):
+        print("The XML backends produce different image store keys!", file=sys.stderr)
+        return 1
+    return 0
+
+# Stand-ins for Umbrello and rsvg-convert, so that the image pipeline can be measured without them.
+# They do the least work that keeps the pipeline going: one SVG per diagram, one PDF per SVG.
+_stand_in_umbrello = """#!{python}
+import os, sys, tarfile
+import xml.etree.ElementTree as ET
+args = sys.argv[1:]
+if "--version" in args:
+    print("umbrello5 stand-in")
+    sys.exit(0)
+directory = args[args.index("--directory") + 1]
+source = tarfile.open(args[-1]).extractfile("project.xmi") if args[-1].endswith(".tgz") else args[-1]
+for diagram in ET.parse(source).getroot().iter("diagram"):
+    with open(os.path.join(directory, diagram.attrib["name"] + ".svg"), "w") as f:
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" width="400" height="300"><rect width="10" height="10"/></svg>')
+"""
+
+_stand_in_rsvg = """#!{python}
+import sys
+args = sys.argv[1:]
+if "--version" in args:
+    print("rsvg-convert stand-in")
+    sys.exit(0)
+output = args[args.index("-o") + 1] if "-o" in args else None
+data = b"%PDF-1.4 stand-in\\n" * len([a for a in args if a.endswith(".svg")])
+if output is None:
+    sys.stdout.buffer.write(data)
+else:
+    with open(output, "wb") as f:
+        f.write(data)
+"""
+
+def install_stand_ins(directory):
+    """Write stand-in umbrello5 and rsvg-convert executables to directory and put it first on the PATH."""
+    for name, script in [("umbrello5", _stand_in_umbrello), ("rsvg-convert", _stand_in_rsvg)]:
+        path = os.path.join(directory, name)
+        with open(path, "w") as f:
+            f.write(script.format(python=sys.executable))
+        os.chmod(path, 0o755)
+    os.environ["PATH"] = directory + os.pathsep + os.environ.get("PATH", "")
+
+def _profile(function):
+    """Return the time spent in every function of uml2latex while calling function.
+
+    The time of a function includes the library code it calls, but not the other
+    functions of uml2latex it calls, so a slowdown shows up in the function that caused it.
+    """
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.runcall(function)
+    stats = pstats.Stats(profiler).stats
+    root = os.path.dirname(os.path.abspath(__file__))
+    ours = {key for key in stats if key[0].startswith(root) and key[0] != os.path.abspath(__file__)}
+    # Time spent in callees from uml2latex, by caller
+    callee_time = {}
+    for key in ours:
+        for caller, (_, _, _, cumulative) in stats[key][4].items():
+            callee_time[caller] = callee_time.get(caller, 0) + cumulative
+    functions = {}
+    for key in ours:
+        name = "{}:{}".format(os.path.relpath(key[0], root), key[2])
+        functions[name] = functions.get(name, 0) + max(stats[key][3] - callee_time.get(key, 0), 0)
+    return functions
+
+def _suite_stage(stage, path, repeat):
+    """Measure one stage of the pipeline. Runs in a fresh process, so that its peak RSS can be taken."""
+    import resource
+    from uml2latex.parse import UMLData
+    from uml2latex.override import Override
+    from uml2latex.tex.generate import generate_latex
+    from uml2latex.diagrams import make_all_single_class_diagrams, remove_single_class_diagrams
+    from uml2latex.images import render_images
+
+    override = Override()
+    if stage == "parse":
+        function = lambda: UMLData.parse_uml(path)
+        size = lambda umlData: len(umlData.elements)
+    else:
+        umlData = UMLData.parse_uml(path)
+        if stage == "inject":
+            def function():
+                diagrams = make_all_single_class_diagrams(umlData.tree, umlData.elements, override.custom_width)
+                remove_single_class_diagrams(umlData.tree, diagrams)
+                return diagrams
+            size = len
+        elif stage == "generate_latex":
+            function = lambda: generate_latex(umlData, "outImages", override)
+            size = lambda latex: len(latex.encode("utf-8"))
+        elif stage == "images":
+            def function():
+                diagrams = make_all_single_class_diagrams(umlData.tree, umlData.elements, override.custom_width)
+                try:
+                    # A fresh directory every time, so that nothing is skipped as up to date
+                    with tempfile.TemporaryDirectory() as directory:
+                        images = render_images(umlData.tree, directory)
+                        return sum(os.path.getsize(image) for image in set(images.values()) if os.path.exists(image))
+                finally:
+                    remove_single_class_diagrams(umlData.tree, diagrams)
+            size = lambda total: total
+    (duration, result) = measure(function, repeat)
+    return {"time": duration, "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "size": size(result), "functions": _profile(function)}
+
+# The stages of the suite. All of them run on a model with --classes classes, except for the image
+# pipeline, which starts processes per diagram and therefore runs on a model with --diagrams classes.
+_suite_stages = ["parse", "inject", "generate_latex", "images"]
+
+def run_suite(args):
+    """Run every stage of the suite and return the results as a dict (see bench_suite)."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = {"config": {"classes": args.classes, "packages": args.packages, "diagrams": args.diagrams},
+            "stages": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        install_stand_ins(directory)
+        models = {
+                "full": write_model(make_model(args.classes, args.packages), directory),
+                "images": os.path.join(directory, "images.xmi"),
+                }
+        make_model(args.diagrams, 4).write(models["images"], xml_declaration=True, encoding="utf-8")
+        for stage in _suite_stages:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                results["stages"][stage] = executor.submit(_suite_stage, stage,
+                        models["images" if stage == "images" else "full"], args.repeat).result()
+    return results
+
+# Functions faster than this (in seconds) are too noisy to be compared
+_min_function_time = 0.005
+
+def compare_suite(baseline, results, tolerances):
+    """Compare suite results against a baseline.
+
+    Returns a list of report lines and whether anything regressed.
+
+    Args:
+        baseline: The results of an earlier run (see run_suite).
+        results: The results of the current run.
+        tolerances: A dict of metrics ("time", "rss", "size") and the relative increase allowed for them.
+    """
+    lines = []
+    regressed = False
+    if baseline.get("config") != results["config"]:
+        lines.append("warning: the baseline was recorded with {}".format(baseline.get("config")))
+    for stage, current in results["stages"].items():
+        if stage not in baseline["stages"]:
+            lines.append("{}: not in the baseline".format(stage))
+            continue
+        old = baseline["stages"][stage]
+        for metric, tolerance in tolerances.items():
+            change = (current[metric] - old[metric]) / old[metric] if old[metric] else 0
+            failed = change > tolerance
+            regressed = regressed or failed
+            lines.append("{}{:<16} {:<5} {:>12.4g} -> {:<12.4g} {:+7.1%}".format("!! " if failed else "   ",
+                stage, metric, old[metric], current[metric], change))
+            if failed and metric == "time":
+                lines.extend(_slower_functions(old["functions"], current["functions"], tolerance))
+    return (lines, regressed)
+
+def _slower_functions(old, current, tolerance):
+    slower = []
+    for function, duration in current.items():
+        before = old.get(function, 0)
+        if max(duration, before) >= _min_function_time and duration > before * (1 + tolerance):
+            slower.append((duration - before, function, before, duration))
+    slower.sort(reverse=True)
+    return ["       slower: {} {:.4f}s -> {:.4f}s".format(function, before, duration)
+            for _, function, before, duration in slower[:5]]
+
+def bench_suite(args):
+    """Run the benchmark suite over parsing, diagram injection, generate_latex and the image pipeline.
+
+    For every stage, the median time, the peak RSS (in KiB) of the process running it,
+    the size of its output and the cumulative time of every uml2latex function are recorded.
+    With --record, the results are written to a baseline file.
+    With --compare, they are compared against one, and the exit code is 1 if a metric
+    grew by more than its tolerance. The functions that got slower are listed for every slower stage.
+    """
+    import json
+
+    results = run_suite(args)
+    if args.record is not None:
+        with open(args.record, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.compare is None:
+        for stage, result in results["stages"].items():
+            print("{:<16} {:.3f}s {:>8} KiB  size {}".format(stage, result["time"], result["rss"], result["size"]))
+        return 0
+    with open(args.compare, "r") as f:
+        baseline = json.load(f)
+    (lines, regressed) = compare_suite(baseline, results,
+            {"time": args.time_tolerance, "rss": args.rss_tolerance, "size": args.size_tolerance})
+    print("\n".join(lines))
+    if regressed:
+        print("Performance regressed against {}".format(args.compare), file=sys.stderr)
+        return 1
+    return 0
+
+_benchmarks = {
+        "convert": bench_convert,
+        "descriptions": bench_descriptions,
+        "parse": bench_parse,
+        "startup": bench_startup,
+        "suite": bench_suite,
+        "xml": bench_xml,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark uml2latex on synthetic models")
+    parser.add_argument("benchmark", choices=list(_benchmarks), help="The benchmark to run")
+    parser.add_argument("-c", "--classes", default=2000, type=int, help="The number of classes in the model (2000 by default)")
+    parser.add_argument("-p", "--packages", default=16, type=int, help="The number of packages in the model (16 by default)")
+    parser.add_argument("-j", "--jobs", default=os.cpu_count(), type=int, help="The number of processes for parallel stages (all CPUs by default)")
+    parser.add_argument("-d", "--diagrams", default=300, type=int, help="The number of diagrams to convert (300 by default)")
+    parser.add_argument("--svgs", default=None, help="A directory of SVG files exported by Umbrello to convert instead of synthetic diagrams")
+    parser.add_argument("-r", "--repeat", default=3, type=int, help="How often to repeat each measurement (3 by default)")
+    parser.add_argument("--record", default=None, help="Write the results of the suite to the given baseline file")
+    parser.add_argument("--compare", default=None, help="Compare the results of the suite against the given baseline file")
+    parser.add_argument("--time-tolerance", default=0.15, type=float, help="The relative time increase the suite tolerates (0.15 by default)")
+    parser.add_argument("--rss-tolerance", default=0.10, type=float, help="The relative peak RSS increase the suite tolerates (0.10 by default)")
+    parser.add_argument("--size-tolerance", default=0.01, type=float, help="The relative output size increase the suite tolerates (0.01 by default)")
+    args = parser.parse_args()
+    return _benchmarks[args.benchmark](args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for checking template overrides against the model without rendering anything.
+
+The checks catch what would otherwise only show up after rendering and running pdflatex:
+links without a matching label, types that can't be resolved,
+override files that don't apply to anything and order lists that don't match the model.
+"""
+
+from uml2latex.tex.classes import description_ids
+from uml2latex.tex.generate import sort_packages, has_descriptions
+from uml2latex.tex.references import ReferenceTable
+from uml2latex.utils import escape
+
+def _unknown(kind, name, names):
+    """Describe a name that isn't among the given names, with a hint if it only lacks escaping."""
+    if escape(name) in names:
+        return "no {0} named {1} (names are matched as they appear in LaTeX: {2})".format(kind, name,
+                escape(name))
+    return "no {0} named {1}".format(kind, name)
+
+def _check_order(problems, filename, kind, order, names):
+    """Check an order list (see tex/generate.py:_sort_by_order) against the names it is applied to.
+
+    Everything that isn't listed is left out of the document, so missing names are reported too.
+    """
+    if not order:
+        return
+    listed = set()
+    for name in order:
+        if not name:
+            continue
+        listed.add(name)
+        if name not in names:
+            problems.append((filename, _unknown(kind, name, names)))
+    for name in names:
+        if name not in listed:
+            problems.append((filename, "{0} {1} isn't listed and is left out".format(kind, name)))
+
+def _check_names(problems, suffix, kind, names, known):
+    for name in names:
+        if name not in known:
+            problems.append((name + suffix, _unknown(kind, name, known)))
+
+def _check_types(problems, packages, elements):
+    for _, classes in packages:
+        for cl in classes:
+            for op in cl.operations:
+                types = [param.type for param in op.parameters]
+                if op.return_type is not None:
+                    types.append(op.return_type)
+                if any(ty not in elements for ty in types):
+                    problems.append((cl.name, "operation {0} uses a type that isn't in the model".format(op.name)))
+            for at in cl.attributes:
+                if at.type is not None and at.type not in elements:
+                    problems.append((cl.name, "attribute {0} has a type that isn't in the model".format(at.name)))
+
+def check(umlData, override):
+    """Check the given overrides against the model and every reference the document would contain.
+
+    Returns a list of (file or class name, message) pairs, empty if everything is fine.
+
+    Args:
+        umlData: The parsed UMLData.
+        override: The loaded Override information.
+    """
+    problems = [(name, "not an override file") for name in override.unknown]
+    problems.extend(override.invalid)
+
+    class_diagrams = [d.attrib["name"] for d in umlData.class_diagram_list]
+    sequence_diagrams = [d.attrib["name"] for d in umlData.sequence_diagram_list]
+    packages = {package.attrib["name"]: classes for package, classes in umlData.packages.items()}
+    class_names = {cl.name for classes in packages.values() for cl in classes}
+    element_names = {el.name for el in umlData.elements.values()}
+
+    _check_order(problems, "%DIAGRAM_ORDER", "class diagram", override.diagram_order, class_diagrams)
+    _check_order(problems, "%SEQUENCE_DIAGRAM_ORDER", "sequence diagram", override.sequence_diagram_order,
+            sequence_diagrams)
+    _check_order(problems, "%MODULE_ORDER", "package", override.module_list_order, list(packages))
+    for package, order in override.module_order.items():
+        if package not in packages:
+            problems.append((package + "%ORDER", _unknown("package", package, packages)))
+        else:
+            _check_order(problems, package + "%ORDER", "class", order, [cl.name for cl in packages[package]])
+
+    _check_names(problems, "%LISTING", "package", override.module_listing, packages)
+    _check_names(problems, "%DIAGRAM", "diagram", override.diagrams, set(class_diagrams + sequence_diagrams))
+    _check_names(problems, "%CLASS", "class", override.classes, class_names)
+    for name in override.noref:
+        if name and name not in element_names:
+            problems.append(("%NOREF", _unknown("class or data type", name, element_names)))
+    for name in override.custom_width:
+        if name not in class_names:
+            problems.append(("%CUSTOM_WIDTH", _unknown("class", name, class_names)))
+
+    # The same references the class descriptions are generated with,
+    # including those of %USEDBY, %INHERITED and %ALLCHILDREN where they are used
+    sorted_packages = sort_packages(umlData, override)
+    ids = lambda cl, elements: description_ids(cl, elements, override.classes)
+    refs = ReferenceTable(umlData.elements, override.noref)
+    for name, target in refs.broken_references(sorted_packages, umlData.elements, has_descriptions(override), ids):
+        problems.append((name, "broken reference to {0}".format(target)))
+    _check_types(problems, sorted_packages, umlData.elements)
+    return problems
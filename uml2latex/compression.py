@@ -0,0 +1,82 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for reading compressed Umbrello files without decompressing them to disk."""
+
+import io
+
+# The compression modules are only imported once a compressed file is found
+
+def _open_gzip(file):
+    import gzip
+    return gzip.open(file, "rb")
+
+def _open_bz2(file):
+    import bz2
+    return bz2.open(file, "rb")
+
+def _open_xz(file):
+    import lzma
+    return lzma.open(file, "rb")
+
+def _open_zstd(file):
+    try:
+        # Python 3.14+
+        from compression import zstd
+        return zstd.open(file, "rb")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Reading zstd compressed files requires the zstandard module")
+    if isinstance(file, io.BytesIO):
+        return zstandard.ZstdDecompressor().stream_reader(file, closefd=True)
+    return zstandard.ZstdDecompressor().stream_reader(open(file, "rb"), closefd=True)
+
+# Magic numbers of the supported compression formats and functions to open them with
+_formats = [
+    (b"\x1f\x8b", _open_gzip),
+    (b"BZh", _open_bz2),
+    (b"\xfd7zXZ\x00", _open_xz),
+    (b"\x28\xb5\x2f\xfd", _open_zstd),
+]
+
+def open_xmi(file):
+    """Open an XMI file for reading, decompressing it on the fly if necessary.
+
+    gzip, bzip2, xz and (if a zstd module is available) zstd compressed files are detected
+    by their content, not their name. Returns a binary file object.
+
+    Args:
+        file: The path of the file to open, or the contents of the file as bytes.
+    """
+    if isinstance(file, (bytes, bytearray)):
+        magic = bytes(file[:6])
+        source = io.BytesIO(file)
+    else:
+        with open(file, "rb") as f:
+            magic = f.read(6)
+        source = file
+    for prefix, opener in _formats:
+        if magic.startswith(prefix):
+            return opener(source)
+    if isinstance(source, io.BytesIO):
+        return source
+    return open(source, "rb")
@@ -45,21 +45,30 @@ class Class:
         name: The class name.
         package: Which package the class is a member of.
         xmiId: The XMI ID of the class, used for references.
-        operations: Functions and methods defined on the class.
+        operations: Operations (functions and methods) defined on the class.
         attributes: Attributes of the class.
         abstraction: Classes / interfaces the class inherits from.
         children: Classes that inherit from the class.
+        ancestors: The XMI IDs of all classes the class inherits from, directly or indirectly,
+            nearest first.
+        descendants: The XMI IDs of all classes that inherit from the class, directly or indirectly,
+            in depth-first order.
+            Both are filled in once by parse_uml.
         template: Template parameters (generics) of the class.
         docs: Documentation associated with the class.
         dependencies: Objects the class depends on.
         associations: Objects the class is associated with.
-        approx_height: An approximation for the height of the class in a UML diagram.
+        used_by: Classes that depend on, are associated with,
+            or use the class as a parameter, return or attribute type.
+        approx_width: An estimate of the width of the class in a UML diagram in pixels.
+        approx_height: An estimate of the height of the class in a UML diagram in pixels.
+            Both are filled in by sizing.estimate_class_sizes.
     """
 
     ty = ElementType.CLASS
 
     def __init__(self, class_type, name, package, xmiId, operations,
-            attributes, abstraction, template, docs, approx_height):
+            attributes, abstraction, template, docs):
         self.class_type = class_type
         self.name = name
         self.package = package
@@ -68,11 +77,66 @@ class Class:
         self.attributes = attributes
         self.abstraction = abstraction
         self.children = list()
+        self.ancestors = list()
+        self.descendants = list()
         self.template = template
         self.docs = docs
         self.dependencies = list()
         self.associations = list()
-        self.approx_height = approx_height
+        self.used_by = list()
+        self.approx_width = None
+        self.approx_height = None
+
+class Operation:
+    """An operation (function or method) of a class.
+
+    Attributes:
+        name: The name of the operation.
+        xmiId: The XMI ID of the operation.
+        parameters: A list of the Parameters of the operation, excluding the return value.
+        return_type: The XMI ID of the return type,
+            or None if the operation doesn't have a return parameter.
+        visibility: The visibility of the operation ("public", "private", ...).
+        docs: Documentation associated with the operation.
+    """
+
+    def __init__(self, name, xmiId, parameters, return_type, visibility, docs):
+        self.name = name
+        self.xmiId = xmiId
+        self.parameters = parameters
+        self.return_type = return_type
+        self.visibility = visibility
+        self.docs = docs
+
+class Parameter:
+    """A parameter of an operation.
+
+    Attributes:
+        name: The name of the parameter.
+        type: The XMI ID of the type of the parameter.
+    """
+
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+
+class Attribute:
+    """An attribute of a class.
+
+    Attributes:
+        name: The name of the attribute.
+        xmiId: The XMI ID of the attribute.
+        type: The XMI ID of the type of the attribute, or None if it has no type.
+        visibility: The visibility of the attribute ("public", "private", ...).
+        docs: Documentation associated with the attribute.
+    """
+
+    def __init__(self, name, xmiId, type, visibility, docs):
+        self.name = name
+        self.xmiId = xmiId
+        self.type = type
+        self.visibility = visibility
+        self.docs = docs
 
 class DataType:
     """A data type defined in UML.
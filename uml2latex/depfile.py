@@ -0,0 +1,171 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for recording which inputs the outputs of a run were derived from.
+
+External build systems (make, ninja) can't tell which files uml2latex reads,
+so they either run it every time or miss changes. The manifest built here maps
+every written document and diagram PDF to the exact files it depends on:
+the XMI file, the override files (and the override directory, so that added files count)
+and the string table, if it was read from a file.
+It can be written as JSON and as a make-style dependency file (.d).
+"""
+
+import os
+import json
+
+from uml2latex.tex import strings as string_tables
+
+manifest_version = 1
+
+def _override_inputs(override, names):
+    """Return the paths of the override files with the given names that were read from files."""
+    return [override.files[name] for name in names if override.files.get(name) is not None]
+
+def _template_directory(templates):
+    return [templates] if templates is not None and os.path.isdir(templates) else []
+
+def _strings_file(strings):
+    return [] if strings is None or strings in string_tables.tables else [strings]
+
+def document_entry(xmi, umlData, override, templates=None, strings=None):
+    """Return the manifest entry of a generated LaTeX document.
+
+    Besides the inputs of the whole document, the entry lists the inputs of each package's
+    section: the override files for its listing, its class order and its classes,
+    and the %NOREF file, which decides what links point to.
+
+    Args:
+        xmi: The path of the XMI file.
+        umlData: The parsed UMLData.
+        override: The Override the document was generated with.
+        templates: The path of the override directory, if any.
+        strings: The name of the built-in string table or the path of the JSON file
+            the document was written with.
+    """
+    common = [xmi] + _template_directory(templates) + _strings_file(strings)
+    packages = {}
+    for package, classes in umlData.packages.items():
+        name = package.attrib["name"]
+        files = ["%NOREF", name + "%LISTING", name + "%ORDER"] + [cl.name + "%CLASS" for cl in classes]
+        packages[name] = common + _override_inputs(override, files)
+    return {"kind": "document", "inputs": common + _override_inputs(override, sorted(override.files)),
+            "packages": packages}
+
+def image_entries(xmi, images, single_class_diagrams, override, page_index=None):
+    """Return the manifest entries of the rendered diagram PDFs, by their paths.
+
+    Single class diagrams also depend on %CUSTOM_WIDTH, which sets their widths.
+    No other override file affects the diagrams, so unlike the documents they don't depend
+    on the override directory (adding a %CUSTOM_WIDTH file changes the documents, which reruns uml2latex).
+    Diagrams batched into one PDF share a single entry listing all of their names.
+
+    Args:
+        xmi: The path of the XMI file.
+        images: A dict of diagram names and the paths of their PDF files (see render_images).
+        single_class_diagrams: The names of the injected single class diagrams.
+        override: The Override the diagrams were generated with.
+        page_index: The path of the page index of the batch PDF, if diagrams were batched.
+    """
+    single = set(single_class_diagrams)
+    sized = [xmi] + _override_inputs(override, ["%CUSTOM_WIDTH"])
+    entries = {}
+    for name, path in sorted(images.items()):
+        entry = entries.setdefault(path, {"kind": "diagrams", "diagrams": [], "inputs": [xmi]})
+        entry["diagrams"].append(name)
+        if name in single:
+            entry["inputs"] = sized
+    if page_index is not None:
+        entries[page_index] = {"kind": "page_index", "inputs": sized}
+    return entries
+
+def make_manifest(documents, images=None):
+    """Build the manifest of a run.
+
+    Args:
+        documents: A list of (output path or None for stdout, document entry) pairs
+            (see document_entry). Documents written to stdout are listed as "-".
+        images: The entries of the rendered diagram PDFs (see image_entries), or None.
+    """
+    outputs = {output if output is not None else "-": entry for output, entry in documents}
+    if images is not None:
+        outputs.update(images)
+    return {"version": manifest_version, "outputs": outputs}
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+def touch_images(manifest):
+    """Update the modification time of the diagram PDFs (and page indices) older than their inputs.
+
+    Diagrams that were already up to date aren't rewritten, so they would stay older
+    than inputs that changed without affecting them, and make would run uml2latex every time.
+    Diagrams newer than all of their inputs are left alone, so that make doesn't rebuild
+    what depends on them.
+    """
+    for path, entry in manifest["outputs"].items():
+        if entry["kind"] == "document":
+            continue
+        mtime = _mtime(path)
+        if mtime is None:
+            continue
+        inputs = [t for t in map(_mtime, entry["inputs"]) if t is not None]
+        if inputs and max(inputs) > mtime:
+            os.utime(path)
+
+def _escape(path, target=False):
+    """Escape a path for use in a makefile rule.
+
+    A % only has to be escaped in targets, where it would make the rule a pattern rule.
+    """
+    path = path.replace("$", "$$").replace("#", "\\#").replace(" ", "\\ ")
+    return path.replace("%", "\\%") if target else path
+
+def format_depfile(manifest):
+    """Return a make-style dependency file for the outputs of the given manifest.
+
+    Every input also gets an empty rule (like the -MP option of compilers),
+    so make doesn't fail once an override file is deleted.
+    Documents written to stdout aren't files and are left out.
+    """
+    text = ""
+    inputs = {}
+    for output, entry in manifest["outputs"].items():
+        if output == "-":
+            continue
+        prerequisites = "".join(" \\\n  " + _escape(path) for path in entry["inputs"])
+        text += "{0}:{1}\n".format(_escape(output, True), prerequisites)
+        inputs.update(dict.fromkeys(entry["inputs"]))
+    for path in inputs:
+        text += "\n{0}:\n".format(_escape(path, True))
+    return text
+
+def write_manifest(manifest, path):
+    """Write the manifest as JSON to the given path."""
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def write_depfile(manifest, path):
+    """Write the make-style dependency file of the manifest to the given path."""
+    with open(path, "w") as f:
+        f.write(format_depfile(manifest))
@@ -19,9 +19,9 @@
 
 """Code for generating diagrams containing only a single class."""
 
-import xml.etree.ElementTree as ET
-
+from uml2latex import events, xmlbackend
 from uml2latex.data import *
+from uml2latex.parse import find_logical_view
 
 # Template for diagram XML element
 diagramTemplate = {
@@ -73,7 +73,7 @@ classTemplate = {
         "height": -1,
         "linecolor": "#ff0000",
         "autoresize": "1",
-        "width": "700",
+        "width": -1,
         "showscope": "1",
         "showstereotype": "1",
         "fillcolor": "#ffffc0",
@@ -98,8 +98,8 @@ def make_single_class_diagram(parent, cl, custom_widths):
     diagAttrs = dict(diagramTemplate)
     diagAttrs["name"] += cl.name
     diagAttrs["xmi.id"] += cl.name
-    diagram = ET.SubElement(parent, "diagram", dict(diagAttrs))
-    widgets = ET.SubElement(diagram, "widgets")
+    diagram = xmlbackend.sub_element(parent, "diagram", dict(diagAttrs))
+    widgets = xmlbackend.sub_element(diagram, "widgets")
 
     # Umbrello complains if we don't set the tag correctly
     tags = {ClassType.CLASS: "classwidget", ClassType.INTERFACE: "interfacewidget", ClassType.ENUM: "enumwidget"}
@@ -107,27 +107,46 @@ def make_single_class_diagram(parent, cl, custom_widths):
 
     classAttrs = dict(classTemplate)
     classAttrs["height"] = str(cl.approx_height)
+    classAttrs["width"] = str(cl.approx_width)
     if cl.name in custom_widths:
         classAttrs["width"] = custom_widths[cl.name]
     classAttrs["showattributes"] = "1" if cl.class_type == ClassType.CLASS else "0"
     classAttrs["xmi.id"] = cl.xmiId
-    classwidget = ET.SubElement(widgets, tag, classAttrs)
+    classwidget = xmlbackend.sub_element(widgets, tag, classAttrs)
 
     # These also seem to be necessary
-    messages = ET.SubElement(diagram, "messages")
-    associations = ET.SubElement(diagram, "associations")
+    messages = xmlbackend.sub_element(diagram, "messages")
+    associations = xmlbackend.sub_element(diagram, "associations")
+    events.emit("diagram_injected", name=diagAttrs["name"], width=classAttrs["width"], height=classAttrs["height"])
+    return diagram
 
 def make_all_single_class_diagrams(tree, elements, custom_widths):
     """Create single class diagrams for every class in the elements given.
 
+    Returns a list of the created diagram XML elements.
+
     Args:
         tree: The Umbrello XML tree to place the diagrams in.
         elements: The dictionary of elements to retrieve the classes from.
         custom_widths: A dictionary of custom width assignments.
             If a class name is a key, the value is used as its diagram's width.
     """
-    ext = ET.SubElement(tree.getroot()[1][0][0][4], "XMI.extension", {"xmi.extender": "umbrello"})
-    single_diagram_list = ET.SubElement(ext, "diagrams")
+    ext = xmlbackend.sub_element(find_logical_view(tree), "XMI.extension", {"xmi.extender": "umbrello"})
+    single_diagram_list = xmlbackend.sub_element(ext, "diagrams")
+
+    return [make_single_class_diagram(single_diagram_list, cl, custom_widths)
+            for cl in elements.values() if cl.ty == ElementType.CLASS]
 
-    for cl in [el for el in elements.values() if el.ty == ElementType.CLASS]:
-        make_single_class_diagram(single_diagram_list, cl, custom_widths)
+def remove_single_class_diagrams(tree, diagrams):
+    """Take the diagrams created by make_all_single_class_diagrams out of the tree again.
+
+    Args:
+        tree: The Umbrello XML tree the diagrams were placed in.
+        diagrams: The list of diagram XML elements returned by make_all_single_class_diagrams.
+    """
+    if not diagrams:
+        return
+    logical_view = find_logical_view(tree)
+    for ext in logical_view.findall("XMI.extension"):
+        if len(ext) > 0 and diagrams[0] in list(ext[0]):
+            logical_view.remove(ext)
@@ -0,0 +1,180 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Events fired while uml2latex runs, and the built-in subscribers to them.
+
+Every event has a kind, the wall clock time it was fired at, the seconds elapsed since
+the run started and a payload of keyword arguments. The events currently fired are:
+
+    stage_start: A stage of the pipeline started (stage, and total if the number of items is known).
+    stage_end: A stage of the pipeline ended (stage, duration in seconds).
+    diagram_injected: A single class diagram was added to the tree (name, width, height).
+    cache_hit: A diagram didn't have to be rendered (name, source: "output" or "store", size).
+    cache_miss: A diagram has to be rendered (name).
+    diagram_converted: A diagram was converted to PDF (name, size, and count for batches).
+    diagram_failed: A diagram couldn't be rendered (name, tool: "umbrello5" or "rsvg-convert", code: its exit code).
+    package_generated: The class descriptions of a package were generated (name, size).
+    fragments_checked: Class sections were looked up in the fragment cache (section, hits, misses).
+    output_written: A LaTeX document was written (size, output: its path or None for stdout).
+    tools_finished: Umbrello and rsvg-convert are done (tools: the summary of the ToolScheduler).
+        tools maps "umbrello5", "rsvg-convert" and "total" (all processes) to dicts with the keys
+        jobs (processes started), max_concurrency (most of them running at once),
+        peak_rss (their largest peak RSS in bytes, or None if unknown) and killed
+        (processes killed for exceeding the memory limit).
+
+Sizes are in bytes. Plugins can subscribe to events with subscribe().
+"""
+
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+class Event:
+    """A single event fired during a run.
+
+    Attributes:
+        kind: The kind of the event (see the module documentation).
+        time: The wall clock time the event was fired at, in seconds since the epoch.
+        elapsed: The seconds elapsed since the run started.
+        payload: A dict of further information about the event.
+    """
+
+    def __init__(self, kind, time, elapsed, payload):
+        self.kind = kind
+        self.time = time
+        self.elapsed = elapsed
+        self.payload = payload
+
+_subscribers = []
+_start = time.perf_counter()
+
+def subscribe(callback):
+    """Call callback with every Event fired from now on."""
+    _subscribers.append(callback)
+
+def unsubscribe(callback):
+    """Stop calling a callback registered with subscribe()."""
+    _subscribers.remove(callback)
+
+def emit(kind, **payload):
+    """Fire an event of the given kind with the given payload."""
+    if not _subscribers:
+        return
+    event = Event(kind, time.time(), time.perf_counter() - _start, payload)
+    for callback in list(_subscribers):
+        callback(event)
+
+@contextmanager
+def stage(name, total=None):
+    """Fire stage_start and stage_end events around a stage of the pipeline.
+
+    Args:
+        name: The name of the stage.
+        total: The number of items (diagrams, packages, ...) the stage processes, if known.
+    """
+    start = time.perf_counter()
+    emit("stage_start", stage=name, total=total)
+    try:
+        yield
+    finally:
+        emit("stage_end", stage=name, duration=time.perf_counter() - start)
+
+# Events that each complete one item of the innermost stage
+_item_events = {"diagram_injected", "diagram_converted", "diagram_failed", "package_generated"}
+
+class ProgressBar:
+    """Draws the progress of the innermost running stage and an estimate of its remaining time.
+
+    Attributes:
+        stream: The stream to draw to.
+        width: The width of the bar in characters.
+    """
+
+    def __init__(self, stream=sys.stderr, width=30):
+        self.stream = stream
+        self.width = width
+        self._stages = []
+
+    def __call__(self, event):
+        if event.kind == "stage_start":
+            self._stages.append([event.payload["stage"], event.payload.get("total"), 0, time.perf_counter()])
+            self._draw()
+        elif event.kind == "stage_end" and self._stages:
+            name = self._stages.pop()[0]
+            self.stream.write("\r\033[K{0}: done ({1:.1f}s)\n".format(name, event.payload["duration"]))
+            self.stream.flush()
+        elif event.kind in _item_events and self._stages:
+            self._stages[-1][2] += event.payload.get("count", 1)
+            self._draw()
+        elif event.kind == "tools_finished":
+            self.stream.write("\r\033[K" + format_tools(event.payload["tools"]) + "\n")
+            if self._stages:
+                self._draw()
+            else:
+                self.stream.flush()
+
+    def _draw(self):
+        (name, total, done, start) = self._stages[-1]
+        if not total:
+            line = "{0}: {1}".format(name, done) if done else "{0}...".format(name)
+        else:
+            filled = min(self.width, self.width * done // total)
+            line = "{0} [{1}{2}] {3}/{4}".format(name, "#" * filled, "-" * (self.width - filled), done, total)
+            if done:
+                remaining = int((time.perf_counter() - start) / done * max(total - done, 0))
+                line += " ETA {0}:{1:02}".format(remaining // 60, remaining % 60)
+        self.stream.write("\r\033[K" + line)
+        self.stream.flush()
+
+def format_tools(tools):
+    """Return a line describing how the external tools ran.
+
+    Args:
+        tools: The summary of a ToolScheduler (see scheduler.py).
+    """
+    parts = []
+    for kind, stats in sorted(tools.items()):
+        if kind == "total":
+            continue
+        part = "{0} {1} jobs, up to {2} at once".format(kind, stats["jobs"], stats["max_concurrency"])
+        if stats["peak_rss"] is not None:
+            part += ", peak {0} MiB".format(stats["peak_rss"] // (1024 * 1024))
+        if stats["killed"]:
+            part += ", {0} killed".format(stats["killed"])
+        parts.append(part)
+    return "tools: " + ("; ".join(parts) if parts else "none run")
+
+class EventLog:
+    """Writes every event as a line of JSON (NDJSON) to a file.
+
+    Each line is an object with the keys "event", "time" and "elapsed" and the event's payload.
+
+    Attributes:
+        file: The file object to write to.
+    """
+
+    def __init__(self, file):
+        self.file = file
+
+    def __call__(self, event):
+        record = {"event": event.kind, "time": event.time, "elapsed": round(event.elapsed, 6)}
+        record.update(event.payload)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
@@ -0,0 +1,465 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for rendering the diagrams of an Umbrello XML tree to PDF files."""
+
+import io
+import os
+import json
+import hashlib
+import shutil
+import tarfile
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (i.e. on Windows), concurrent runs still never see partial files,
+    # but the diagram state of one run may be lost
+    fcntl = None
+
+from uml2latex import events, xmlbackend
+from uml2latex.scheduler import ToolScheduler
+from uml2latex.utils import space_ul
+from uml2latex.store import index_model_elements, diagram_dependencies, diagram_key
+
+# The available SVG to PDF converters: rsvg-convert processes,
+# or the built-in converter (see svgpdf.py), which falls back to rsvg-convert for SVGs it can't handle
+converters = ["rsvg", "builtin"]
+# Changes whenever the output of the built-in converter changes
+_builtin_converter_version = "uml2latex svgpdf 2\n"
+
+# The external tools diagrams are rendered with
+tools = ["umbrello5", "rsvg-convert"]
+# Stands in for the version of a tool that can't be run
+unavailable = "unavailable"
+
+def missing_tools():
+    """Return the names of the external tools (see tools) that aren't in the PATH."""
+    return [tool for tool in tools if shutil.which(tool) is None]
+
+def renderer_version(converter="rsvg"):
+    """Return a string identifying the versions of Umbrello and the SVG converter.
+
+    Tools that can't be run are marked as unavailable instead,
+    so no diagram counts as up to date or stored for the tools that are missing.
+    """
+    version = ""
+    for tool in tools:
+        try:
+            result = subprocess.run([tool, "--version"], stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL, universal_newlines=True)
+            version += result.stdout
+        except OSError:
+            version += "{0} {1}\n".format(tool, unavailable)
+    if converter == "builtin":
+        version += _builtin_converter_version
+    return version
+
+# The multi-page PDF batched diagrams are converted into and its page index
+batch_pdf = "classes.pdf"
+batch_index = "classes.json"
+# Records what the diagrams in an image directory were rendered from
+diagram_state = "diagrams.json"
+# The peak memory of the tools in earlier runs, to start several of them at once right away
+tool_peaks = "tools.json"
+# The advisory lock taken while publishing into an image directory, and the prefix of staging directories
+lock_file = ".lock"
+staging_prefix = ".staging-"
+
+def diagram_pdf(image_dir, name):
+    """Return the path the PDF for the diagram with the given name is placed at."""
+    return space_ul("{}/{}".format(image_dir, name)) + ".pdf"
+
+def _write_archive(tree, tmpfile):
+    # Umbrello opens compressed projects as tar archives containing the XMI file
+    data = io.BytesIO()
+    xmlbackend.write(tree, data)
+    info = tarfile.TarInfo("project.xmi")
+    info.size = data.tell()
+    data.seek(0)
+    with os.fdopen(tmpfile, "wb") as f, tarfile.open(fileobj=f, mode="w:gz") as archive:
+        archive.addfile(info, data)
+
+def _write_project(tree, compress=False, only=None):
+    """Write the tree to a temporary project file for Umbrello and return its path."""
+    # Other diagrams are taken out of the tree while it is written
+    detached = []
+    if only is not None:
+        for diagrams in tree.getroot().iter("diagrams"):
+            children = list(diagrams)
+            if any(d.attrib.get("name") not in only for d in children):
+                detached.append((diagrams, children))
+                diagrams[:] = [d for d in children if d.attrib.get("name") in only]
+
+    try:
+        if compress:
+            tmpfile, tmppath = tempfile.mkstemp(prefix="uml", suffix=".xmi.tgz")
+            _write_archive(tree, tmpfile)
+        else:
+            tmpfile, tmppath = tempfile.mkstemp(prefix="uml")
+            with os.fdopen(tmpfile, "wb") as f:
+                xmlbackend.write(tree, f)
+    finally:
+        for diagrams, children in detached:
+            diagrams[:] = children
+    return tmppath
+
+def _umbrello_args(image_dir, project):
+    # Unfortunately, umbrello can't output directly to PDF.
+    return ["umbrello5", "--directory", image_dir, "--export", "svg", project]
+
+def _convert_builtin(files, pdf):
+    from uml2latex.svgpdf import convert, UnsupportedSVG
+    try:
+        convert(files, pdf)
+    except UnsupportedSVG:
+        return False
+    return True
+
+def convert_svg(file, converter="rsvg"):
+    """Convert an SVG file produced by Umbrello to a PDF file next to it.
+
+    Args:
+        file: The SVG file to convert.
+        converter: The converter to use (see converters).
+    """
+    pdf = space_ul(file[:-3]) + "pdf"
+    if converter == "builtin" and _convert_builtin([file], pdf):
+        return
+    subprocess.run(_rsvg_args([file], pdf))
+
+def _rsvg_args(files, pdf):
+    return ["rsvg-convert", "-f", "pdf", "-o", pdf] + files
+
+def load_page_index(image_dir):
+    """Return the dict of diagram names and their pages in the batch PDF, or None if there is none."""
+    try:
+        with open(os.path.join(image_dir, batch_index), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _write_json(path, data):
+    # Written to a temporary file first, so that concurrent runs never read partial files
+    fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmppath, path)
+
+def _write_page_index(image_dir, names):
+    _write_json(os.path.join(image_dir, batch_index), {name: page for page, name in enumerate(names, 1)})
+
+def diagram_keys(tree, batch=None, converter="rsvg"):
+    """Compute the keys of all diagrams in a tree (see store.diagram_key).
+
+    Returns a dict of diagram names and their keys for all diagrams not named in batch,
+    the key of the batch PDF (or None if batch is empty),
+    and a dict of diagram names and the XMI IDs they reference.
+
+    Args:
+        tree: The Umbrello XML tree containing the diagrams.
+        batch: An optional collection of names of diagrams that are converted into batch_pdf.
+        converter: The SVG converter the diagrams are converted with (see converters).
+    """
+    version = renderer_version(converter)
+    model_elements = index_model_elements(tree)
+    keys = {}
+    dependencies = {}
+    element_parts = {}
+    for diagram in tree.getroot().iter("diagram"):
+        name = diagram.attrib["name"]
+        dependencies[name] = diagram_dependencies(diagram, model_elements)
+        keys[name] = diagram_key(diagram, model_elements, version, dependencies[name], element_parts)
+    if not batch:
+        return (keys, None, dependencies)
+    digest = hashlib.sha256()
+    for name in sorted(batch):
+        digest.update(keys.pop(name, "").encode("utf-8"))
+    return (keys, digest.hexdigest(), dependencies)
+
+def load_tool_peaks(image_dir):
+    """Return the dict of tool kinds and the peak RSS their processes took in earlier runs (see ToolScheduler)."""
+    try:
+        with open(os.path.join(image_dir, tool_peaks), "r") as f:
+            peaks = json.load(f)
+        return {kind: int(peak) for kind, peak in peaks.items()}
+    except (FileNotFoundError, ValueError, AttributeError, TypeError):
+        return {}
+
+def _load_state_entries(image_dir):
+    try:
+        with open(os.path.join(image_dir, diagram_state), "r") as f:
+            entries = json.load(f)
+        return {name: entry for name, entry in entries.items() if "key" in entry}
+    except (FileNotFoundError, ValueError, AttributeError, TypeError):
+        return {}
+
+def load_diagram_state(image_dir):
+    """Return the dict of diagram names and keys the PDFs in image_dir were rendered from."""
+    return {name: entry["key"] for name, entry in _load_state_entries(image_dir).items()}
+
+@contextmanager
+def _locked(image_dir):
+    """Hold the advisory lock of an image directory, waiting for other runs to release it."""
+    with open(os.path.join(image_dir, lock_file), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _staged_pdf(directory, name):
+    return os.path.join(directory, batch_pdf) if name == batch_pdf else diagram_pdf(directory, name)
+
+def _publish(staging, image_dir, keys, dependencies, published):
+    """Move diagrams from a staging directory into image_dir and record them in diagram_state.
+
+    Each file is renamed into place, so other runs only ever see complete files.
+    The lock is held while doing so, so that diagram_state always describes the files in image_dir,
+    even if several runs publish into it at the same time.
+
+    Args:
+        staging: The staging directory of this run.
+        image_dir: The directory to move the diagrams into.
+        keys: A dict of diagram names (and batch_pdf) and the keys they were rendered from.
+        dependencies: A dict of diagram names and the XMI IDs they reference.
+        published: The names of the diagrams (or batch_pdf) that were placed in the staging directory.
+    """
+    with _locked(image_dir):
+        entries = _load_state_entries(image_dir)
+        for name in published:
+            staged = _staged_pdf(staging, name)
+            if not os.path.exists(staged):
+                continue
+            if name == batch_pdf:
+                os.replace(os.path.join(staging, batch_index), os.path.join(image_dir, batch_index))
+            os.replace(staged, _staged_pdf(image_dir, name))
+            entries[name] = {"key": keys[name], "elements": dependencies.get(name, [])}
+        if published:
+            _write_json(os.path.join(image_dir, diagram_state), entries)
+
+def check_diagrams(tree, image_dir, store=None, batch=None, materialize=True, converter="rsvg", staging=None):
+    """Find out which diagrams of a tree have to be rendered.
+
+    A diagram is current if its PDF in image_dir was rendered from the same inputs
+    (the diagram's own XML and the model elements it references) as recorded in diagram_state.
+    Otherwise, it is a hit if it can be taken from the ImageStore, and missing if not.
+    Batched diagrams are only ever handled together.
+
+    Returns a tuple of the keys, the batch key and the dependencies (see diagram_keys),
+    followed by lists of the names of current, hit and missing diagrams.
+
+    Args:
+        tree: The Umbrello XML tree containing the diagrams.
+        image_dir: The directory the PDF files are placed in.
+        store: An optional ImageStore to take diagrams from.
+        batch: An optional collection of names of diagrams that are converted into batch_pdf.
+        materialize: Whether to place the hits in image_dir.
+        converter: The SVG converter the diagrams are converted with (see converters).
+        staging: An optional directory to place the hits in instead of image_dir.
+    """
+    (keys, batch_key, dependencies) = diagram_keys(tree, batch, converter)
+    state = load_diagram_state(image_dir)
+    current = []
+    hits = []
+    missing = []
+
+    def check(name, key, count=1):
+        path = _staged_pdf(image_dir, name)
+        if state.get(name) == key and os.path.exists(path):
+            events.emit("cache_hit", name=name, source="output", size=os.path.getsize(path), count=count)
+            return current
+        if staging is not None:
+            path = _staged_pdf(staging, name)
+        if store is not None and (store.get(key, path) if materialize else store.contains(key)):
+            events.emit("cache_hit", name=name, source="store",
+                    size=os.path.getsize(path) if materialize else None, count=count)
+            return hits
+        events.emit("cache_miss", name=name, count=count)
+        return missing
+
+    for name, key in keys.items():
+        check(name, key).append(name)
+    if batch_key is not None:
+        check(batch_pdf, batch_key, len(batch)).extend(sorted(batch))
+    return (keys, batch_key, dependencies, current, hits, missing)
+
+def render_images(tree, image_dir, store=None, compress=False, batch=None, converter="rsvg", scheduler=None):
+    """Render the diagrams in the given tree to PDF files in image_dir.
+
+    Only diagrams whose own XML or referenced model elements changed since they were last
+    rendered into image_dir are exported by Umbrello (see check_diagrams).
+    If an ImageStore is given, diagrams found in it are taken from the store
+    instead of being rendered, and newly rendered diagrams are added to it.
+    The store is trimmed to its maximum size once all of them have been added.
+    Umbrello is not started at all if there is nothing to render.
+
+    Umbrello and rsvg-convert run as jobs of a ToolScheduler, which runs as many of them
+    at once as memory allows. The peak memory of the tools is kept in tool_peaks for the next run. Large exports are split between several Umbrello processes
+    (see _export_groups), and the diagrams of each are converted as soon as it is done.
+
+    Diagrams named in batch are converted into a single multi-page PDF (batch_pdf)
+    by one rsvg-convert process instead, and their pages are recorded in batch_index.
+    The batch PDF is stored in the ImageStore as a whole.
+
+    Several runs may render into the same image_dir at the same time:
+    Every run exports and converts its diagrams in a staging directory of its own
+    and then moves the finished PDFs into image_dir (see _publish).
+
+    Returns a dict of the names of all diagrams and the paths of the PDF files they are in.
+
+    Args:
+        tree: The Umbrello XML tree to render the diagrams of.
+        image_dir: The directory to place the PDF files in.
+        store: An optional ImageStore to reuse rendered diagrams from.
+        compress: Whether to hand the tree to Umbrello as a compressed project.
+        batch: An optional collection of names of diagrams to convert into batch_pdf.
+        converter: The SVG converter to use (see converters).
+        scheduler: The ToolScheduler to run the tools with.
+            If it is None, one with the default limits is used.
+    """
+    os.makedirs(image_dir, exist_ok=True)
+
+    batch = sorted(batch) if batch else []
+    staging = tempfile.mkdtemp(prefix=staging_prefix, dir=image_dir)
+    try:
+        (keys, batch_key, dependencies, current, hits, missing) = check_diagrams(tree, image_dir, store, batch,
+                converter=converter, staging=staging)
+        if batch and batch[0] in hits:
+            _write_page_index(staging, batch)
+
+        if missing:
+            with events.stage("convert", total=len(missing)):
+                if scheduler is None:
+                    scheduler = ToolScheduler()
+                for kind, peak in load_tool_peaks(image_dir).items():
+                    scheduler.peaks.setdefault(kind, peak)
+                try:
+                    _render_missing(tree, staging, compress, missing, keys, store, batch, batch_key, converter,
+                            scheduler)
+                finally:
+                    _write_json(os.path.join(image_dir, tool_peaks), scheduler.peaks)
+                    if store is not None:
+                        store.evict()
+
+        images = {name: diagram_pdf(image_dir, name) for name in keys}
+        images.update((name, os.path.join(image_dir, batch_pdf)) for name in batch)
+        if batch_key is not None:
+            keys[batch_pdf] = batch_key
+        batch_set = set(batch)
+        published = [name for name in hits + missing if name not in batch_set]
+        if batch and batch[0] not in current:
+            published.append(batch_pdf)
+        _publish(staging, image_dir, keys, dependencies, published)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return images
+
+# The least number of diagrams worth starting another Umbrello process for:
+# below it, Umbrello's startup takes longer than exporting the diagrams (see plan.py)
+_min_diagrams_per_export = 60
+
+def _export_groups(names, max_jobs):
+    """Split the names of the diagrams to export between up to max_jobs Umbrello processes."""
+    count = max(1, min(max_jobs, len(names) // _min_diagrams_per_export))
+    return [names[i::count] for i in range(count)]
+
+def _render_missing(tree, staging, compress, missing, keys, store, batch, batch_key, converter, scheduler):
+    batch_set = set(batch)
+    batch_path = os.path.join(staging, batch_pdf)
+    batch_files = {}
+    groups = _export_groups(missing, scheduler.max_jobs)
+    exports_left = [len(groups)]
+    projects = []
+
+    def failed(name, tool, code, output=None):
+        # Partial output must neither be published nor end up in the store
+        if output is not None and os.path.exists(output):
+            os.remove(output)
+        events.emit("diagram_failed", name=name, tool=tool, code=code)
+
+    def converted(name, svg, pdf, code=0):
+        os.remove(svg)
+        if code != 0 or not os.path.exists(pdf):
+            failed(name, "rsvg-convert", code, pdf)
+            return
+        if store is not None and name in keys:
+            store.put(keys[name], pdf)
+        events.emit("diagram_converted", name=name, size=os.path.getsize(pdf))
+
+    def batch_converted(names, code=0):
+        for file in batch_files.values():
+            os.remove(file)
+        if code != 0 or not os.path.exists(batch_path):
+            failed(batch_pdf, "rsvg-convert", code, batch_path)
+            return
+        _write_page_index(staging, names)
+        if store is not None:
+            store.put(batch_key, batch_path)
+        events.emit("diagram_converted", name=batch_pdf, count=len(names), size=os.path.getsize(batch_path))
+
+    def exported(group, code=0):
+        for name in group:
+            svg = os.path.join(staging, name + ".svg")
+            if code != 0 or not os.path.exists(svg):
+                # SVGs of a failed export may be incomplete
+                failed(name, "umbrello5", code, svg)
+                continue
+            if name in batch_set:
+                batch_files[name] = svg
+                continue
+            pdf = diagram_pdf(staging, name)
+            if converter == "builtin" and _convert_builtin([svg], pdf):
+                converted(name, svg, pdf)
+            else:
+                scheduler.submit("rsvg-convert", _rsvg_args([svg], pdf),
+                        done=lambda code, name=name, svg=svg, pdf=pdf: converted(name, svg, pdf, code))
+        exports_left[0] -= 1
+        if exports_left[0] == 0 and batch_files and len(batch_files) < len(batch):
+            # An incomplete batch would be recorded (and stored) under the key of the complete one
+            for file in batch_files.values():
+                os.remove(file)
+            failed(batch_pdf, "umbrello5", code)
+        elif exports_left[0] == 0 and batch_files:
+            # The batch is converted as a whole once every part of it is exported
+            names = [name for name in batch if name in batch_files]
+            files = [batch_files[name] for name in names]
+            if converter == "builtin" and _convert_builtin(files, batch_path):
+                batch_converted(names)
+            else:
+                scheduler.submit("rsvg-convert", _rsvg_args(files, batch_path),
+                        done=lambda code: batch_converted(names, code))
+
+    def prepare(group):
+        projects.append(_write_project(tree, compress, set(group)))
+        return _umbrello_args(staging, projects[-1])
+
+    for group in groups:
+        scheduler.submit("umbrello5", prepare=lambda group=group: prepare(group),
+                done=lambda code, group=group: exported(group, code))
+    try:
+        scheduler.run()
+    finally:
+        for project in projects:
+            os.remove(project)
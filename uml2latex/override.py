@@ -17,8 +17,9 @@
 # You should have received a copy of the GNU General Public License
 # along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
 
-"""Code for reading in override files from a directory."""
+"""Code for reading in override files from a directory or a mapping."""
 
+import os
 import re
 import glob
 
@@ -26,6 +27,7 @@ class Override:
     """Reads in override files from a directory and stores the information.
 
     See the main documentation for details on which overrides are available.
+    Use from_mapping to create overrides without a directory.
 
     Attributes:
         root: A macro string for the root of the generated document.
@@ -41,9 +43,14 @@ class Override:
         module_listing: A dict of modules and macro strings for their sections.
         diagrams: A dict of diagrams and macro strings for their sections.
         classes: A dict of classes and macro strings for their sections.
+        unknown: A list of the names of files that aren't override files.
+        files: A dict of the names of the override files read and their paths
+            (None for files given as a mapping).
+        invalid: A list of (file name, message) pairs for lines of override files
+            that couldn't be read and were skipped.
     """
 
-    def __init__(self, directory):
+    def __init__(self, directory=None):
         self.root = ""
         self.diagram_order = []
         self.sequence_diagram_order = []
@@ -57,20 +64,49 @@ class Override:
         self.module_listing = {}
         self.diagrams = {}
         self.classes = {}
+        self.unknown = []
+        self.files = {}
+        self.invalid = []
 
+        if directory is None:
+            return
         for file in glob.glob("{}/*".format(directory)):
             filename = file.split("/")[-1]
-            for (regex, func) in _files.items():
-                match = re.match(regex, filename)
-                if match:
-                    with open(file, "r") as f:
-                        func(self, match.groups(), f.read())
+            # Other files (like images or notes) and subdirectories aren't even opened
+            if not os.path.isfile(file) or not any(re.match(regex, filename) for regex in _files):
+                self.unknown.append(filename)
+                continue
+            with open(file, "r") as f:
+                self._read(filename, f.read(), file)
+
+    def from_mapping(files):
+        """Create overrides from a mapping of override file names and their contents.
+
+        Args:
+            files: A dict of file names (as they would appear in the override directory) and texts.
+        """
+        override = Override()
+        for filename, text in files.items():
+            override._read(filename, text)
+        return override
+
+    def _read(self, filename, text, path=None):
+        known = False
+        for (regex, func) in _files.items():
+            match = re.match(regex, filename)
+            if match:
+                func(self, match.groups(), text)
+                known = True
+        if known:
+            self.files[filename] = path
+        else:
+            self.unknown.append(filename)
 
     def _override_root(self, match, text):
         self.root = text
 
     def _override_diagram_order(self, match, text):
-        self.module_list_order = text.splitlines()
+        self.diagram_order = text.splitlines()
 
     def _override_sequence_diagram_order(self, match, text):
         self.sequence_diagram_order = text.splitlines()
@@ -82,7 +118,16 @@ class Override:
         self.noref = set(text.splitlines())
 
     def _override_custom_width(self, match, text):
-        self.custom_width = dict([tuple(l.split(" ")) for l in text.splitlines()])
+        self.custom_width = {}
+        for number, line in enumerate(text.splitlines(), 1):
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) != 2 or not re.fullmatch(r"\d+(\.\d+)?", parts[1]):
+                self.invalid.append(("%CUSTOM_WIDTH",
+                    "line {0} is not a class name and a width: '{1}'".format(number, line)))
+                continue
+            self.custom_width[parts[0]] = parts[1]
 
     def _override_architecture_desc(self, match, text):
         self.architecture_desc = text
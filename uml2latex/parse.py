@@ -19,13 +19,20 @@
 
 """Code for parsing information from the Umbrello XML format."""
 
-import xml.etree.ElementTree as ET
-
+from uml2latex import xmlbackend
 from uml2latex.data import *
 from uml2latex.utils import escape
+from uml2latex.compression import open_xmi
+from uml2latex.sizing import estimate_class_sizes
 
 _umlSchema = "{http://schema.omg.org/spec/UML/1.4}"
 
+def find_logical_view(tree):
+    """Return the XML element of the Logical View model of an Umbrello tree."""
+    return [el for el in tree.getroot()
+        .find("./XMI.content/{0}Model/{0}Namespace.ownedElement".format(_umlSchema))
+        .findall(_umlSchema + "Model") if el.attrib["xmi.id"] == "Logical_View"][0]
+
 class UMLData:
     """Parses and holds UML data read from XML.
 
@@ -38,6 +45,7 @@ class UMLData:
         elements: A dict of element names and their definitions.
         class_diagram_list: A list of class diagrams found in the XML.
         sequence_diagram_list: A list of sequence diagrams found in the XML.
+        names: A dict of the element names as they appear in Umbrello (not escaped for LaTeX) by XMI ID.
 
     """
 
@@ -46,81 +54,82 @@ class UMLData:
     elements = {}
     class_diagram_list = []
     sequence_diagram_list = []
+    names = {}
 
-    def __init__(self, tree, packages, elements, class_diagram_list, sequence_diagram_list):
+    def __init__(self, tree, packages, elements, class_diagram_list, sequence_diagram_list, names):
         self.tree = tree
         self.packages = packages
         self.elements = elements
         self.class_diagram_list = class_diagram_list
         self.sequence_diagram_list = sequence_diagram_list
+        self.names = names
 
-    def _get_properties(cl, element_dict):
-        """Get all the operations, attributes, and the template parameter of a class.
-
-        Returns a tuple of a list of operations, a list of attributes,
-        and a template parameter (or None if the class does not have one).
+    def _parse_operation(op):
+        """Parse an operation into an Operation object.
 
         Args:
-            cl: The class of which to get the properties.
-            element_dict: The dict to add the potential template parameter to.
+            op: The XML element of the operation.
         """
-        operations = []
-        attributes = []
-        classifier = cl.find(_umlSchema + "Classifier.feature")
-        if classifier is not None:
-            operations = classifier.findall(_umlSchema + "Operation")
-            attributes = classifier.findall(_umlSchema + "Attribute")
-        model_element = cl.find(_umlSchema + "ModelElement.templateParameter")
-        if model_element is not None:
-            att = model_element[0].attrib
-            element_dict[att["xmi.id"]] = Template(escape(att["name"]),
-                    att["xmi.id"],
-                    att["type"] if "type" in att else None,
-                    att["comment"] if "comment" in att else None)
-            return (operations, attributes, att["xmi.id"])
-        return (operations, attributes, None)
-
-    def _approximate_class_height(cl):
-        """Roughly approximate how many vertical pixels are needed to render a diagram of the given class.
-
-        This is necessary because we need to tell Umbrello how large to render each diagram -
-        it doesn't infer that from the elements of the diagram.
+        parameters = []
+        return_type = None
+        if len(op) >= 1:
+            for param in op[0]:
+                if "kind" in param.attrib and param.attrib["kind"] == "return":
+                    return_type = param.attrib.get("type")
+                else:
+                    parameters.append(Parameter(param.attrib.get("name", ""), param.attrib.get("type")))
+        return Operation(op.attrib["name"], op.attrib.get("xmi.id"), parameters, return_type,
+                op.attrib.get("visibility", "public"), op.attrib["comment"] if "comment" in op.attrib else None)
+
+    def _parse_attribute(at):
+        """Parse an attribute into an Attribute object.
 
         Args:
-            cl: The class to approximate the height of.
+            at: The XML element of the attribute.
         """
-        height = 60
-        classifier = cl.find(_umlSchema + "Classifier.feature")
-        if classifier is not None:
-            for el in classifier:
-                height += 15
-        return height
-
+        return Attribute(at.attrib["name"], at.attrib.get("xmi.id"), at.attrib.get("type"),
+                at.attrib.get("visibility", "public"), at.attrib["comment"] if "comment" in at.attrib else None)
 
-    def _parse_classes(class_list, package):
-        """Parse all the classes in the list into Class objects and return them in a dict.
+    def _index_usages(elements):
+        """Fill in the used_by lists of all classes in a single pass over the model.
 
         Args:
-            class_list: The list of classes to parse.
-            package: Which package to assign the parsed classes to.
+            elements: The dict of all elements by XMI ID.
         """
-        element_dict = {}
-        for cl in class_list:
-            (operations, attributes, template) = UMLData._get_properties(cl, element_dict)
-            class_type = ClassType.CLASS if "Class" in cl.tag else (ClassType.INTERFACE if "Interface" in cl.tag else ClassType.ENUM)
-            element_dict[cl.attrib["xmi.id"]] = Class(
-                class_type,
-                escape(cl.attrib["name"]),
-                package,
-                cl.attrib["xmi.id"],
-                operations,
-                attributes,
-                None,
-                template,
-                cl.attrib["comment"] if "comment" in cl.attrib else None,
-                UMLData._approximate_class_height(cl))
-        return element_dict
+        for cl in [el for el in elements.values() if el.ty == ElementType.CLASS]:
+            used = []
+            if cl.template is not None and elements[cl.template].bound is not None:
+                used.append(elements[cl.template].bound)
+            for op in cl.operations:
+                used.append(op.return_type)
+                used.extend(param.type for param in op.parameters)
+            used.extend(at.type for at in cl.attributes)
+            used.extend(dep.target for dep in cl.dependencies)
+            used.extend(a.target for a in cl.associations)
+            for target in dict.fromkeys(used):
+                if target != cl.xmiId and target in elements and elements[target].ty == ElementType.CLASS:
+                    elements[target].used_by.append(cl.xmiId)
+
+    def _index_inheritance(elements):
+        """Fill in the ancestors and descendants lists of all classes.
+
+        Both closures are computed once for the whole model, reusing the closures of
+        parents and children, so deep hierarchies take linear rather than quadratic time.
+        Inheritance cycles (which Umbrello doesn't prevent) are resolved as a whole,
+        a class in a cycle doesn't list itself.
 
+        Args:
+            elements: The dict of all elements by XMI ID.
+        """
+        classes = [xmiId for xmiId, el in elements.items() if el.ty == ElementType.CLASS]
+        def is_class(xmiId):
+            return xmiId in elements and elements[xmiId].ty == ElementType.CLASS
+        ancestors = _closures(classes, lambda xmiId:
+                [elements[xmiId].abstraction] if is_class(elements[xmiId].abstraction) else [])
+        descendants = _closures(classes, lambda xmiId: [child for child in elements[xmiId].children if is_class(child)])
+        for xmiId in classes:
+            elements[xmiId].ancestors = ancestors[xmiId]
+            elements[xmiId].descendants = descendants[xmiId]
 
     def parse_uml(file):
         """Parse an Umbrello XML tree into the UMLData format.
@@ -129,70 +138,223 @@ class UMLData:
         check here first.
         This method expects your Umbrello project to have a particular structure (no nested packages or classes,
         all sequence diagrams in a folder called "Sequenzdiagramme").
+        The model is walked only once (see _ModelVisitor).
         TODO: Make this method handle other project structures and nested packages gracefully.
 
         Args:
-            file: The file to read the XML from.
+            file: The path of the file to read the XML from, or its contents as bytes.
+                It may be compressed (see compression.open_xmi).
         """
-        ET.register_namespace("UML", _umlSchema[1:-1])
-        tree = ET.parse(file)
-
-        model_view = [el for el in tree.getroot()
-            .find("./XMI.content/{0}Model/{0}Namespace.ownedElement".format(_umlSchema))
-            .findall(_umlSchema + "Model") if el.attrib["xmi.id"] == "Logical_View"][0]
-        namespace_root = model_view.find(_umlSchema + "Namespace.ownedElement")
+        xmlbackend.register_namespace("UML", _umlSchema[1:-1])
+        with open_xmi(file) as f:
+            tree = xmlbackend.parse(f)
 
-        package_list = list(filter(lambda x: "stereotype" not in x.attrib or x.attrib["name"] != "Datatypes",
-            namespace_root.findall(_umlSchema + "Package")))
-        package_list.append(model_view)
+        model_view = find_logical_view(tree)
 
         class_diagram_list_root = model_view.find("XMI.extension")
         class_diagram_list = list(class_diagram_list_root[0].findall("diagram"))
 
-        sequence_diagram_list_root = next(filter(lambda x: x.attrib["name"] == "Sequenzdiagramme",
-            namespace_root.findall(_umlSchema + "Package"))).find("XMI.extension")
-        if not sequence_diagram_list_root:
-            sequence_diagram_list = []
-        else:
-            sequence_diagram_list = list(sequence_diagram_list_root[0].findall("diagram"))
+        visitor = _ModelVisitor(model_view)
+        visitor.visit_root(model_view.find(_umlSchema + "Namespace.ownedElement"))
+        elements = visitor.resolve()
+        packages = {package: [el for el in classes if el.ty == ElementType.CLASS]
+                for package, classes in visitor.classes.items()}
+
+        UMLData._index_usages(elements)
+        UMLData._index_inheritance(elements)
+        estimate_class_sizes([el for el in elements.values() if el.ty == ElementType.CLASS], visitor.names)
+
+        return UMLData(tree, packages, elements, class_diagram_list, visitor.sequence_diagram_list, visitor.names)
 
-        # Contains ALL elements (including DataTypes) by xmi.id
+def _closures(nodes, successors):
+    """Return a dict of the given nodes and the lists of nodes reachable from them.
+
+    Each list starts with a node's direct successors, each followed by what it reaches in turn.
+    The graph is split into strongly connected components (Tarjan's algorithm, without recursion),
+    which are completed successors first, so every component is walked only once.
+
+    Args:
+        nodes: The nodes of the graph.
+        successors: A function returning the list of direct successors of a node.
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    closures = {}
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            node, pending = work[-1]
+            for succ in pending:
+                if succ not in index:
+                    index[succ] = low[succ] = len(index)
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(successors(succ))))
+                    break
+                if succ in on_stack:
+                    low[node] = min(low[node], index[succ])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[node])
+                if low[node] != index[node]:
+                    continue
+                component = []
+                while not component or component[-1] != node:
+                    component.append(stack.pop())
+                    on_stack.discard(component[-1])
+                members = set(component)
+                reach = {}
+                for member in reversed(component):
+                    for succ in successors(member):
+                        reach[succ] = None
+                        if succ not in members:
+                            reach.update(dict.fromkeys(closures[succ]))
+                for member in component:
+                    closures[member] = [other for other in reach if other != member]
+    return closures
+
+class _ModelVisitor:
+    """Collects everything parse_uml needs from the Logical View in a single walk.
+
+    Elements are dispatched on their tag. Relations are only applied once all classes are known,
+    in the same order the separate scans used to apply them in.
+
+    Attributes:
+        model_view: The XML element of the Logical View.
+        classes: A dict of package XML elements and the elements (classes and their template
+            parameters) defined in them, in the order packages are listed in.
+        datatypes: A dict of data types by XMI ID.
+        names: A dict of unescaped element names by XMI ID, used for sizing classes.
+        relations: A dict of relation tags and lists of their XML elements.
+        sequence_diagram_list: A list of sequence diagrams found in the XML.
+    """
+
+    # Classes are listed by kind within each package
+    _class_kinds = [("Class", ClassType.CLASS), ("Interface", ClassType.INTERFACE),
+            ("Enumeration", ClassType.ENUM)]
+
+    def __init__(self, model_view):
+        self.model_view = model_view
+        self.classes = {}
+        self.datatypes = {}
+        self.names = {}
+        self.relations = {"Abstraction": [], "Generalization": [], "Dependency": [], "Association": []}
+        self.sequence_diagram_list = []
+        self._buckets = {}
+        self._package_dispatch = {_umlSchema + tag: kind for tag, kind in _ModelVisitor._class_kinds}
+        self._root_dispatch = {_umlSchema + tag: tag for tag in self.relations}
+
+    def visit_root(self, namespace_root):
+        """Walk the namespace of the Logical View and everything below it."""
+        for el in namespace_root:
+            if el.tag == _umlSchema + "Package":
+                self._visit_package(el)
+            elif el.tag in self._root_dispatch:
+                self.relations[self._root_dispatch[el.tag]].append(el)
+            elif el.tag in self._package_dispatch:
+                self._visit_class(el, self.model_view)
+        # The Logical View itself is listed last
+        self._bucket(self.model_view)
+
+    def _bucket(self, package):
+        if package not in self._buckets:
+            self._buckets[package] = {kind: [] for _, kind in _ModelVisitor._class_kinds}
+        return self._buckets[package]
+
+    def _visit_package(self, package):
+        if package.attrib["name"] == "Sequenzdiagramme":
+            extension = package.find("XMI.extension")
+            if extension is not None and len(extension) > 0:
+                self.sequence_diagram_list = list(extension[0].findall("diagram"))
+        is_datatypes = "stereotype" in package.attrib and package.attrib["name"] == "Datatypes"
+        if not is_datatypes:
+            self._bucket(package)
+        namespace = package.find(_umlSchema + "Namespace.ownedElement")
+        if namespace is None:
+            return
+        for el in namespace:
+            if el.tag == _umlSchema + "DataType":
+                self._visit_datatype(el)
+            elif not is_datatypes and el.tag in self._package_dispatch:
+                self._visit_class(el, package)
+
+    def _visit_datatype(self, datatype):
+        att = datatype.attrib
+        self.names[att["xmi.id"]] = att["name"]
+        self.datatypes[att["xmi.id"]] = DataType(escape(att["name"]), att["xmi.id"],
+                att["comment"] if "comment" in att else None)
+
+    def _visit_class(self, cl, package):
+        operations = []
+        attributes = []
+        template = None
+        for child in cl:
+            if child.tag == _umlSchema + "Classifier.feature":
+                for feature in child:
+                    if feature.tag == _umlSchema + "Operation":
+                        operations.append(UMLData._parse_operation(feature))
+                    elif feature.tag == _umlSchema + "Attribute":
+                        attributes.append(UMLData._parse_attribute(feature))
+            elif child.tag == _umlSchema + "ModelElement.templateParameter" and template is None:
+                att = child[0].attrib
+                self.names[att["xmi.id"]] = att["name"]
+                template = Template(escape(att["name"]),
+                        att["xmi.id"],
+                        att["type"] if "type" in att else None,
+                        att["comment"] if "comment" in att else None)
+        self.names[cl.attrib["xmi.id"]] = cl.attrib["name"]
+        self._bucket(package)[self._package_dispatch[cl.tag]].append((template, Class(
+            self._package_dispatch[cl.tag],
+            escape(cl.attrib["name"]),
+            package.attrib["name"],
+            cl.attrib["xmi.id"],
+            operations,
+            attributes,
+            None,
+            template.xmiId if template is not None else None,
+            cl.attrib["comment"] if "comment" in cl.attrib else None)))
+
+    def resolve(self):
+        """Build the element dict and apply all collected relations to it.
+
+        Returns a dict containing ALL elements (including DataTypes) by xmi.id.
+        """
         elements = {}
-        # Contains a list of classes / interfaces / enums by package
-        packages = {}
-        for package in package_list:
-            package_namespace = package.find(_umlSchema + "Namespace.ownedElement")
-            class_list = package_namespace.findall(_umlSchema + "Class")
-            class_list.extend(package_namespace.findall(_umlSchema + "Interface"))
-            class_list.extend(package_namespace.findall(_umlSchema + "Enumeration"))
-            class_dict = UMLData._parse_classes(class_list, package.attrib["name"])
-            elements.update(class_dict)
-            packages[package] = list(filter(lambda x: x.ty == ElementType.CLASS,
-                class_dict.values()))
-
-        for datatype in namespace_root.find("./{0}Package/{0}Namespace.ownedElement".format(_umlSchema))\
-                .findall(_umlSchema + "DataType"):
-            elements[datatype.attrib["xmi.id"]] = DataType(
-                    escape(datatype.attrib["name"]),
-                    datatype.attrib["xmi.id"],
-                    datatype.attrib["comment"] if "comment" in datatype.attrib else None)
+        # Packages are listed in document order, with the Logical View itself last
+        for package in [p for p in self._buckets if p is not self.model_view] + [self.model_view]:
+            self.classes[package] = []
+            for _, kind in _ModelVisitor._class_kinds:
+                for template, cl in self._buckets[package][kind]:
+                    if template is not None:
+                        elements[template.xmiId] = template
+                    elements[cl.xmiId] = cl
+                    self.classes[package].append(cl)
+        elements.update(self.datatypes)
 
         # Abstraction ~= Inheritance in UML-speak
-        for abstraction in namespace_root.findall(_umlSchema + "Abstraction"):
+        for abstraction in self.relations["Abstraction"]:
             elements[abstraction.attrib["client"]].abstraction = abstraction.attrib["supplier"]
             elements[abstraction.attrib["supplier"]].children.append(abstraction.attrib["client"])
 
-        for generalization in namespace_root.findall(_umlSchema + "Generalization"):
+        for generalization in self.relations["Generalization"]:
             elements[generalization.attrib["child"]].abstraction = generalization.attrib["parent"]
             elements[generalization.attrib["parent"]].children.append(generalization.attrib["child"])
 
-        for dependency in namespace_root.findall(_umlSchema + "Dependency"):
+        for dependency in self.relations["Dependency"]:
             if dependency.attrib["client"] not in elements or dependency.attrib["supplier"] not in elements:
                 continue
             elements[dependency.attrib["client"]].dependencies.append(Dependency(
             dependency.attrib["supplier"], dependency.attrib["comment"] if "comment" in dependency.attrib else None))
 
-        for association in namespace_root.findall(_umlSchema + "Association"):
+        for association in self.relations["Association"]:
             for start in association[0]:
                 for end in association[0]:
                     client = start.attrib["type"]
@@ -208,4 +370,4 @@ class UMLData:
                         end.attrib["multiplicity"] if "multiplicity" in end.attrib else None,
                         end.attrib["comment"] if "comment" in end.attrib else None))
 
-        return UMLData(tree, packages, elements, class_diagram_list, sequence_diagram_list)
+        return elements
@@ -0,0 +1,160 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for planning a uml2latex run without rendering anything."""
+
+from uml2latex.data import ElementType
+from uml2latex.images import check_diagrams, missing_tools
+from uml2latex.tex import strings as string_tables
+from uml2latex.tex.generate import TexInfo, make_tex_info
+from uml2latex.tex.classes import _make_package_descriptions
+
+# Rough costs of the external tools in seconds.
+# They only need to be good enough to tell a quick run from a long one.
+_umbrello_startup = 3.0
+_umbrello_per_diagram = 0.05
+_umbrello_per_line = 0.002
+_convert_per_process = 0.05
+_convert_per_diagram = 0.01
+
+class Plan:
+    """Describes the work a uml2latex run would do.
+
+    Attributes:
+        images: Whether images would be rendered at all.
+        diagrams: The number of diagrams in the project (including single class diagrams).
+        injected: The number of single class diagrams injected into the project.
+        current: The names of diagrams that are already up to date in the image directory.
+        hits: The names of diagrams that would be taken from the image store.
+        renders: The names of diagrams that would be rendered by Umbrello.
+        conversions: The number of rsvg-convert processes that would be started.
+        sections: A list of (section name, changed) pairs for the generated document.
+            changed is None if there is no previous output to compare against.
+        estimate: The estimated run time of the external tools in seconds.
+        missing_tools: The names of the external tools that can't be run.
+            Every diagram counts as to be rendered then, and rendering would fail.
+    """
+
+    def __init__(self):
+        self.images = False
+        self.diagrams = 0
+        self.injected = 0
+        self.current = []
+        self.hits = []
+        self.renders = []
+        self.conversions = 0
+        self.sections = []
+        self.estimate = 0.0
+        self.missing_tools = []
+
+def _plan_images(plan, umlData, image_dir, single_class_diagrams, store, batch, converter):
+    plan.injected = len(single_class_diagrams)
+    plan.missing_tools = missing_tools()
+    batch = set(batch or [])
+    (_, _, _, current, hits, missing) = check_diagrams(umlData.tree, image_dir, store, batch, False, converter)
+    plan.diagrams = len(current) + len(hits) + len(missing)
+    plan.current = current
+    plan.hits = hits
+    plan.renders = missing
+    if not plan.renders:
+        return
+
+    # Rendering time grows with the number of lines Umbrello has to draw
+    lines = {diagram.attrib["name"]: sum(1 for _ in diagram.iter())
+            for diagram in umlData.tree.getroot().iter("diagram")}
+    for cl in umlData.elements.values():
+        if cl.ty == ElementType.CLASS:
+            lines["Diagram_" + cl.name] = 1 + len(cl.operations) + len(cl.attributes)
+    plan.estimate = _umbrello_startup
+    for name in plan.renders:
+        plan.estimate += _umbrello_per_diagram + _umbrello_per_line * lines.get(name, 1)
+    unbatched = [name for name in plan.renders if name not in batch]
+    plan.conversions = len(unbatched) + (1 if len(unbatched) < len(plan.renders) else 0)
+    plan.estimate += plan.conversions * _convert_per_process + len(plan.renders) * _convert_per_diagram
+
+def _plan_sections(plan, umlData, override, image_dir, class_pages, output, compact, strings):
+    previous = None
+    if output is not None:
+        try:
+            with open(output, "r") as f:
+                previous = f.read()
+        except FileNotFoundError:
+            pass
+
+    info = make_tex_info(umlData, image_dir, override, class_pages=class_pages, compact=compact,
+            strings=strings)
+    for macro, function in TexInfo.default_root_template:
+        # Evaluated in order, since the module listing claims diagrams from the free diagram section
+        text = function(info)
+        plan.sections.append((macro[1:], text not in previous if previous is not None else None))
+        if macro == "%DESCRIPTIONS":
+            for package, classes in info.packages:
+                text = _make_package_descriptions(package.attrib["name"], classes, info.elements,
+                        info.refs, override.classes, image_dir, class_pages, info.compact, info.strings)
+                plan.sections.append(("    " + package.attrib["name"],
+                    text not in previous if previous is not None else None))
+
+def make_plan(umlData, override, image_dir, output, single_class_diagrams=None, store=None, batch=None,
+        converter="rsvg", compact=False, strings=string_tables.default):
+    """Work out what a run with the given configuration would do, without rendering anything.
+
+    Args:
+        umlData: The parsed UMLData.
+        override: The loaded Override information.
+        image_dir: The directory the images would be placed in.
+        output: The file the LaTeX would be written to, or None for stdout.
+        single_class_diagrams: The injected single class diagrams,
+            or None if no images would be rendered.
+        store: The ImageStore that would be used, if any.
+        batch: The names of diagrams that would be batched into one PDF, if any.
+        converter: The SVG converter that would be used.
+        compact: Whether the class descriptions would be written with compact macros.
+        strings: The string table the document would be written with.
+    """
+    plan = Plan()
+    class_pages = None
+    if single_class_diagrams is not None:
+        plan.images = True
+        _plan_images(plan, umlData, image_dir, single_class_diagrams, store, batch, converter)
+        if batch:
+            class_pages = {name: page for page, name in enumerate(sorted(batch), 1)}
+    _plan_sections(plan, umlData, override, image_dir, class_pages, output, compact, strings)
+    return plan
+
+def format_plan(plan):
+    """Return a human-readable report of the given Plan."""
+    if plan.images:
+        text = "Diagrams: {} ({} single class diagrams injected)\n".format(plan.diagrams, plan.injected)
+        if plan.missing_tools:
+            text += "Missing tools: {} (every diagram needs rendering, which would fail)\n".format(
+                    ", ".join(plan.missing_tools))
+        text += "Up to date: {}\n".format(len(plan.current))
+        text += "Image store hits: {}\n".format(len(plan.hits))
+        text += "Diagrams to render: {}\n".format(len(plan.renders))
+        for name in plan.renders:
+            text += "    {}\n".format(name)
+        text += "SVG conversions: {}\n".format(plan.conversions)
+        text += "Estimated rendering time: {:.1f}s\n".format(plan.estimate)
+    else:
+        text = "Diagrams: not rendered\n"
+    text += "Sections:\n"
+    for name, changed in plan.sections:
+        state = "unknown" if changed is None else ("changed" if changed else "unchanged")
+        text += "    {} ({})\n".format(name, state)
+    return text
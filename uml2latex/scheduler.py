@@ -0,0 +1,223 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Runs the external tools (Umbrello and rsvg-convert) concurrently, as far as memory allows.
+
+Umbrello loads the whole model and can take gigabytes of memory on big projects,
+while rsvg-convert needs next to nothing. Instead of a fixed number of processes,
+the scheduler starts another one only if the memory currently available
+still covers the peak resident set size (RSS) of an earlier process of that tool,
+the peaks of the running processes, and a reserve.
+Until a process of a tool has finished (and its real peak is known),
+nothing else is started next to it, unless an estimate for the tool was given.
+While they run, the RSS of all processes is sampled, and processes that exceed
+the per-process memory limit are killed.
+
+Memory is read from /proc, so on systems without it
+only the maximum number of processes is enforced.
+"""
+
+import os
+import time
+import select
+import subprocess
+
+from uml2latex import events
+
+# Memory left free for everything else, in bytes
+_reserve = 256 * 1024 * 1024
+# Seconds between samples of the memory of running processes
+_sample_interval = 0.05
+
+def available_memory():
+    """Return the memory available for new processes in bytes, or None if it is unknown."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def process_memory(pid):
+    """Return the current and the peak resident set size of a process in bytes, or None if they are unknown.
+
+    The peak (VmHWM) only covers the program the process runs now,
+    not the memory it shared with its parent before exec.
+    """
+    values = {}
+    try:
+        with open("/proc/{0}/status".format(pid), "r") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    values[line[:5]] = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if "VmRSS" not in values:
+        return None
+    return (values["VmRSS"], values.get("VmHWM", values["VmRSS"]))
+
+class MemoryLimitExceeded(RuntimeError):
+    """Raised when a tool process was killed for using more memory than the per-process limit."""
+
+class _Job:
+    def __init__(self, kind, args, prepare, done):
+        self.kind = kind
+        self.args = args
+        self.prepare = prepare
+        self.done = done
+        self.process = None
+        self.pidfd = None
+        self.peak = 0
+
+class ToolScheduler:
+    """Runs queued tool processes with adaptive concurrency.
+
+    Jobs are started in the order they were submitted.
+    The callbacks of finished jobs run in the thread calling run() and may submit more jobs.
+
+    Attributes:
+        max_jobs: The maximum number of processes running at once.
+        memory_limit: The maximum RSS of a single process in bytes, or None for no limit.
+        reserve: The memory in bytes that is left available for everything else.
+        peaks: A dict of tool kinds and the peak RSS of their finished processes in bytes,
+            used to estimate what new processes of the tool will take.
+            It may be filled in beforehand (e.g. with the peaks of an earlier run).
+        summary: A dict of tool kinds and dicts describing how they ran: the number of jobs,
+            the largest number of them running at once, their peak RSS in bytes (or None if it is unknown)
+            and the number of processes killed for exceeding memory_limit.
+            Filled in by run(), which also fires a tools_finished event with it.
+    """
+
+    def __init__(self, max_jobs=None, memory_limit=None, reserve=_reserve, peaks=None):
+        self.max_jobs = max_jobs if max_jobs is not None else (os.cpu_count() or 1)
+        self.memory_limit = memory_limit
+        self.reserve = reserve
+        self.peaks = dict(peaks) if peaks is not None else {}
+        self.summary = {}
+        self._queue = []
+        self._running = []
+        self._killed = []
+
+    def submit(self, kind, args=None, prepare=None, done=None):
+        """Queue a tool process.
+
+        Args:
+            kind: The name of the tool, used to estimate the memory the process will need.
+            args: The command line of the process.
+            prepare: A function returning the command line, called right before the process is started,
+                used instead of args (e.g. to write input files only once they are needed).
+            done: A function called with the return code once the process exited.
+        """
+        self._queue.append(_Job(kind, args, prepare, done))
+
+    def _stats(self, kind):
+        if kind not in self.summary:
+            self.summary[kind] = {"jobs": 0, "max_concurrency": 0, "peak_rss": None, "killed": 0}
+        return self.summary[kind]
+
+    def _fits(self, job):
+        """Return whether memory allows starting the given job next to the running ones."""
+        if not self._running:
+            return True
+        if len(self._running) >= self.max_jobs:
+            return False
+        available = available_memory()
+        if available is None:
+            return True
+        if any(running.kind not in self.peaks for running in self._running):
+            # A running process of a tool whose peak isn't known yet may still take any amount of memory.
+            # Its early samples say little, since tools like Umbrello grow while they load the model.
+            return False
+        # The running processes are counted with the full peak of their tool:
+        # they may still grow, and the available memory only catches up with them after a while
+        running = sum(self.peaks[running.kind] for running in self._running)
+        return available - running - self.peaks.get(job.kind, 0) >= self.reserve
+
+    def _start(self, job):
+        if job.prepare is not None:
+            job.args = job.prepare()
+        job.process = subprocess.Popen(job.args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if hasattr(os, "pidfd_open"):
+            try:
+                job.pidfd = os.pidfd_open(job.process.pid)
+            except OSError:
+                pass
+        self._running.append(job)
+        stats = self._stats(job.kind)
+        stats["jobs"] += 1
+        stats["max_concurrency"] = max(stats["max_concurrency"],
+                sum(1 for running in self._running if running.kind == job.kind))
+        total = self._stats("total")
+        total["jobs"] += 1
+        total["max_concurrency"] = max(total["max_concurrency"], len(self._running))
+
+    def _record(self, job, rss):
+        job.peak = max(job.peak, rss)
+        for kind in [job.kind, "total"]:
+            stats = self._stats(kind)
+            stats["peak_rss"] = max(stats["peak_rss"] or 0, rss)
+
+    def _sample(self, job):
+        memory = process_memory(job.process.pid)
+        if memory is None:
+            return
+        (rss, peak) = memory
+        self._record(job, peak)
+        if self.memory_limit is not None and rss > self.memory_limit:
+            job.process.kill()
+            self._killed.append(job)
+            self._stats(job.kind)["killed"] += 1
+            self._stats("total")["killed"] += 1
+
+    def _wait(self):
+        """Wait until a running process may have exited or it is time for the next sample."""
+        pidfds = [job.pidfd for job in self._running if job.pidfd is not None]
+        if len(pidfds) == len(self._running):
+            # The pidfds of exiting processes become readable, so there is no need to poll
+            select.select(pidfds, [], [], _sample_interval)
+        else:
+            time.sleep(_sample_interval / 10)
+
+    def run(self):
+        """Run all queued jobs (and those submitted by their callbacks) to completion.
+
+        Raises MemoryLimitExceeded if any process had to be killed; the other jobs still run.
+        """
+        while self._queue or self._running:
+            while self._queue and self._fits(self._queue[0]):
+                self._start(self._queue.pop(0))
+            self._wait()
+            for job in list(self._running):
+                code = job.process.poll()
+                if code is None:
+                    self._sample(job)
+                    continue
+                self._running.remove(job)
+                if job.pidfd is not None:
+                    os.close(job.pidfd)
+                # Processes that exit before they are sampled are small enough to count as known
+                self.peaks[job.kind] = max(self.peaks.get(job.kind, 0), job.peak)
+                if job.done is not None and job not in self._killed:
+                    job.done(code)
+        events.emit("tools_finished", tools=self.summary)
+        if self._killed:
+            raise MemoryLimitExceeded("{0} exceeded the memory limit of {1} MiB".format(
+                ", ".join(sorted({job.kind for job in self._killed})), self.memory_limit // (1024 * 1024)))
@@ -0,0 +1,147 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for estimating the size of classes in Umbrello diagrams from font metrics.
+
+Umbrello doesn't size the class widgets of generated diagrams by itself,
+so we compute the size of every class box from the text Umbrello will draw into it.
+The metrics below are those of the diagram font ("Noto Sans Mono,9", see diagrams.py).
+"""
+
+import math
+from bisect import bisect_right
+
+from uml2latex.data import ClassType
+
+# Font units per em and vertical metrics of Noto Sans Mono
+_units_per_em = 1000
+_ascender = 1069
+_descender = 293
+# 9pt at Qt's default 96 DPI
+_pixels_per_em = 9 * 96 / 72
+
+# Advance widths of Noto Sans Mono in font units by code point range.
+# Noto Sans Mono is monospaced, so nearly every glyph advances by 600 units.
+# Control characters and combining marks take up no space, wide East Asian characters
+# (rendered with a fallback font) take up a full em.
+# Entries are (first code point, last code point, advance), sorted by code point.
+_advance_table = [
+    (0x0000, 0x001f, 0),
+    (0x007f, 0x009f, 0),
+    (0x0300, 0x036f, 0),
+    (0x1100, 0x115f, 1000),
+    (0x200b, 0x200f, 0),
+    (0x2e80, 0x303e, 1000),
+    (0x3041, 0x33ff, 1000),
+    (0x3400, 0x4dbf, 1000),
+    (0x4e00, 0x9fff, 1000),
+    (0xa000, 0xa4cf, 1000),
+    (0xac00, 0xd7a3, 1000),
+    (0xf900, 0xfaff, 1000),
+    (0xfe30, 0xfe4f, 1000),
+    (0xff00, 0xff60, 1000),
+    (0xffe0, 0xffe6, 1000),
+]
+_default_advance = 600
+_advance_starts = [start for start, _, _ in _advance_table]
+
+# Padding Umbrello places around the text of a class widget, in pixels
+_margin = 5
+# Extra space for the template parameter box drawn at the top right of template classes
+_template_margin = 20
+
+_visibility = {"public": "+", "private": "-", "protected": "#", "implementation": "~"}
+
+_advance_cache = {}
+
+def _advance(char):
+    advance = _advance_cache.get(char)
+    if advance is None:
+        code = ord(char)
+        i = bisect_right(_advance_starts, code) - 1
+        advance = _default_advance
+        if i >= 0 and code <= _advance_table[i][1]:
+            advance = _advance_table[i][2]
+        _advance_cache[char] = advance
+    return advance
+
+def text_width(text):
+    """Return the width of the given text in pixels when drawn in the diagram font."""
+    if text.isascii() and text.isprintable():
+        # Every printable ASCII character has the default advance
+        return len(text) * _default_advance * _pixels_per_em / _units_per_em
+    return sum(_advance(c) for c in text) * _pixels_per_em / _units_per_em
+
+def line_height():
+    """Return the height of a line of text in the diagram font in pixels."""
+    return (_ascender + _descender) * _pixels_per_em / _units_per_em
+
+def _operation_signature(op, names):
+    args = ["{0} : {1}".format(param.name, names.get(param.type, "")) for param in op.parameters]
+    text = "{0}{1}({2})".format(_visibility.get(op.visibility, "+"), op.name, ", ".join(args))
+    ret = names.get(op.return_type)
+    if ret:
+        text += " : " + ret
+    return text
+
+def _attribute_signature(at, names):
+    text = _visibility.get(at.visibility, "+") + at.name
+    ty = names.get(at.type)
+    if ty:
+        text += " : " + ty
+    return text
+
+def class_lines(cl, names):
+    """Return the lines of text Umbrello draws into a class widget, grouped by compartment.
+
+    Args:
+        cl: The Class to get the text of.
+        names: A dict of unescaped element names by XMI ID.
+    """
+    header = []
+    if cl.class_type == ClassType.INTERFACE:
+        header.append("«interface»")
+    elif cl.class_type == ClassType.ENUM:
+        header.append("«enumeration»")
+    header.append("{0}::{1}".format(cl.package, names.get(cl.xmiId, cl.name)))
+    operations = [_operation_signature(op, names) for op in cl.operations]
+    # Attributes are only shown for classes (see make_single_class_diagram)
+    if cl.class_type != ClassType.CLASS:
+        return [header, operations]
+    attributes = [_attribute_signature(at, names) for at in cl.attributes]
+    return [header, attributes, operations]
+
+def estimate_class_sizes(classes, names):
+    """Compute the width and height of every given class in a single pass.
+
+    The results are stored in the approx_width and approx_height attributes of the classes.
+
+    Args:
+        classes: An iterable of the Class objects to size.
+        names: A dict of unescaped element names by XMI ID.
+    """
+    height = line_height()
+    for cl in classes:
+        compartments = class_lines(cl, names)
+        lines = [line for compartment in compartments for line in compartment]
+        width = max(text_width(line) for line in lines) + 2 * _margin
+        if cl.template is not None:
+            width += _template_margin
+        cl.approx_width = math.ceil(width)
+        cl.approx_height = math.ceil(len(lines) * height + 2 * _margin * len(compartments))
@@ -0,0 +1,185 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for sharing rendered diagrams between runs via a content-addressed store."""
+
+import os
+import shutil
+import hashlib
+import tempfile
+
+from uml2latex import xmlbackend
+
+_umlSchema = "{http://schema.omg.org/spec/UML/1.4}"
+
+class ImageStore:
+    """A directory of rendered diagram PDFs, addressed by a digest of their inputs.
+
+    The store can be shared between checkouts and CI workers
+    (e.g. by placing it on a network mount or in a CI cache directory).
+    Once it grows larger than max_size, the least recently used entries are evicted.
+    The directory is created unless create is False,
+    for stores that are only looked into (e.g. by --plan).
+
+    Attributes:
+        directory: The directory the rendered diagrams are stored in.
+        max_size: The maximum size of the store in bytes, or None if it is unlimited.
+    """
+
+    def __init__(self, directory, max_size=None, create=True):
+        self.directory = directory
+        self.max_size = max_size
+        if create:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".pdf")
+
+    def contains(self, key):
+        """Return whether a diagram with the given key is in the store."""
+        return os.path.exists(self._path(key))
+
+    def get(self, key, dest):
+        """Place the stored diagram for the given key at dest.
+
+        The file is hardlinked if possible and copied otherwise.
+        Returns whether the key was found in the store.
+
+        Args:
+            key: The digest of the diagram to look up.
+            dest: The path to place the diagram at.
+        """
+        path = self._path(key)
+        try:
+            # Touching the entry keeps track of when it was last used
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        if os.path.lexists(dest):
+            os.remove(dest)
+        try:
+            os.link(path, dest)
+        except OSError:
+            shutil.copyfile(path, dest)
+        return True
+
+    def put(self, key, src):
+        """Add a rendered diagram to the store.
+
+        The store may exceed max_size until evict is called,
+        so that a run adding many diagrams only walks the store once.
+
+        Args:
+            key: The digest of the diagram's inputs.
+            src: The path of the rendered diagram.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so other runs never see partial entries
+        fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, open(src, "rb") as s:
+                shutil.copyfileobj(s, f)
+            os.replace(tmppath, path)
+        except BaseException:
+            os.remove(tmppath)
+            raise
+
+    def evict(self):
+        """Remove the least recently used entries until the store fits into max_size."""
+        if self.max_size is None:
+            return
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for file in files:
+                if not file.endswith(".pdf"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, file))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, file)))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def index_model_elements(tree):
+    """Return a dict of all UML model elements in the given XML tree by their XMI ID."""
+    return {el.attrib["xmi.id"]: el for el in tree.iter()
+            if xmlbackend.is_element(el) and el.tag.startswith(_umlSchema) and "xmi.id" in el.attrib}
+
+# Attributes of widgets, messages and associations in diagrams that reference model elements
+_reference_attributes = ["xmi.id", "widgetaid", "widgetbid", "operation"]
+
+def diagram_dependencies(diagram, model_elements):
+    """Return the sorted XMI IDs of the model elements a diagram's widgets and associations reference.
+
+    Args:
+        diagram: The XML element of the diagram.
+        model_elements: A dict of UML model elements by XMI ID (see index_model_elements).
+    """
+    return sorted({el.attrib[attribute] for el in diagram.iter() for attribute in _reference_attributes
+        if attribute in el.attrib and el.attrib[attribute] in model_elements})
+
+def diagram_key(diagram, model_elements, renderer_version, dependencies=None, element_parts=None):
+    """Compute the store key of a diagram.
+
+    The key is a digest of everything that influences the rendered diagram:
+    the diagram's own XML, the XML of the model elements referenced by it,
+    the names of the types those elements use, and the version of the renderer.
+    The XML is digested in its canonical form (see xmlbackend.canonical),
+    so the keys are the same with every XML backend.
+
+    Args:
+        diagram: The XML element of the diagram.
+        model_elements: A dict of UML model elements by XMI ID (see index_model_elements).
+        renderer_version: A string identifying the tools used for rendering.
+        dependencies: The XMI IDs the diagram references (see diagram_dependencies).
+            If it is None, they are collected from the diagram.
+        element_parts: An optional dict to keep what model elements contribute to keys in
+            between calls, since most elements are referenced by several diagrams.
+    """
+    if dependencies is None:
+        dependencies = diagram_dependencies(diagram, model_elements)
+    digest = hashlib.sha256(renderer_version.encode("utf-8"))
+    digest.update(xmlbackend.canonical(diagram))
+    for xmiId in dependencies:
+        part = element_parts.get(xmiId) if element_parts is not None else None
+        if part is None:
+            part = _element_part(model_elements[xmiId], model_elements)
+            if element_parts is not None:
+                element_parts[xmiId] = part
+        digest.update(part)
+    return digest.hexdigest()
+
+def _element_part(element, model_elements):
+    """Return what a model element contributes to the keys of the diagrams referencing it."""
+    part = xmlbackend.canonical(element)
+    for ty in sorted({el.attrib["type"] for el in element.iter() if "type" in el.attrib}):
+        if ty in model_elements:
+            part += model_elements[ty].attrib.get("name", "").encode("utf-8")
+    return part
@@ -0,0 +1,489 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for converting the SVG files exported by Umbrello to PDF files without external tools.
+
+Umbrello exports diagrams through Qt's SVG generator, which only emits a small subset of SVG:
+groups with transforms and presentation attributes, rects, lines, polylines, polygons,
+circles, ellipses, paths made of straight lines and Bézier curves, and text.
+This module draws exactly that subset as vector PDF.
+Text is set in the PDF standard font Courier, which has the same advance width
+as the diagram font (see sizing.py), so it fits into the boxes Umbrello drew around it.
+Its encoding only covers Western European text, and shapes are drawn fully opaque or not at all.
+Anything else (including other scripts and partial transparency) raises UnsupportedSVG, so that the caller can fall back to rsvg-convert.
+"""
+
+import re
+import math
+import zlib
+
+from uml2latex import xmlbackend
+
+_svg = "{http://www.w3.org/2000/svg}"
+
+class UnsupportedSVG(Exception):
+    """Raised for SVG files that use features outside of the subset this module can draw."""
+
+# User units (CSS pixels) per unit
+_units = {"": 1, "px": 1, "pt": 4 / 3, "pc": 16, "mm": 96 / 25.4, "cm": 96 / 2.54, "in": 96}
+# PDF points per CSS pixel, as used by rsvg-convert
+_points_per_pixel = 0.75
+
+_number = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_length_pattern = re.compile(r"\s*(" + _number + r")\s*([a-z]*)\s*$")
+_number_pattern = re.compile(_number)
+_path_pattern = re.compile(r"[MmLlHhVvCcSsQqTtZzAa]|" + _number)
+_transform_pattern = re.compile(r"(\w+)\s*\(([^)]*)\)")
+
+def _length(value, default=None):
+    if value is None:
+        if default is None:
+            raise UnsupportedSVG("Missing length")
+        return default
+    match = _length_pattern.match(value)
+    if not match or match.group(2) not in _units:
+        raise UnsupportedSVG("Unsupported length '{}'".format(value))
+    return float(match.group(1)) * _units[match.group(2)]
+
+def _numbers(value):
+    return [float(n) for n in _number_pattern.findall(value or "")]
+
+_named_colors = {
+        "black": (0, 0, 0), "white": (255, 255, 255), "red": (255, 0, 0), "green": (0, 128, 0),
+        "blue": (0, 0, 255), "yellow": (255, 255, 0), "gray": (128, 128, 128), "grey": (128, 128, 128),
+        "silver": (192, 192, 192), "orange": (255, 165, 0), "lightgray": (211, 211, 211),
+        "lightgrey": (211, 211, 211), "darkgray": (169, 169, 169), "darkgrey": (169, 169, 169),
+        }
+
+def _color(value, current):
+    """Return a color as a tuple of floats between 0 and 1, or None if nothing is painted."""
+    value = value.strip()
+    if value in ("none", "transparent"):
+        return None
+    if value == "currentColor":
+        return _color(current, "black")
+    try:
+        if value.startswith("#") and len(value) == 4:
+            return tuple(int(c * 2, 16) / 255 for c in value[1:])
+        if value.startswith("#") and len(value) == 7:
+            return tuple(int(value[i:i + 2], 16) / 255 for i in (1, 3, 5))
+        if value.startswith("rgb(") and value.endswith(")"):
+            channels = value[4:-1].split(",")
+            if len(channels) == 3:
+                return tuple(float(c.strip()[:-1]) / 100 if c.strip().endswith("%") else float(c) / 255
+                        for c in channels)
+    except ValueError:
+        raise UnsupportedSVG("Unsupported color '{}'".format(value))
+    if value.lower() in _named_colors:
+        return tuple(c / 255 for c in _named_colors[value.lower()])
+    raise UnsupportedSVG("Unsupported color '{}'".format(value))
+
+# Presentation attributes passed on from groups to their children, with their initial values
+_inherited = {
+        "fill": "black", "fill-rule": "nonzero", "fill-opacity": "1",
+        "stroke": "none", "stroke-width": "1", "stroke-opacity": "1",
+        "stroke-linecap": "butt", "stroke-linejoin": "miter", "stroke-miterlimit": "4",
+        "stroke-dasharray": "none", "stroke-dashoffset": "0",
+        "font-size": "16", "font-weight": "normal", "font-style": "normal", "text-anchor": "start",
+        "visibility": "visible", "color": "black",
+        }
+
+def _opacity(value):
+    """Return whether an opacity leaves anything to draw; partial transparency isn't supported."""
+    try:
+        opacity = float(value)
+    except ValueError:
+        raise UnsupportedSVG("Unsupported opacity '{}'".format(value))
+    if 0 < opacity < 1:
+        raise UnsupportedSVG("Transparency is not supported")
+    return opacity > 0
+
+def _miterlimit(value):
+    try:
+        return float(value)
+    except ValueError:
+        raise UnsupportedSVG("Unsupported stroke-miterlimit '{}'".format(value))
+
+def _style(el, parent):
+    style = dict(parent)
+    for name in _inherited:
+        if name in el.attrib:
+            style[name] = el.attrib[name]
+    for declaration in el.attrib.get("style", "").split(";"):
+        if ":" in declaration:
+            (name, value) = declaration.split(":", 1)
+            if name.strip() in _inherited:
+                style[name.strip()] = value.strip()
+    if "url(" in style["fill"] or "url(" in style["stroke"] or "clip-path" in el.attrib or "mask" in el.attrib:
+        raise UnsupportedSVG("Paint servers, clipping and masks are not supported")
+    return style
+
+def _matrix(transform):
+    """Return the PDF matrix (a b c d e f) of an SVG transform attribute."""
+    result = [1, 0, 0, 1, 0, 0]
+    for name, args in _transform_pattern.findall(transform):
+        n = _numbers(args)
+        if name == "matrix" and len(n) == 6:
+            m = n
+        elif name == "translate" and len(n) in (1, 2):
+            m = [1, 0, 0, 1, n[0], n[1] if len(n) == 2 else 0]
+        elif name == "scale" and len(n) in (1, 2):
+            m = [n[0], 0, 0, n[1] if len(n) == 2 else n[0], 0, 0]
+        elif name == "rotate" and len(n) in (1, 3):
+            (cos, sin) = (math.cos(math.radians(n[0])), math.sin(math.radians(n[0])))
+            (cx, cy) = (n[1], n[2]) if len(n) == 3 else (0, 0)
+            m = [cos, sin, -sin, cos, cx - cos * cx + sin * cy, cy - sin * cx - cos * cy]
+        else:
+            raise UnsupportedSVG("Unsupported transform '{}'".format(name))
+        # Later transforms apply first, so they are multiplied from the left
+        (a, b, c, d, e, f) = result
+        result = [m[0] * a + m[1] * c, m[0] * b + m[1] * d,
+                m[2] * a + m[3] * c, m[2] * b + m[3] * d,
+                m[4] * a + m[5] * c + e, m[4] * b + m[5] * d + f]
+    return result
+
+def _num(value):
+    text = "{:.3f}".format(value).rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+# Distance of the control points from the end points when approximating quarter circles
+_kappa = 4 * (math.sqrt(2) - 1) / 3
+
+def _ellipse(cx, cy, rx, ry):
+    (kx, ky) = (rx * _kappa, ry * _kappa)
+    return [("m", cx + rx, cy),
+            ("c", cx + rx, cy + ky, cx + kx, cy + ry, cx, cy + ry),
+            ("c", cx - kx, cy + ry, cx - rx, cy + ky, cx - rx, cy),
+            ("c", cx - rx, cy - ky, cx - kx, cy - ry, cx, cy - ry),
+            ("c", cx + kx, cy - ry, cx + rx, cy - ky, cx + rx, cy),
+            ("h",)]
+
+def _rect(x, y, w, h, rx, ry):
+    if rx <= 0 and ry <= 0:
+        return [("re", x, y, w, h)]
+    (rx, ry) = (min(rx or ry, w / 2), min(ry or rx, h / 2))
+    (kx, ky) = (rx * _kappa, ry * _kappa)
+    return [("m", x + rx, y), ("l", x + w - rx, y),
+            ("c", x + w - rx + kx, y, x + w, y + ry - ky, x + w, y + ry), ("l", x + w, y + h - ry),
+            ("c", x + w, y + h - ry + ky, x + w - rx + kx, y + h, x + w - rx, y + h), ("l", x + rx, y + h),
+            ("c", x + rx - kx, y + h, x, y + h - ry + ky, x, y + h - ry), ("l", x, y + ry),
+            ("c", x, y + ry - ky, x + rx - kx, y, x + rx, y), ("h",)]
+
+def _points(value, close):
+    n = _numbers(value)
+    segments = [("m" if i == 0 else "l", n[i], n[i + 1]) for i in range(0, len(n) - 1, 2)]
+    return segments + [("h",)] if close and segments else segments
+
+def _path(data):
+    """Translate SVG path data into PDF path segments."""
+    tokens = _path_pattern.findall(data)
+    segments = []
+    (x, y) = (0, 0)
+    (start_x, start_y) = (0, 0)
+    # The last control point, for the shorthand curve commands
+    control = None
+    command = None
+    i = 0
+
+    def take(count):
+        nonlocal i
+        if i + count > len(tokens) or any(t.isalpha() for t in tokens[i:i + count]):
+            raise UnsupportedSVG("Malformed path data")
+        values = [float(t) for t in tokens[i:i + count]]
+        i += count
+        return values
+
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+        elif command is None:
+            raise UnsupportedSVG("Malformed path data")
+        relative = command.islower()
+        (ox, oy) = (x, y) if relative else (0, 0)
+        upper = command.upper()
+        previous_control = control
+        control = None
+        if upper == "Z":
+            segments.append(("h",))
+            (x, y) = (start_x, start_y)
+            continue
+        elif upper == "M":
+            (px, py) = take(2)
+            (x, y) = (start_x, start_y) = (ox + px, oy + py)
+            segments.append(("m", x, y))
+            # Further coordinate pairs are implicit line segments
+            command = "l" if relative else "L"
+        elif upper == "L":
+            (px, py) = take(2)
+            (x, y) = (ox + px, oy + py)
+            segments.append(("l", x, y))
+        elif upper == "H":
+            x = (x if relative else 0) + take(1)[0]
+            segments.append(("l", x, y))
+        elif upper == "V":
+            y = (y if relative else 0) + take(1)[0]
+            segments.append(("l", x, y))
+        elif upper in ("C", "S"):
+            if upper == "C":
+                (x1, y1) = take(2)
+                (x1, y1) = (ox + x1, oy + y1)
+            else:
+                (x1, y1) = (2 * x - previous_control[0], 2 * y - previous_control[1]) \
+                        if previous_control is not None else (x, y)
+            (x2, y2, px, py) = take(4)
+            control = (ox + x2, oy + y2)
+            segments.append(("c", x1, y1, ox + x2, oy + y2, ox + px, oy + py))
+            (x, y) = (ox + px, oy + py)
+        elif upper in ("Q", "T"):
+            if upper == "Q":
+                (qx, qy) = take(2)
+                (qx, qy) = (ox + qx, oy + qy)
+            else:
+                (qx, qy) = (2 * x - previous_control[0], 2 * y - previous_control[1]) \
+                        if previous_control is not None else (x, y)
+            (px, py) = take(2)
+            (px, py) = (ox + px, oy + py)
+            # Raise the quadratic curve to a cubic one
+            segments.append(("c", x + 2 / 3 * (qx - x), y + 2 / 3 * (qy - y),
+                    px + 2 / 3 * (qx - px), py + 2 / 3 * (qy - py), px, py))
+            control = (qx, qy)
+            (x, y) = (px, py)
+        else:
+            raise UnsupportedSVG("Unsupported path command '{}'".format(command))
+    return segments
+
+def _segments_to_pdf(segments):
+    ops = []
+    for segment in segments:
+        ops.append(" ".join(_num(v) for v in segment[1:]) + (" " if len(segment) > 1 else "") + segment[0])
+    return ops
+
+_fonts = {(False, False): "F1", (True, False): "F2", (False, True): "F3", (True, True): "F4"}
+_font_names = ["Courier", "Courier-Bold", "Courier-Oblique", "Courier-BoldOblique"]
+# Advance width of every Courier glyph in ems
+_courier_advance = 0.6
+
+def _pdf_string(text):
+    try:
+        # The standard fonts only cover WinAnsiEncoding
+        encoded = text.encode("cp1252")
+    except UnicodeEncodeError:
+        raise UnsupportedSVG("Text outside of WinAnsiEncoding: '{}'".format(text))
+    return "(" + encoded.decode("latin-1").replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+class _Page:
+    """Collects the PDF content stream of a single SVG document."""
+
+    def __init__(self):
+        self.ops = []
+
+    def draw(self, el, style):
+        if not xmlbackend.is_element(el) or el.attrib.get("display") == "none":
+            return
+        tag = el.tag[len(_svg):] if el.tag.startswith(_svg) else el.tag
+        if tag in ("title", "desc", "defs", "metadata", "style"):
+            return
+        style = _style(el, style)
+        opacity = el.attrib.get("opacity", "1")
+        for declaration in el.attrib.get("style", "").split(";"):
+            if declaration.split(":", 1)[0].strip() == "opacity":
+                opacity = declaration.split(":", 1)[1].strip()
+        if not _opacity(opacity) or style["visibility"] == "hidden":
+            return
+        self.ops.append("q")
+        if "transform" in el.attrib:
+            self.ops.append(" ".join(_num(v) for v in _matrix(el.attrib["transform"])) + " cm")
+        if tag in ("g", "a"):
+            for child in el:
+                self.draw(child, style)
+        elif tag == "text":
+            self._text(el, style)
+        else:
+            self._shape(tag, el, style)
+        self.ops.append("Q")
+
+    def _shape(self, tag, el, style):
+        att = el.attrib
+        if tag == "rect":
+            (w, h) = (_length(att.get("width")), _length(att.get("height")))
+            if w <= 0 or h <= 0:
+                return
+            segments = _rect(_length(att.get("x"), 0), _length(att.get("y"), 0), w, h,
+                    _length(att.get("rx"), 0), _length(att.get("ry"), 0))
+        elif tag == "line":
+            segments = [("m", _length(att.get("x1"), 0), _length(att.get("y1"), 0)),
+                    ("l", _length(att.get("x2"), 0), _length(att.get("y2"), 0))]
+            style = dict(style, fill="none")
+        elif tag in ("polyline", "polygon"):
+            segments = _points(att.get("points"), tag == "polygon")
+        elif tag == "circle":
+            r = _length(att.get("r"))
+            segments = _ellipse(_length(att.get("cx"), 0), _length(att.get("cy"), 0), r, r)
+        elif tag == "ellipse":
+            segments = _ellipse(_length(att.get("cx"), 0), _length(att.get("cy"), 0),
+                    _length(att.get("rx")), _length(att.get("ry")))
+        elif tag == "path":
+            segments = _path(att.get("d", ""))
+        else:
+            raise UnsupportedSVG("Unsupported element '{}'".format(tag))
+        if not segments:
+            return
+        fill = _color(style["fill"], style["color"]) if _opacity(style["fill-opacity"]) else None
+        stroke = _color(style["stroke"], style["color"]) if _opacity(style["stroke-opacity"]) else None
+        if fill is not None:
+            self.ops.append("{} {} {} rg".format(*(_num(c) for c in fill)))
+        if stroke is not None:
+            self.ops.append("{} {} {} RG".format(*(_num(c) for c in stroke)))
+            self.ops.append(_num(_length(style["stroke-width"])) + " w")
+            self.ops.append({"butt": "0", "round": "1", "square": "2"}.get(style["stroke-linecap"], "0") + " J")
+            self.ops.append({"miter": "0", "round": "1", "bevel": "2"}.get(style["stroke-linejoin"], "0") + " j")
+            self.ops.append(_num(_miterlimit(style["stroke-miterlimit"])) + " M")
+            dashes = _numbers(style["stroke-dasharray"]) if style["stroke-dasharray"] != "none" else []
+            if dashes and any(dashes):
+                self.ops.append("[{}] {} d".format(" ".join(_num(d) for d in dashes),
+                    _num(_length(style["stroke-dashoffset"]))))
+        self.ops.extend(_segments_to_pdf(segments))
+        even_odd = "*" if style["fill-rule"] == "evenodd" else ""
+        if fill is not None and stroke is not None:
+            self.ops.append("B" + even_odd)
+        elif fill is not None:
+            self.ops.append("f" + even_odd)
+        elif stroke is not None:
+            self.ops.append("S")
+        else:
+            self.ops.append("n")
+
+    def _text(self, el, style):
+        x = _length(el.attrib.get("x", "0").split()[0] if el.attrib.get("x") else None, 0)
+        y = _length(el.attrib.get("y", "0").split()[0] if el.attrib.get("y") else None, 0)
+        preserve = el.attrib.get("{http://www.w3.org/XML/1998/namespace}space") == "preserve"
+        runs = []
+
+        def add(text, run_style, position):
+            if not text:
+                return
+            if not preserve:
+                text = " ".join(text.split())
+            if text:
+                runs.append((text, run_style, position))
+
+        add(el.text, style, (x, y))
+        for child in el:
+            if not xmlbackend.is_element(child):
+                continue
+            if child.tag not in (_svg + "tspan", "tspan") or len(child) > 0 \
+                    or "dx" in child.attrib or "dy" in child.attrib:
+                raise UnsupportedSVG("Unsupported text content")
+            position = None
+            if "x" in child.attrib or "y" in child.attrib:
+                position = (_length(child.attrib.get("x"), x), _length(child.attrib.get("y"), y))
+            add(child.text, _style(child, style), position)
+            add(child.tail, style, None)
+
+        for text, run_style, position in runs:
+            fill = _color(run_style["fill"], run_style["color"]) if _opacity(run_style["fill-opacity"]) else None
+            if fill is None:
+                continue
+            size = _length(run_style["font-size"])
+            if position is not None:
+                (x, y) = position
+                width = len(text) * _courier_advance * size
+                if run_style["text-anchor"] == "middle":
+                    x -= width / 2
+                elif run_style["text-anchor"] == "end":
+                    x -= width
+            weight = run_style["font-weight"]
+            bold = weight in ("bold", "bolder") or (weight.isdigit() and int(weight) >= 600)
+            italic = run_style["font-style"] in ("italic", "oblique")
+            self.ops.append("{} {} {} rg".format(*(_num(c) for c in fill)))
+            # The page is flipped to SVG's downwards y axis, so the text has to be flipped back
+            self.ops.append("BT /{} {} Tf 1 0 0 -1 {} {} Tm {} Tj ET".format(_fonts[(bold, italic)],
+                _num(size), _num(x), _num(y), _pdf_string(text)))
+            x += len(text) * _courier_advance * size
+
+def _read_page(file):
+    """Return the width and height in points and the content stream of an SVG file's page."""
+    try:
+        with open(file, "rb") as f:
+            root = xmlbackend.parse(f).getroot()
+    except (UnsupportedSVG, OSError):
+        raise
+    except Exception as e:
+        raise UnsupportedSVG("Could not parse {}: {}".format(file, e))
+    if root.tag not in (_svg + "svg", "svg"):
+        raise UnsupportedSVG("{} is not an SVG document".format(file))
+    view_box = _numbers(root.attrib.get("viewBox"))
+    if len(view_box) != 4:
+        view_box = None
+    width = _length(root.attrib.get("width"), view_box[2] if view_box else None)
+    height = _length(root.attrib.get("height"), view_box[3] if view_box else None)
+    page = _Page()
+    # Flip the page to SVG's coordinate system
+    page.ops.append("{0} 0 0 {1} 0 {2} cm".format(_num(_points_per_pixel), _num(-_points_per_pixel),
+        _num(height * _points_per_pixel)))
+    if view_box is not None and view_box[2] > 0 and view_box[3] > 0 and view_box != [0, 0, width, height]:
+        (sx, sy) = (width / view_box[2], height / view_box[3])
+        page.ops.append("{} 0 0 {} {} {} cm".format(_num(sx), _num(sy), _num(-view_box[0] * sx), _num(-view_box[1] * sy)))
+    style = dict(_inherited)
+    for child in root:
+        page.draw(child, _style(root, style))
+    return (width * _points_per_pixel, height * _points_per_pixel, "\n".join(page.ops).encode("latin-1"))
+
+def _write_pdf(pages, pdf):
+    font_ids = list(range(3, 3 + len(_font_names)))
+    page_ids = [font_ids[-1] + 1 + 2 * i for i in range(len(pages))]
+    objects = [
+            "<< /Type /Catalog /Pages 2 0 R >>".encode("ascii"),
+            "<< /Type /Pages /Kids [{}] /Count {} >>".format(" ".join("{} 0 R".format(i) for i in page_ids),
+                len(pages)).encode("ascii"),
+            ]
+    objects.extend("<< /Type /Font /Subtype /Type1 /BaseFont /{} /Encoding /WinAnsiEncoding >>".format(name)
+            .encode("ascii") for name in _font_names)
+    fonts = " ".join("/{} {} 0 R".format(_fonts[key], font_ids[_font_names.index(name)])
+            for key, name in zip(_fonts, _font_names))
+    for page_id, (width, height, content) in zip(page_ids, pages):
+        objects.append("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {} {}] /Resources << /Font << {} >> >> /Contents {} 0 R >>"
+                .format(_num(width), _num(height), fonts, page_id + 1).encode("ascii"))
+        stream = zlib.compress(content)
+        objects.append("<< /Length {} /Filter /FlateDecode >>\nstream\n".format(len(stream)).encode("ascii")
+                + stream + b"\nendstream")
+
+    data = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += "{} 0 obj\n".format(number).encode("ascii") + body + b"\nendobj\n"
+    xref = len(data)
+    data += "xref\n0 {}\n0000000000 65535 f \n".format(len(objects) + 1).encode("ascii")
+    data += "".join("{:010} 00000 n \n".format(offset) for offset in offsets).encode("ascii")
+    data += "trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n".format(len(objects) + 1, xref).encode("ascii")
+    with open(pdf, "wb") as f:
+        f.write(data)
+
+def convert(files, pdf):
+    """Convert SVG files exported by Umbrello to a PDF file with one page per SVG file.
+
+    Nothing is written if any of the files can't be converted.
+
+    Args:
+        files: The SVG files to convert, in the order of their pages.
+        pdf: The path of the PDF file to create.
+    """
+    _write_pdf([_read_page(file) for file in files], pdf)
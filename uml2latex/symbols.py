@@ -0,0 +1,146 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for writing the parsed model to an SQLite symbol index for other tools.
+
+The database contains the following tables:
+    packages(xmi_id, name, docs)
+    elements(xmi_id, name, kind, package, docs, digest)
+    operations(xmi_id, class_id, position, name, return_type, visibility, docs)
+    parameters(operation_id, class_id, position, name, type)
+    attributes(xmi_id, class_id, position, name, type, visibility, docs)
+    relations(kind, source, target, name, multiplicity, docs)
+
+kind is one of 'class', 'interface', 'enum', 'datatype' and 'template' for elements
+and one of 'generalization', 'dependency' and 'association' for relations.
+All references to other elements (types, sources, targets) are XMI IDs.
+Names are stored as they appear in Umbrello, not escaped for LaTeX.
+"""
+
+import sqlite3
+import hashlib
+
+from uml2latex.data import ElementType, ClassType
+
+_schema = """
+CREATE TABLE IF NOT EXISTS packages (xmi_id TEXT PRIMARY KEY, name TEXT, docs TEXT);
+CREATE INDEX IF NOT EXISTS packages_name ON packages (name);
+CREATE TABLE IF NOT EXISTS elements (xmi_id TEXT PRIMARY KEY, name TEXT, kind TEXT,
+    package TEXT, docs TEXT, digest TEXT);
+CREATE INDEX IF NOT EXISTS elements_name ON elements (name);
+CREATE TABLE IF NOT EXISTS operations (xmi_id TEXT, class_id TEXT, position INTEGER,
+    name TEXT, return_type TEXT, visibility TEXT, docs TEXT);
+CREATE INDEX IF NOT EXISTS operations_class ON operations (class_id);
+CREATE INDEX IF NOT EXISTS operations_name ON operations (name);
+CREATE TABLE IF NOT EXISTS parameters (operation_id TEXT, class_id TEXT, position INTEGER,
+    name TEXT, type TEXT);
+CREATE INDEX IF NOT EXISTS parameters_class ON parameters (class_id);
+CREATE INDEX IF NOT EXISTS parameters_type ON parameters (type);
+CREATE TABLE IF NOT EXISTS attributes (xmi_id TEXT, class_id TEXT, position INTEGER,
+    name TEXT, type TEXT, visibility TEXT, docs TEXT);
+CREATE INDEX IF NOT EXISTS attributes_class ON attributes (class_id);
+CREATE INDEX IF NOT EXISTS attributes_type ON attributes (type);
+CREATE TABLE IF NOT EXISTS relations (kind TEXT, source TEXT, target TEXT,
+    name TEXT, multiplicity TEXT, docs TEXT);
+CREATE INDEX IF NOT EXISTS relations_source ON relations (source);
+CREATE INDEX IF NOT EXISTS relations_target ON relations (target);
+"""
+
+_class_kinds = {ClassType.CLASS: "class", ClassType.INTERFACE: "interface", ClassType.ENUM: "enum"}
+
+def _element_rows(element, name):
+    """Return a dict of the rows describing an element, by table name.
+
+    Args:
+        element: The element to describe.
+        name: The name of the element as it appears in Umbrello
+            (element.name is escaped for LaTeX, which can't be undone, see utils.escape).
+    """
+    rows = {"operations": [], "parameters": [], "attributes": [], "relations": []}
+    if element.ty == ElementType.CLASS:
+        rows["elements"] = (element.xmiId, name, _class_kinds[element.class_type],
+                element.package, element.docs)
+        for i, op in enumerate(element.operations):
+            rows["operations"].append((op.xmiId, element.xmiId, i, op.name, op.return_type, op.visibility, op.docs))
+            for j, param in enumerate(op.parameters):
+                rows["parameters"].append((op.xmiId, element.xmiId, j, param.name, param.type))
+        for i, at in enumerate(element.attributes):
+            rows["attributes"].append((at.xmiId, element.xmiId, i, at.name, at.type, at.visibility, at.docs))
+        if element.abstraction is not None:
+            rows["relations"].append(("generalization", element.xmiId, element.abstraction, None, None, None))
+        for dep in element.dependencies:
+            rows["relations"].append(("dependency", element.xmiId, dep.target, None, None, dep.docs))
+        for a in element.associations:
+            rows["relations"].append(("association", element.xmiId, a.target, a.name, a.multiplicity, a.docs))
+    elif element.ty == ElementType.DATATYPE:
+        rows["elements"] = (element.xmiId, name, "datatype", None, element.docs)
+    else:
+        rows["elements"] = (element.xmiId, name, "template", None, element.docs)
+    return rows
+
+def _delete_element(db, xmiId):
+    db.execute("DELETE FROM elements WHERE xmi_id = ?", (xmiId,))
+    for table in ["operations", "parameters", "attributes"]:
+        db.execute("DELETE FROM {} WHERE class_id = ?".format(table), (xmiId,))
+    db.execute("DELETE FROM relations WHERE source = ?", (xmiId,))
+
+def write_symbol_index(umlData, path):
+    """Write the parsed model to the SQLite database at the given path.
+
+    If the database already exists, only elements whose data changed are rewritten
+    and elements that no longer exist are removed.
+    Returns the number of elements that were (re)written.
+
+    Args:
+        umlData: The UMLData to write.
+        path: The path of the database file.
+    """
+    db = sqlite3.connect(path)
+    try:
+        with db:
+            # The packages are rewritten on every run, dropping the table also
+            # replaces it in databases written before it was keyed by XMI ID
+            db.execute("DROP TABLE IF EXISTS packages")
+            db.executescript(_schema)
+            db.executemany("INSERT INTO packages VALUES (?, ?, ?)",
+                    [(package.attrib.get("xmi.id"), package.attrib["name"], package.attrib.get("comment"))
+                        for package in umlData.packages])
+
+            digests = dict(db.execute("SELECT xmi_id, digest FROM elements"))
+            for xmiId in digests.keys() - umlData.elements.keys():
+                _delete_element(db, xmiId)
+
+            written = 0
+            for xmiId, element in umlData.elements.items():
+                if element.ty not in [ElementType.CLASS, ElementType.DATATYPE, ElementType.TEMPLATE]:
+                    continue
+                rows = _element_rows(element, umlData.names[xmiId])
+                digest = hashlib.sha256(repr(sorted(rows.items())).encode("utf-8")).hexdigest()
+                if digests.get(xmiId) == digest:
+                    continue
+                _delete_element(db, xmiId)
+                db.execute("INSERT INTO elements VALUES (?, ?, ?, ?, ?, ?)", rows.pop("elements") + (digest,))
+                for table, table_rows in rows.items():
+                    if table_rows:
+                        db.executemany("INSERT INTO {} VALUES ({})".format(table,
+                            ", ".join("?" * len(table_rows[0]))), table_rows)
+                written += 1
+    finally:
+        db.close()
+    return written
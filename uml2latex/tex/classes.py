@@ -19,97 +19,215 @@
 
 """Generates LaTeX class descriptions."""
 
-import re
+import sys
 
+from uml2latex import events
+from uml2latex.tex import strings as string_tables
+from uml2latex.tex.fragments import fragment_context
 from uml2latex.tex.common import *
+from uml2latex.tex.references import referenced_ids, inherited_ids
 from uml2latex.utils import escape
-from uml2latex.data import ElementType
+
+# {0}: The class name. {1}: The inherits line, if any.
+_header = """\t\t\\subsubsection{{{0}}}
+			\\label{{{0}}}{1}\n"""
+# {0}: The inherits string of the string table. {1}: The reference to the base class.
+_inherits = "\n\t\t\t\\textbf{{{0} {1}}}"
+# {0}: The path of the diagram.
+_diagram = """\t\t\t\\begin{{center}}
+				\\includegraphics[width=\\textwidth]{{{0}}}
+			\\end{{center}}\n"""
+# {0}: The page of the diagram. {1}: The path of the batched PDF.
+_diagram_page = """\t\t\t\\begin{{center}}
+				\\includegraphics[page={0},width=\\textwidth]{{{1}}}
+			\\end{{center}}\n"""
+# {0}: The reference to the listed element.
+_ref_item = "\t\t\t\t\t\\item \\texttt{{{0}}}\n"
+
+# The strings class descriptions are made of, written out or as the macros of the compact preamble.
+# Each compact string is a call to the macro defined as the written out string (see compact_preamble).
+_formats = {
+    False: {"header": _header, "inherits": _inherits, "diagram": _diagram, "diagram_page": _diagram_page,
+        "begin": beginItem, "end": endItem, "item": asItem, "operation": asItem, "attribute": asItem,
+        "ref": _ref_item},
+    True: {"header": "\\umlclass{{{0}}}{1}\n", "inherits": "\n\\umlinherits{{{1}}}",
+        "diagram": "\\umldiagram{{{0}}}\n", "diagram_page": "\\umldiagrampage{{{0}}}{{{1}}}\n",
+        "begin": "\\umlbeginlist{{{0}}}\n", "end": "\\umlendlist\n", "item": "\\umlitem{{{0}}}{{{1}}}\n",
+        "operation": "\\umlop{{{0}}}{{{1}}}\n", "attribute": "\\umlattr{{{0}}}{{{1}}}\n",
+        "ref": "\\umlref{{{0}}}\n"},
+}
+
+# The macros of the compact preamble: (name, format, arguments to format it with).
+# The arguments are formatted with the string table first.
+_macros = [
+    ("umlclass", "header", ["#1", ""]),
+    ("umlinherits", "inherits", ["{inherits}", "#1"]),
+    ("umldiagram", "diagram", ["#1"]),
+    ("umldiagrampage", "diagram_page", ["#1", "#2"]),
+    ("umlbeginlist", "begin", ["#1"]),
+    ("umlendlist", "end", []),
+    ("umlitem", "item", ["#1", "#2"]),
+    ("umlop", "operation", ["#1", "#2"]),
+    ("umlattr", "attribute", ["#1", "#2"]),
+    ("umlref", "ref", ["#1"]),
+]
+
+def compact_preamble(strings=string_tables.default):
+    """Return the macro definitions the compact output mode relies on.
+
+    Every macro expands to exactly the text the default output mode writes out,
+    so both modes render the same. The macros are defined with \\providecommand,
+    so they can be restyled by defining them before the generated file is included.
+
+    Args:
+        strings: The string table of the document.
+    """
+    text = ""
+    for name, entry, args in _macros:
+        count = sum(1 for arg in args if arg.startswith("#"))
+        args = [arg.format(**strings) for arg in args]
+        # Strings without arguments (endItem) are used as they are, not formatted
+        body = (_formats[False][entry].format(*args) if args else _formats[False][entry]).strip()
+        text += "\\providecommand{{\\{0}}}{1}{{{2}}}\n".format(name,
+                "[{}]".format(count) if count else "", body)
+    return text
 
 def _make_class_header(clinfo):
-    return """\t\t\\subsubsection{{{0}}}
-			\\label{{{0}}}{1}\n""".format(clinfo.cl.name,
-        "\n\t\t\t\\textbf{erbt von " + clinfo.ref(clinfo.cl.abstraction) + "}" \
+    return clinfo.formats["header"].format(clinfo.cl.name,
+        clinfo.formats["inherits"].format(clinfo.strings["inherits"], clinfo.ref(clinfo.cl.abstraction)) \
             if clinfo.cl.abstraction is not None else "")
 
 def _make_class_single_diagram(clinfo):
-    return """\t\t\t\\begin{{center}}
-				\\includegraphics[width=\\textwidth]{{{1}/Diagram_{0}.pdf}}
-			\\end{{center}}\n""".format(clinfo.cl.name, clinfo.image_dir)
+    if clinfo.pages is not None:
+        page = clinfo.pages.get("Diagram_" + clinfo.cl.name)
+        if page is not None:
+            return clinfo.formats["diagram_page"].format(page, "{0}/classes.pdf".format(clinfo.image_dir))
+        # Pointing at any page of classes.pdf would silently show the wrong class
+        print("uml2latex: Diagram_{0} has no page in classes.pdf, using Diagram_{0}.pdf instead".format(
+                clinfo.cl.name), file=sys.stderr)
+    return clinfo.formats["diagram"].format("{1}/Diagram_{0}.pdf".format(clinfo.cl.name, clinfo.image_dir))
 
 def _make_class_description(clinfo):
-    return """\t\t\t{0}\n""".format(doc(clinfo.cl.docs, clinfo.cl.name))
+    return """\t\t\t{0}\n""".format(doc(clinfo.cl.docs, clinfo.cl.name, clinfo.strings))
 
 def _make_class_template_list(clinfo):
     if clinfo.cl.template is None:
         return ""
     template = clinfo.elements[clinfo.cl.template]
-    text = beginItem.format("Typparameter")
+    text = clinfo.formats["begin"].format(clinfo.strings["type_parameters"])
     ty = clinfo.ref(template.bound) if template.bound is not None else ""
-    text += asItem.format(ty + template.name, doc(template.docs, template.name))
-    text += endItem
+    text += clinfo.formats["item"].format(ty + template.name, doc(template.docs, template.name, clinfo.strings))
+    text += clinfo.formats["end"]
     return text
 
+def _operation_signature(clinfo, op):
+    opName = escape(op.name)
+    ret = "void"
+    if op.return_type is not None:
+        ret = clinfo.ref(op.return_type) if op.return_type in clinfo.refs else "Nested classes aren't supported."
+    args = [escape(param.name) + ": " + clinfo.ref(param.type) \
+            if param.type in clinfo.refs else "Nested classes aren't supported." for param in op.parameters]
+    return "{0} {1}({2})".format(ret, opName, ", ".join(args))
+
+def _attribute_signature(clinfo, at):
+    ty = ""
+    if at.type is not None:
+        ty = clinfo.ref(at.type) + " "
+    return ty + escape(at.name)
+
 def _make_class_operations_list(clinfo):
     if not clinfo.cl.operations:
         return ""
-    text = beginItem.format("Operationen")
+    text = clinfo.formats["begin"].format(clinfo.strings["operations"])
     for op in clinfo.cl.operations:
-        opName = escape(op.attrib["name"])
-        ret = "void"
-        args = []
-        if len(op) >= 1:
-            for param in op[0]:
-                ty = param.attrib["type"]
-                if "kind" in param.attrib and param.attrib["kind"] == "return":
-                    ret = clinfo.ref(ty) if ty in clinfo.elements else "Nested classes aren't supported."
-                else:
-                    args.append(escape(param.attrib["name"]) + ": " + clinfo.ref(ty) \
-                        if ty in clinfo.elements else "Nested classes aren't supported.")
-        text += asItem.format("{0} {1}({2})".format(ret, opName, ", ".join(args)),
-            attrdoc(op.attrib, "comment", opName))
-    text += endItem
+        text += clinfo.formats["operation"].format(_operation_signature(clinfo, op), doc(op.docs, escape(op.name), clinfo.strings))
+    text += clinfo.formats["end"]
     return text
 
 def _make_class_attributes_list(clinfo):
     if not clinfo.cl.attributes:
         return ""
-    text = beginItem.format("Attribute")
+    text = clinfo.formats["begin"].format(clinfo.strings["attributes"])
     for at in clinfo.cl.attributes:
-        atName = escape(at.attrib["name"])
-        ty = ""
-        if "type" in at.attrib:
-            ty = clinfo.ref(at.attrib["type"]) + " "
-        text += asItem.format(ty + atName, attrdoc(at.attrib, "comment", atName))
-    text += endItem
+        text += clinfo.formats["attribute"].format(_attribute_signature(clinfo, at), doc(at.docs, escape(at.name), clinfo.strings))
+    text += clinfo.formats["end"]
+    return text
+
+def _make_class_inherited_list(clinfo):
+    # Members redefined by the class or a nearer ancestor are hidden, private ones aren't inherited
+    operations = []
+    attributes = []
+    seen_operations = {op.name for op in clinfo.cl.operations}
+    seen_attributes = {at.name for at in clinfo.cl.attributes}
+    for ancestor in clinfo.cl.ancestors:
+        for op in clinfo.elements[ancestor].operations:
+            if op.visibility != "private" and op.name not in seen_operations:
+                seen_operations.add(op.name)
+                operations.append((ancestor, op))
+        for at in clinfo.elements[ancestor].attributes:
+            if at.visibility != "private" and at.name not in seen_attributes:
+                seen_attributes.add(at.name)
+                attributes.append((ancestor, at))
+    text = ""
+    if operations:
+        text += clinfo.formats["begin"].format(clinfo.strings["inherited_operations"])
+        for ancestor, op in operations:
+            text += clinfo.formats["operation"].format(_operation_signature(clinfo, op),
+                "({0} {1}) {2}".format(clinfo.strings["inherited_from"], clinfo.ref(ancestor), doc(op.docs, escape(op.name), clinfo.strings)))
+        text += clinfo.formats["end"]
+    if attributes:
+        text += clinfo.formats["begin"].format(clinfo.strings["inherited_attributes"])
+        for ancestor, at in attributes:
+            text += clinfo.formats["attribute"].format(_attribute_signature(clinfo, at),
+                "({0} {1}) {2}".format(clinfo.strings["inherited_from"], clinfo.ref(ancestor), doc(at.docs, escape(at.name), clinfo.strings)))
+        text += clinfo.formats["end"]
     return text
 
 def _make_class_child_list(clinfo):
     if not clinfo.cl.children:
         return ""
-    text = beginItem.format("Erbende Klassen")
+    text = clinfo.formats["begin"].format(clinfo.strings["children"])
     for child in clinfo.cl.children:
-        text += "\t\t\t\t\t\\item \\texttt{{{0}}}\n".format(clinfo.ref(child))
-    text += endItem
+        text += clinfo.formats["ref"].format(clinfo.ref(child))
+    text += clinfo.formats["end"]
+    return text
+
+def _make_class_descendant_list(clinfo):
+    if not clinfo.cl.descendants:
+        return ""
+    text = clinfo.formats["begin"].format(clinfo.strings["all_children"])
+    for descendant in clinfo.cl.descendants:
+        text += clinfo.formats["ref"].format(clinfo.ref(descendant))
+    text += clinfo.formats["end"]
     return text
 
 def _make_class_dependency_list(clinfo):
     if not clinfo.cl.dependencies:
         return ""
-    text = beginItem.format("Abhängigkeiten")
+    text = clinfo.formats["begin"].format(clinfo.strings["dependencies"])
     for dep in clinfo.cl.dependencies:
-        text += asItem.format(clinfo.ref(dep.target), doc(dep.docs, "Abhängigkeit"))
-    text += endItem
+        text += clinfo.formats["item"].format(clinfo.ref(dep.target), doc(dep.docs, clinfo.strings["dependency"], clinfo.strings))
+    text += clinfo.formats["end"]
     return text
 
 def _make_class_association_list(clinfo):
     if not clinfo.cl.associations:
         return ""
-    text = beginItem.format("Assoziationen")
+    text = clinfo.formats["begin"].format(clinfo.strings["associations"])
     for a in clinfo.cl.associations:
         multiplicity = a.multiplicity + " " if a.multiplicity is not None else ""
-        text += asItem.format("{0}{1} {2}".format(multiplicity, clinfo.ref(a.target), a.name),
-            doc(a.docs, a.name))
-    text += endItem
+        text += clinfo.formats["item"].format("{0}{1} {2}".format(multiplicity, clinfo.ref(a.target), a.name),
+            doc(a.docs, a.name, clinfo.strings))
+    text += clinfo.formats["end"]
+    return text
+
+def _make_class_used_by_list(clinfo):
+    if not clinfo.cl.used_by:
+        return ""
+    text = clinfo.formats["begin"].format(clinfo.strings["used_by"])
+    for user in clinfo.cl.used_by:
+        text += clinfo.formats["ref"].format(clinfo.ref(user))
+    text += clinfo.formats["end"]
     return text
 
 class ClassInfo:
@@ -118,10 +236,16 @@ class ClassInfo:
     Attributes:
         class_description_template: (static) The template macro parameters and functions
             used for class description generation.
+        class_optional_macros: (static) The macros of class_description_template
+            that are only generated if a class override uses them.
         cl: The class to be formatted.
-        elements: The element dictionary of the project, required for references.
-        noref: A set of elements not to create references to (because they would break).
+        elements: The element dictionary of the project.
+        refs: The ReferenceTable of the project.
         image_dir: The directory the class diagrams can be found in.
+        pages: A dict of diagram names and their pages in the batched classes.pdf,
+            or None if every class diagram is a separate PDF.
+        formats: The strings the description is made of (written out or compact macros).
+        strings: The string table of the document.
     """
 
     class_description_template = [
@@ -134,13 +258,21 @@ class ClassInfo:
         ("%CHILDREN", _make_class_child_list),
         ("%DEPENDENCIES", _make_class_dependency_list),
         ("%ASSOCIATIONS", _make_class_association_list),
+        ("%USEDBY", _make_class_used_by_list),
+        ("%INHERITED", _make_class_inherited_list),
+        ("%ALLCHILDREN", _make_class_descendant_list),
     ]
 
-    def __init__(self, cl, elements, noref, image_dir):
+    class_optional_macros = ("%USEDBY", "%INHERITED", "%ALLCHILDREN")
+
+    def __init__(self, cl, elements, refs, image_dir, pages=None, compact=False, strings=string_tables.default):
         self.cl = cl
         self.elements = elements
-        self.noref = noref
+        self.refs = refs
         self.image_dir = image_dir
+        self.pages = pages
+        self.formats = _formats[compact]
+        self.strings = strings
 
     def ref(self, element_name):
         """Generate a reference to the given element.
@@ -151,38 +283,188 @@ class ClassInfo:
         Args:
             element_name: The name of the element to reference.
         """
-        element = self.elements[element_name]
-        if element.ty == ElementType.CLASS and element.package != "std" and element.name not in self.noref:
-            return "\\nameref{" + element.name + "}"
-        else:
-            # Match template classes with type parameter, both optionally prefixed by package::
-            match = re.match("(?:\w+::)?(\w+)(?:<(?:\w+::)?(\w+)>)", element.name)
-            if not match:
-                return element.name
-            else:
-                return "{0}<{1}>".format(match.group(1), match.group(2))
+        return self.refs[element_name]
+
+_inherited_macros = ("%INHERITED", "%ALLCHILDREN")
+
+def _uses_inherited(cl, class_overrides):
+    return any(macro + "\n" in get(class_overrides, cl.name) for macro in _inherited_macros)
+
+def _uses_used_by(cl, class_overrides):
+    return "%USEDBY\n" in get(class_overrides, cl.name)
+
+def description_ids(cl, elements, class_overrides):
+    """Return the XMI IDs of all elements the generated description of the given class references.
+
+    Unlike referenced_ids, these include the references of the optional macros the class override uses.
+
+    Args:
+        cl: The class to get the references of.
+        elements: The element dictionary of the project.
+        class_overrides: The dict of class names and their override texts.
+    """
+    ids = referenced_ids(cl, elements)
+    if _uses_used_by(cl, class_overrides):
+        ids = ids + cl.used_by
+    if _uses_inherited(cl, class_overrides):
+        ids = ids + inherited_ids(cl, elements)
+    return ids
+
+def _package_header(package_name):
+    return """\t\\subsection{{{0}}}
+		\\label{{{0}}}""".format(package_name)
+
+_package_footer = "\t\\newpage\n"
+
+def _make_class_sections(classes, elements, refs, class_overrides, image_dir, pages, compact=False,
+        strings=string_tables.default):
+    return ["%{0} template\n".format(cl.name) + format_template(ClassInfo.class_description_template,
+                get(class_overrides, cl.name),
+                ClassInfo(cl, elements, refs, image_dir, pages, compact, strings),
+                ClassInfo.class_optional_macros) for cl in classes]
+
+def _make_class_sections_job(job):
+    return _make_class_sections(*job)
+
+# The least number of classes worth starting another process for:
+# below it, forking and collecting the results takes longer than describing the classes
+_min_classes_per_job = 1000
+
+# The TexInfo and the class lists forked processes describe classes from, while a pool runs
+_forked = None
+
+def _make_forked_sections(index):
+    (tex_info, generated) = _forked
+    return _make_class_sections(generated[index], tex_info.elements, tex_info.refs, tex_info.override.classes,
+            tex_info.image_dir, tex_info.class_pages, tex_info.compact, tex_info.strings)
+
+def _describe_in_pool(tex_info, generated, jobs):
+    """Describe the given lists of classes in a pool of processes.
+
+    Where the platform can fork, the processes inherit tex_info:
+    pickling the data each package needs (see _package_job) takes about as long
+    as describing the classes, so the pool would never be faster than a single process.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    global _forked
+    if "fork" not in multiprocessing.get_all_start_methods():
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(_make_class_sections_job,
+                [_package_job(tex_info, classes) for classes in generated]))
+    _forked = (tex_info, generated)
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("fork")) as executor:
+            return list(executor.map(_make_forked_sections, range(len(generated))))
+    finally:
+        _forked = None
+
+def _make_package_descriptions(package_name, classes, elements, refs, class_overrides, image_dir, pages,
+        compact=False, strings=string_tables.default):
+    return _package_header(package_name) + "".join(_make_class_sections(classes, elements, refs,
+        class_overrides, image_dir, pages, compact, strings)) + _package_footer
+
+def _package_job(tex_info, classes):
+    """Collect only the data required to describe the given classes of a package in another process."""
+    class_overrides = {cl.name: tex_info.override.classes[cl.name] for cl in classes
+            if cl.name in tex_info.override.classes}
+    # Ancestors and descendants are only sent along for classes whose overrides use them
+    inheriting = [cl for cl in classes if _uses_inherited(cl, class_overrides)]
+    elements = {cl.template: tex_info.elements[cl.template] for cl in classes if cl.template is not None}
+    elements.update((ancestor, tex_info.elements[ancestor]) for cl in inheriting for ancestor in cl.ancestors)
+    refs = {xmiId: tex_info.refs[xmiId] for cl in classes
+            for xmiId in description_ids(cl, tex_info.elements, class_overrides)}
+    pages = None
+    if tex_info.class_pages is not None:
+        pages = {name: tex_info.class_pages[name] for name in ["Diagram_" + cl.name for cl in classes]
+                if name in tex_info.class_pages}
+    return (classes, elements, refs, class_overrides, tex_info.image_dir, pages, tex_info.compact, tex_info.strings)
+
+def _operation_parts(operations):
+    return [(op.name, op.return_type, [(p.name, p.type) for p in op.parameters], op.visibility, op.docs)
+            for op in operations]
+
+def _attribute_parts(attributes):
+    return [(at.name, at.type, at.visibility, at.docs) for at in attributes]
+
+def _class_fragment_key(tex_info, context, cl):
+    """Return the fragment cache key of the description of the given class."""
+    override = get(tex_info.override.classes, cl.name)
+    refs = tex_info.refs.refs
+    ids = description_ids(cl, tex_info.elements, tex_info.override.classes)
+    inherited = None
+    if _uses_inherited(cl, tex_info.override.classes):
+        inherited = [(ancestor, _operation_parts(tex_info.elements[ancestor].operations),
+            _attribute_parts(tex_info.elements[ancestor].attributes)) for ancestor in cl.ancestors]
+    template = None
+    if cl.template is not None:
+        el = tex_info.elements[cl.template]
+        template = (el.name, el.bound, el.docs)
+    page = None
+    if tex_info.class_pages is not None:
+        page = tex_info.class_pages.get("Diagram_" + cl.name)
+    return tex_info.fragments.key(context, cl.name, cl.xmiId, cl.docs, cl.abstraction, template,
+            _operation_parts(cl.operations), _attribute_parts(cl.attributes), cl.children, cl.descendants,
+            [(dep.target, dep.docs) for dep in cl.dependencies],
+            [(a.name, a.target, a.multiplicity, a.docs) for a in cl.associations], cl.used_by,
+            [refs[xmiId] for xmiId in ids], inherited, override, page)
 
 def make_class_descriptions(tex_info):
     """Generate the descriptions for all the classes listed in the given info.
 
     Returns a string containing the appropriated LaTeX for the description list.
-    TODO: Extract the hardcoded strings used for this generation into some kind
-    of language file.
+    If tex_info.jobs is larger than one, the packages are described in up to that many processes,
+    but only one process is started for every _min_classes_per_job classes to describe.
+    If tex_info.fragments is a FragmentCache, only the classes not found in it are described.
+    The result is the same either way.
+    The headings are taken from tex_info.strings.
 
     Args:
         tex_info: The TexInfo to get required information from.
     """
     if not tex_info.packages:
         return ""
-    text = "\\section{Klassenbeschreibungen}\n\t\\label{Klassenbeschreibungen}\n"
+    text = "\\section{{{0}}}\n\t\\label{{{0}}}\n".format(tex_info.strings["class_descriptions"])
     text += tex_info.override.classes_desc
-    for package, classes in tex_info.packages:
-        text += """\t\\subsection{{{0}}}
-		\\label{{{0}}}""".format(package.attrib["name"])
-        for cl in classes:
-            text += "%{0} template\n".format(cl.name)
-            text += format_template(ClassInfo.class_description_template,
-                    get(tex_info.override.classes, cl.name),
-                    ClassInfo(cl, tex_info.elements, tex_info.override.noref, tex_info.image_dir))
-        text += "\t\\newpage\n"
+    with events.stage("descriptions", total=len(tex_info.packages)):
+        # The sections of every package, None where they still have to be generated
+        packages = []
+        if tex_info.fragments is not None:
+            context = fragment_context(tex_info, "class")
+        for package, classes in tex_info.packages:
+            keys = None
+            sections = [None] * len(classes)
+            if tex_info.fragments is not None:
+                keys = [_class_fragment_key(tex_info, context, cl) for cl in classes]
+                sections = [tex_info.fragments.get(key) for key in keys]
+            missing = [cl for cl, section in zip(classes, sections) if section is None]
+            packages.append((package, keys, sections, missing))
+
+        generated = [missing for _, _, _, missing in packages if missing]
+        jobs = min(tex_info.jobs, len(generated),
+                sum(len(classes) for classes in generated) // _min_classes_per_job)
+        if jobs > 1:
+            generated = _describe_in_pool(tex_info, generated, jobs)
+        else:
+            generated = [_make_class_sections(classes, tex_info.elements, tex_info.refs, tex_info.override.classes,
+                    tex_info.image_dir, tex_info.class_pages, tex_info.compact, tex_info.strings)
+                    for classes in generated]
+
+        generated = iter(generated)
+        misses = 0
+        for package, keys, sections, missing in packages:
+            misses += len(missing)
+            if missing:
+                new_sections = iter(next(generated))
+                for i, section in enumerate(sections):
+                    if section is None:
+                        sections[i] = next(new_sections)
+                        if keys is not None:
+                            tex_info.fragments.put(keys[i], sections[i])
+            description = _package_header(package.attrib["name"]) + "".join(sections) + _package_footer
+            events.emit("package_generated", name=package.attrib["name"], size=len(description.encode("utf-8")))
+            text += description
+    if tex_info.fragments is not None:
+        events.emit("fragments_checked", section="descriptions",
+                hits=sum(len(sections) for _, _, sections, _ in packages) - misses, misses=misses)
     return text
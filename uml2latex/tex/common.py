@@ -19,6 +19,8 @@
 
 """Common strings and functions required to generate LaTeX templates."""
 
+from uml2latex.tex import strings as _strings
+
 # {0}: The title of the itemize environment.
 beginItem = """\t\t\t\\paragraph{{{0}}}
 			\\begin{{itemize}}[label={{}}]\n"""
@@ -36,7 +38,7 @@ asItem = """\t\t\t\t\\item {{
 				}}
 				{1}\n"""
 
-def format_template(default_template, override, info):
+def format_template(default_template, override, info, optional=()):
     """Generate formatting based on a template.
 
     Replaces macros defined in default_template found in
@@ -44,7 +46,8 @@ def format_template(default_template, override, info):
     called with the given info.
 
     The macro '%FULL' is always replaced with every function result
-    defined in default_template in order.
+    defined in default_template in order, except for the optional macros.
+    Those are only generated if the override uses them.
 
     Args:
         default_template: A list of (macro string, function) pairs
@@ -52,17 +55,23 @@ def format_template(default_template, override, info):
         override: The string to search for macros. If it is empty,
             it will be treated as containing only the macro '%FULL'.
         info: The argument to pass the functions in default_template.
+        optional: The macros of default_template that are left out of '%FULL'.
     """
     segments = {"%FULL": ""}
     for entry, function in default_template:
+        if entry in optional:
+            if entry + "\n" in override:
+                segments[entry] = function(info)
+            continue
         segments[entry] = function(info)
         segments["%FULL"] += segments[entry]
 
     text = segments["%FULL"]
     if len(override) > 0:
         text = override
-        for segment, value in segments.items():
-            text = text.replace(segment + "\n", value)
+        # Longer macros first, so '%CHILDREN' doesn't replace the end of '%ALLCHILDREN'
+        for segment in sorted(segments, key=len, reverse=True):
+            text = text.replace(segment + "\n", segments[segment])
     return text
 
 def get(dictionary, key):
@@ -72,10 +81,10 @@ def get(dictionary, key):
     else:
         return ""
 
-def doc(docs, name):
-    """Return the given string if not none, otherwise a default string."""
-    return docs if docs is not None else "XXX Beschreibung von " + name + "."
+def doc(docs, name, strings=_strings.default):
+    """Return the given string if not none, otherwise the missing_doc string of the string table."""
+    return docs if docs is not None else strings["missing_doc"].format(name)
 
-def attrdoc(attribs, key, name):
-    """Return the attribs[key] value if defined, otherwise a default string."""
-    return attribs[key] if key in attribs else "XXX Beschreibung von " + name + "."
+def attrdoc(attribs, key, name, strings=_strings.default):
+    """Return the attribs[key] value if defined, otherwise the missing_doc string of the string table."""
+    return attribs[key] if key in attribs else strings["missing_doc"].format(name)
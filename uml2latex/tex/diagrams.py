@@ -19,6 +19,7 @@
 
 """Generates LaTeX formatting for class and sequence diagrams."""
 
+from uml2latex.tex import strings as string_tables
 from uml2latex.tex.common import *
 from uml2latex.utils import space_ul, escape
 
@@ -59,7 +60,8 @@ def _make_diagram_image_with_section(diagram_info):
 
 def _make_diagram_description(diagram_info):
     return "\t\t{0}\n".format(
-            attrdoc(diagram_info.diagram.attrib, "documentation", diagram_info.diagram.attrib["name"]))
+            attrdoc(diagram_info.diagram.attrib, "documentation", diagram_info.diagram.attrib["name"],
+                diagram_info.strings))
 
 class DiagramInfo:
     """Holds information required to format a class or sequence diagram in LaTeX.
@@ -71,6 +73,7 @@ class DiagramInfo:
             used for diagrams without descriptive text.
         diagram: The diagram to be formatted.
         image_dir: The directory the diagram can be found in.
+        strings: The string table of the document.
     """
 
     diagram_template = [
@@ -83,9 +86,10 @@ class DiagramInfo:
         ("%DIAGRAM", _make_diagram_image_with_section),
     ]
 
-    def __init__(self, diagram, image_dir):
+    def __init__(self, diagram, image_dir, strings=string_tables.default):
         self.diagram = diagram
         self.image_dir = image_dir
+        self.strings = strings
 
 def _make_diagrams(tex_info, diagrams):
     text = ""
@@ -93,25 +97,25 @@ def _make_diagrams(tex_info, diagrams):
         if diagram.attrib["documentation"] == "":
             text += format_template(DiagramInfo.diagram_no_desc_template,
                     get(tex_info.override.diagrams, diagram.attrib["name"]), 
-                    DiagramInfo(diagram, tex_info.image_dir))
+                    DiagramInfo(diagram, tex_info.image_dir, tex_info.strings))
         else:
             text += format_template(DiagramInfo.diagram_template,
                     get(tex_info.override.diagrams, diagram.attrib["name"]),
-                    DiagramInfo(diagram, tex_info.image_dir))
+                    DiagramInfo(diagram, tex_info.image_dir, tex_info.strings))
     return text
 
 def make_sequence_diagrams(tex_info):
     """Generate the formatting for all the sequence diagrams listed in the given info.
 
     Returns a string containing the appropriate LaTeX for the sequence diagram section.
-    TODO: Extract the hardcoded strings (see classes.py)
+    The heading is taken from tex_info.strings.
 
     Args:
         tex_info: The TexInfo to get required information from.
     """
     if not tex_info.sequence_diagrams:
         return ""
-    text = "\\section{Abläufe}\n\t\\label{Abläufe}\n"
+    text = "\\section{{{0}}}\n\t\\label{{{0}}}\n".format(tex_info.strings["sequences"])
     text += tex_info.override.sequence_desc
     text += _make_diagrams(tex_info, tex_info.sequence_diagrams)
     return text
@@ -120,7 +124,7 @@ def make_class_diagrams(tex_info):
     """Generate the formatting for all the class diagrams listed in the given info.
 
     Returns a string containing the appropriate LaTeX for the sequence diagram section.
-    TODO: Extract the hardcoded strings (see classes.py)
+    The heading is taken from tex_info.strings.
     TODO: Which class diagrams are rendered here is dependent on the ordering of the root macros.
 
     Args:
@@ -128,7 +132,7 @@ def make_class_diagrams(tex_info):
     """
     if not tex_info.class_diagrams:
         return ""
-    text = "\\section{Klassendiagramme}\n\t\\label{Klassendiagramme}\n"
+    text = "\\section{{{0}}}\n\t\\label{{{0}}}\n".format(tex_info.strings["class_diagrams"])
     text += _make_diagrams(tex_info, tex_info.class_diagrams)
     text += "\\newpage\n"
     return text
@@ -0,0 +1,129 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""A persistent cache of generated LaTeX fragments (class sections and module listings).
+
+Every fragment is stored under a digest of everything that goes into it:
+the model data of the class or package, the references it renders, its override text,
+the settings of the document and the source of the generator itself.
+Fragments whose digest is unchanged are copied through verbatim,
+so only changed classes and packages are formatted again.
+
+Formatting a class takes only about as long as hashing its inputs twice,
+so keys and the cache file are encoded with marshal, which is much quicker to read
+and write than JSON. The file is only valid for the Python version that wrote it,
+which the generator version accounts for.
+"""
+
+import os
+import sys
+import marshal
+import hashlib
+import tempfile
+
+# The modules whose code determines the generated text
+_generator_sources = ["tex/common.py", "tex/classes.py", "tex/modules.py", "tex/diagrams.py",
+        "tex/references.py", "tex/strings.py", "tex/fragments.py", "utils.py"]
+
+_generator_version = None
+
+def generator_version():
+    """Return a digest of the generator's source code (and the Python version keys are encoded with)."""
+    global _generator_version
+    if _generator_version is None:
+        digest = hashlib.sha256("{0}.{1} {2}".format(sys.version_info[0], sys.version_info[1],
+            marshal.version).encode("utf-8"))
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for source in _generator_sources:
+            with open(os.path.join(root, source), "rb") as f:
+                digest.update(f.read())
+        _generator_version = digest.hexdigest()
+    return _generator_version
+
+def fragment_context(tex_info, kind):
+    """Return the parts of fragment keys that are the same for every fragment of a kind in a document.
+
+    Args:
+        tex_info: The TexInfo of the document.
+        kind: The kind of fragment ("class" or "module").
+    """
+    # Digested once, so that the key of every fragment only has to include a short string
+    return hashlib.blake2b(marshal.dumps((generator_version(), kind, tex_info.image_dir, tex_info.compact,
+            tex_info.class_pages is not None, sorted(tex_info.strings.items())))).hexdigest()
+
+class FragmentCache:
+    """Generated fragments by key, read from and written back to a file.
+
+    Entries that weren't used since the cache was loaded are dropped when it is saved,
+    so the file only ever holds the fragments of the last run.
+
+    Attributes:
+        path: The file the cache is stored in.
+        hits: The number of fragments found in the cache since it was loaded.
+        misses: The number of fragments that had to be generated since it was loaded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._used = {}
+        try:
+            with open(path, "rb") as f:
+                (version, entries) = marshal.load(f)
+            if version == generator_version():
+                self._entries = entries
+        except (FileNotFoundError, EOFError, ValueError, TypeError):
+            # A missing or unreadable cache is simply empty
+            pass
+
+    def key(self, *parts):
+        """Return the key of a fragment generated from the given parts.
+
+        The parts may be any nesting of tuples, lists, strings, numbers and None.
+        """
+        return hashlib.blake2b(marshal.dumps(parts), digest_size=16).hexdigest()
+
+    def get(self, key):
+        """Return the fragment stored under the given key, or None if there is none."""
+        text = self._entries.get(key)
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._used[key] = text
+        return text
+
+    def put(self, key, text):
+        """Store a generated fragment under the given key."""
+        self._used[key] = text
+
+    def save(self):
+        """Write the fragments used since the cache was loaded back to its file, if anything changed."""
+        if self._used.keys() != self._entries.keys():
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            # Written to a temporary file first, so that concurrent runs never read partial files
+            fd, tmppath = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump((generator_version(), self._used), f)
+            os.replace(tmppath, self.path)
+            self._entries = self._used
+        self._used = {}
@@ -19,16 +19,19 @@
 
 """Main file for LaTeX template generation."""
 
+from uml2latex.tex import strings as string_tables
 from uml2latex.tex.common import format_template
-from uml2latex.tex.classes import make_class_descriptions
+from uml2latex.tex.classes import make_class_descriptions, compact_preamble
 from uml2latex.tex.modules import make_module_list
 from uml2latex.tex.diagrams import make_class_diagrams, make_sequence_diagrams
+from uml2latex.tex.references import ReferenceTable
 
 class TexInfo:
     """Holds information required to format a LaTeX file from UML data.
 
     Attributes:
-        file_header: (static) A header to prepend to the generated text.
+        file_header: (static) The header prepended to the generated text by default
+            (see the file_header string of the string tables).
         default_root_template: (static) The template macro parameters and functions
             used for LaTeX document generation.
         override: Override information for customizing document generation.
@@ -36,11 +39,16 @@ class TexInfo:
         class_diagrams: A list of class diagrams to generate LaTeX for.
         sequence_diagrams: A list of sequence diagrams to generate LaTeX for.
         elements: A dict of UML elements used for references.
+        refs: The ReferenceTable used to link elements.
         image_dir: The directory that diagrams can be found in.
+        jobs: The number of processes to generate class descriptions with.
+        class_pages: A dict of single class diagram names and their pages in the batched classes.pdf,
+            or None if every class diagram is a separate PDF.
+        compact: Whether to write class descriptions with the macros of the compact preamble.
+        strings: The string table to write the document with.
+        fragments: The FragmentCache to reuse class sections and module listings from, or None.
     """
-    file_header = """% Diese Datei wurde automatisch generiert.
-% Sie zu bearbeiten, ist dementsprechend sinnlos.
-% Nutzen Sie stattdessen die Dateien in template_override, um die Darstellung anzupassen.\n"""
+    file_header = string_tables.default["file_header"]
 
     default_root_template = [
         ("%MODULES", make_module_list),
@@ -49,29 +57,30 @@ class TexInfo:
         ("%SEQUENCES", make_sequence_diagrams),
     ]
 
-    def __init__(self, override, packages, class_diagrams, sequence_diagrams, elements, image_dir):
+    def __init__(self, override, packages, class_diagrams, sequence_diagrams, elements, refs, image_dir, jobs=1,
+            class_pages=None, compact=False, strings=string_tables.default, fragments=None):
         self.override = override
         self.packages = packages
         self.class_diagrams = class_diagrams
         self.sequence_diagrams = sequence_diagrams
         self.elements = elements
+        self.refs = refs
         self.image_dir = image_dir
+        self.jobs = jobs
+        self.class_pages = class_pages
+        self.compact = compact
+        self.strings = strings
+        self.fragments = fragments
 
-def generate_latex(umlData, image_dir, override):
-    """Generate LaTeX from the given UMLData and custom overrides.
+def sort_packages(umlData, override):
+    """Return the packages and their classes in the order given by the overrides.
+
+    Returns a list of (package, classes) pairs.
 
     Args:
-        umlData: The UMLData to generate LaTeX formatting for.
-        image_dir: The directory that diagrams can be found in.
-        override: Override information for customizing document generation.
+        umlData: The UMLData to get the packages from.
+        override: Override information containing the orderings.
     """
-    sorted_class_diagram_list = _sort_by_order(umlData.class_diagram_list,
-            override.diagram_order, lambda x, name: x.attrib["name"] == name)
-
-    sorted_sequence_diagram_list = _sort_by_order(umlData.sequence_diagram_list,
-            override.sequence_diagram_order, lambda x, name: x.attrib["name"] == name)
-
-    sorted_package_list = list(umlData.packages.items())
     sorted_package_list = _sort_by_order(list(umlData.packages.items()),
             override.module_list_order, lambda x, name: x[0].attrib["name"] == name)
 
@@ -79,10 +88,56 @@ def generate_latex(umlData, image_dir, override):
         if package.attrib["name"] in override.module_order:
             sorted_package_list[i] = (package, _sort_by_order(classes,
                 override.module_order[package.attrib["name"]], lambda x, name: x.name == name))
-    info = TexInfo(override, sorted_package_list, sorted_class_diagram_list,
-            sorted_sequence_diagram_list, umlData.elements, image_dir)
+    return sorted_package_list
+
+def has_descriptions(override):
+    """Return whether the class description section is part of the document."""
+    return not override.root or "%DESCRIPTIONS\n" in override.root or "%FULL\n" in override.root
+
+def make_tex_info(umlData, image_dir, override, refs=None, jobs=1, class_pages=None, compact=False,
+        strings=string_tables.default, fragments=None):
+    """Sort the contents of the given UMLData and collect everything required to format it.
+
+    Returns a TexInfo. See generate_latex for the arguments.
+    """
+    if refs is None:
+        refs = ReferenceTable(umlData.elements, override.noref)
 
-    return TexInfo.file_header + format_template(TexInfo.default_root_template, override.root, info)
+    # Copied, since the module listing removes the diagrams it places from this list
+    sorted_class_diagram_list = list(_sort_by_order(umlData.class_diagram_list,
+            override.diagram_order, lambda x, name: x.attrib["name"] == name))
+
+    sorted_sequence_diagram_list = _sort_by_order(umlData.sequence_diagram_list,
+            override.sequence_diagram_order, lambda x, name: x.attrib["name"] == name)
+
+    sorted_package_list = sort_packages(umlData, override)
+    return TexInfo(override, sorted_package_list, sorted_class_diagram_list,
+            sorted_sequence_diagram_list, umlData.elements, refs, image_dir, jobs, class_pages, compact, strings,
+            fragments)
+
+def generate_latex(umlData, image_dir, override, refs=None, jobs=1, class_pages=None, compact=False,
+        strings=string_tables.default, fragments=None):
+    """Generate LaTeX from the given UMLData and custom overrides.
+
+    Args:
+        umlData: The UMLData to generate LaTeX formatting for.
+        image_dir: The directory that diagrams can be found in.
+        override: Override information for customizing document generation.
+        refs: The ReferenceTable to link elements with.
+            If it is None, it is built from the UMLData and overrides.
+        jobs: The number of processes to generate class descriptions with.
+        class_pages: A dict of single class diagram names and their pages in the batched classes.pdf,
+            or None if every class diagram is a separate PDF.
+        compact: Whether to define macros for the parts of class descriptions at the top of the file
+            and use them instead of writing every part out. Both render the same.
+        strings: The string table to write the document with (see tex/strings.py).
+        fragments: A FragmentCache to copy unchanged class sections and module listings from
+            (and to store the changed ones in), or None. The result is the same either way.
+            The cache isn't saved by this function.
+    """
+    info = make_tex_info(umlData, image_dir, override, refs, jobs, class_pages, compact, strings, fragments)
+    preamble = compact_preamble(strings) if compact else ""
+    return strings["file_header"] + preamble + format_template(TexInfo.default_root_template, override.root, info)
 
 def _sort_by_order(collection, order, func):
     if not order:
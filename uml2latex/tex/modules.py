@@ -19,31 +19,36 @@
 
 """Generates LaTeX formatting for module listings."""
 
+from uml2latex.tex import strings as string_tables
 from uml2latex.tex.common import *
 from uml2latex.tex.diagrams import DiagramInfo, make_diagram_image
+from uml2latex.tex.fragments import fragment_context
 
 def _make_module_header(modinfo):
     return "\t\\subsection{{{0}}}\n".format(modinfo.module.attrib["name"])
 
 def _make_module_description(modinfo):
-    return "\t\t{0}\n".format(attrdoc(modinfo.module.attrib, "comment", modinfo.module.attrib["name"]))
+    return "\t\t{0}\n".format(attrdoc(modinfo.module.attrib, "comment", modinfo.module.attrib["name"],
+            modinfo.strings))
 
 def _make_module_classlist(modinfo):
     if not modinfo.classes:
         return ""
-    text = "\t\t\\subsubsection*{Klassen}\n"
+    text = "\t\t\\subsubsection*{{{0}}}\n".format(modinfo.strings["module_classes"])
     text += beginMultiColItem
     for cl in modinfo.classes:
         text += "\t\t\t\t\t\t\\item \\nameref{{{0}}}\n".format(cl.name)
     text += endMultiColItem
     return text
 
+def _module_diagram(module, diagrams):
+    return next((d for d in diagrams if d.attrib["name"].casefold() == module.attrib["name"].casefold()), None)
+
 def _make_module_diagram(modinfo):
-    diagram = next((d for d in modinfo.diagrams \
-            if d.attrib["name"].casefold() == modinfo.module.attrib["name"].casefold()), None)
+    diagram = _module_diagram(modinfo.module, modinfo.diagrams)
     if diagram is not None:
         modinfo.diagrams.remove(diagram)
-        return make_diagram_image(DiagramInfo(diagram, modinfo.image_dir))
+        return make_diagram_image(DiagramInfo(diagram, modinfo.image_dir, modinfo.strings))
     return ""
 
 class ModuleInfo:
@@ -56,6 +61,7 @@ class ModuleInfo:
         classes: A list of member classes of the module.
         diagrams: A class diagram that shows the module.
         image_dir: The directory the diagram can be found in.
+        strings: The string table of the document.
     """
 
     module_template = [
@@ -65,17 +71,41 @@ class ModuleInfo:
         ("%DIAGRAM", _make_module_diagram),
     ]
 
-    def __init__(self, module, classes, diagrams, image_dir):
+    def __init__(self, module, classes, diagrams, image_dir, strings=string_tables.default):
         self.module = module
         self.classes = classes
         self.diagrams = diagrams
         self.image_dir = image_dir
+        self.strings = strings
 
 def make_module_list(tex_info):
-    text = "\t\\section{Architektur}\n"
+    """Generate the listing of all the packages in the given info.
+
+    The module diagrams placed in the listing are removed from tex_info.class_diagrams.
+    If tex_info.fragments is a FragmentCache, only the listings not found in it are generated.
+
+    Args:
+        tex_info: The TexInfo to get required information from.
+    """
+    text = "\t\\section{{{0}}}\n".format(tex_info.strings["architecture"])
     text += tex_info.override.architecture_desc
+    if tex_info.fragments is not None:
+        context = fragment_context(tex_info, "module")
     for package, classes in tex_info.packages:
-        text += format_template(ModuleInfo.module_template,
-                get(tex_info.override.module_listing, package.attrib["name"]),
-                ModuleInfo(package, classes, tex_info.class_diagrams, tex_info.image_dir))
+        override = get(tex_info.override.module_listing, package.attrib["name"])
+        if tex_info.fragments is not None:
+            diagram = _module_diagram(package, tex_info.class_diagrams)
+            key = tex_info.fragments.key(context, package.attrib["name"], package.attrib.get("comment"),
+                    [cl.name for cl in classes], override, diagram.attrib["name"] if diagram is not None else None)
+            listing = tex_info.fragments.get(key)
+            if listing is not None:
+                if diagram is not None:
+                    tex_info.class_diagrams.remove(diagram)
+                text += listing
+                continue
+        listing = format_template(ModuleInfo.module_template, override,
+                ModuleInfo(package, classes, tex_info.class_diagrams, tex_info.image_dir, tex_info.strings))
+        if tex_info.fragments is not None:
+            tex_info.fragments.put(key, listing)
+        text += listing
     return text
@@ -0,0 +1,118 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Resolves references between UML elements to LaTeX once per document."""
+
+import re
+
+from uml2latex.data import ElementType
+
+# Match template classes with type parameter, both optionally prefixed by package::
+_template_name = re.compile(r"(?:\w+::)?(\w+)(?:<(?:\w+::)?(\w+)>)")
+
+def _render_ref(element, noref):
+    if element.ty == ElementType.CLASS and element.package != "std" and element.name not in noref:
+        return "\\nameref{" + element.name + "}"
+    match = _template_name.match(element.name)
+    if not match:
+        return element.name
+    return "{0}<{1}>".format(match.group(1), match.group(2))
+
+def referenced_ids(cl, elements):
+    """Return the XMI IDs of all elements the description of the given class references.
+
+    Args:
+        cl: The class to get the references of.
+        elements: The element dictionary of the project.
+    """
+    ids = []
+    if cl.abstraction is not None:
+        ids.append(cl.abstraction)
+    if cl.template is not None and elements[cl.template].bound is not None:
+        ids.append(elements[cl.template].bound)
+    for op in cl.operations:
+        if op.return_type in elements:
+            ids.append(op.return_type)
+        ids.extend(param.type for param in op.parameters if param.type in elements)
+    ids.extend(at.type for at in cl.attributes if at.type in elements)
+    ids.extend(cl.children)
+    ids.extend(dep.target for dep in cl.dependencies)
+    ids.extend(a.target for a in cl.associations)
+    return ids
+
+def inherited_ids(cl, elements):
+    """Return the XMI IDs the inherited members and all descendants of the given class reference.
+
+    These are only part of a class description if its override uses %INHERITED or %ALLCHILDREN.
+
+    Args:
+        cl: The class to get the references of.
+        elements: The element dictionary of the project.
+    """
+    ids = list(cl.ancestors)
+    for ancestor in cl.ancestors:
+        for op in elements[ancestor].operations:
+            if op.return_type in elements:
+                ids.append(op.return_type)
+            ids.extend(param.type for param in op.parameters if param.type in elements)
+        ids.extend(at.type for at in elements[ancestor].attributes if at.type in elements)
+    ids.extend(cl.descendants)
+    return ids
+
+class ReferenceTable:
+    """Holds the LaTeX reference for every element of a project.
+
+    A reference is a nameref to the element's description if it can be linked to.
+    Otherwise, it is the element's name (with the template parameter given in '<>', if applicable).
+
+    Attributes:
+        refs: A dict of LaTeX references by XMI ID.
+    """
+
+    def __init__(self, elements, noref):
+        self.refs = {xmiId: _render_ref(element, noref) for xmiId, element in elements.items()}
+
+    def __getitem__(self, xmiId):
+        return self.refs[xmiId]
+
+    def __contains__(self, xmiId):
+        return xmiId in self.refs
+
+    def broken_references(self, packages, elements, labelled=True, ids=referenced_ids):
+        """Find references that would produce a nameref without a matching label.
+
+        Returns a list of (class name, referenced name) pairs.
+
+        Args:
+            packages: A list of (package, classes) pairs that descriptions are generated for.
+            elements: The element dictionary of the project.
+            labelled: Whether the class description section (and thus its labels)
+                is part of the document.
+            ids: A function returning the XMI IDs a class description references
+                (see referenced_ids), given the class and the element dictionary.
+        """
+        labels = {cl.name for _, classes in packages for cl in classes} if labelled else set()
+        broken = []
+        for _, classes in packages:
+            for cl in classes:
+                for xmiId in ids(cl, elements):
+                    ref = self.refs[xmiId]
+                    if ref.startswith("\\nameref{") and elements[xmiId].name not in labels:
+                        broken.append((cl.name, elements[xmiId].name))
+        return list(dict.fromkeys(broken))
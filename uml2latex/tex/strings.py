@@ -0,0 +1,97 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The strings generated documents are written with, by language.
+
+A string table is a dict of the keys below and their texts.
+Besides the built-in tables, a table can be read from a JSON file;
+keys missing from the file are taken from the German table.
+"""
+
+import json
+
+tables = {
+    "de": {
+        "file_header": """% Diese Datei wurde automatisch generiert.
+% Sie zu bearbeiten, ist dementsprechend sinnlos.
+% Nutzen Sie stattdessen die Dateien in template_override, um die Darstellung anzupassen.\n""",
+        "architecture": "Architektur",
+        "module_classes": "Klassen",
+        "class_diagrams": "Klassendiagramme",
+        "class_descriptions": "Klassenbeschreibungen",
+        "sequences": "Abläufe",
+        "inherits": "erbt von",
+        "type_parameters": "Typparameter",
+        "operations": "Operationen",
+        "attributes": "Attribute",
+        "children": "Erbende Klassen",
+        "all_children": "Alle erbenden Klassen",
+        "inherited_operations": "Geerbte Operationen",
+        "inherited_attributes": "Geerbte Attribute",
+        "inherited_from": "von",
+        "dependencies": "Abhängigkeiten",
+        "dependency": "Abhängigkeit",
+        "associations": "Assoziationen",
+        "used_by": "Verwendet von",
+        # {0}: The name of the undocumented element.
+        "missing_doc": "XXX Beschreibung von {0}.",
+    },
+    "en": {
+        "file_header": """% This file was generated automatically.
+% Editing it is therefore pointless.
+% Use the files in template_override to customize the output instead.\n""",
+        "architecture": "Architecture",
+        "module_classes": "Classes",
+        "class_diagrams": "Class Diagrams",
+        "class_descriptions": "Class Descriptions",
+        "sequences": "Sequences",
+        "inherits": "inherits from",
+        "type_parameters": "Type Parameters",
+        "operations": "Operations",
+        "attributes": "Attributes",
+        "children": "Subclasses",
+        "all_children": "All Subclasses",
+        "inherited_operations": "Inherited Operations",
+        "inherited_attributes": "Inherited Attributes",
+        "inherited_from": "from",
+        "dependencies": "Dependencies",
+        "dependency": "Dependency",
+        "associations": "Associations",
+        "used_by": "Used By",
+        "missing_doc": "XXX Description of {0}.",
+    },
+}
+
+default = tables["de"]
+
+def load_strings(name):
+    """Return the string table with the given name.
+
+    Args:
+        name: The name of a built-in table (see tables) or the path of a JSON file
+            containing an object of keys and texts.
+    """
+    if name in tables:
+        return tables[name]
+    with open(name, "r", encoding="utf-8") as f:
+        custom = json.load(f)
+    unknown = sorted(key for key in custom if key not in default)
+    if unknown:
+        raise ValueError("Unknown keys in string table {0}: {1}".format(name, ", ".join(unknown)))
+    return dict(default, **custom)
@@ -17,28 +17,60 @@
 # You should have received a copy of the GNU General Public License
 # along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
 
-"""Main entry point for uml2latex. Handles command line parameters."""
+"""Main entry point for uml2latex. Handles command line parameters.
+
+Everything except argparse is imported only once it is known to be needed,
+so that runs without images (and --help) don't pay for the image pipeline.
+Use 'python -m uml2latex.bench startup' to keep track of the startup time.
+"""
 
-import argparse
 import os
+import argparse
 import sys
-import glob
-import tempfile
-import subprocess
 
-from uml2latex.utils import space_ul
-from uml2latex.parse import UMLData
-from uml2latex.diagrams import make_all_single_class_diagrams
-from uml2latex.override import Override
-from uml2latex.tex.generate import generate_latex
+class _TargetAction(argparse.Action):
+    """Starts another document for --target, or sets the string table or template directory (const) of the last one."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        targets = list(namespace.target)
+        if self.const is None:
+            targets.append({"output": values, "strings": None, "templates": None})
+        elif not targets:
+            parser.error("{0} must follow a --target".format(option_string))
+        else:
+            targets[-1] = dict(targets[-1], **{self.const: values})
+        namespace.target = targets
 
 def read_args():
     parser = argparse.ArgumentParser(description="Create LaTeX documentation from an Umbrello file")
-    parser.add_argument("file", metavar="FILE", help="The Umbrello UML file to read")
+    parser.add_argument("file", metavar="FILE", help="The Umbrello UML file to read (may be gzip, bzip2, xz or zstd compressed)")
     parser.add_argument("-n", "--no-pics", default=False, action="store_true", help="Do not generate class diagram images")
     parser.add_argument("-o", "--output", default=None, help="Output to the given file instead of stdout")
     parser.add_argument("-t", "--templates", default="template_override", help="The directory to read template override files from ('template_override' by default)")
     parser.add_argument("-i", "--outImages", default="outImages", help="The directory to place the produced images in ('outImages' by default)")
+    parser.add_argument("-p", "--plan", default=False, action="store_true", help="Only report what a run would do, without rendering or writing anything")
+    parser.add_argument("--check", default=False, action="store_true", help="Only check references and template overrides against the model, without rendering or writing anything (exits with 1 if there are problems)")
+    parser.add_argument("-b", "--batch-classes", default=False, action="store_true", help="Convert all single class diagrams into one multi-page PDF")
+    parser.add_argument("-j", "--jobs", default=1, type=int, help="The number of processes to generate class descriptions with (1 by default)")
+    parser.add_argument("-r", "--ref-report", default=False, action="store_true", help="Report references that would produce broken links on stderr")
+    parser.add_argument("-z", "--compress-temp", default=False, action="store_true", help="Pass the project to Umbrello as a compressed archive")
+    parser.add_argument("-x", "--symbols", default=None, help="Write the parsed model to an SQLite symbol index at the given path")
+    parser.add_argument("-s", "--image-store", default=None, help="A directory to share rendered diagrams in between runs (disabled by default)")
+    parser.add_argument("--image-store-size", default=None, type=int, help="The maximum size of the image store in MiB (unlimited by default)")
+    parser.add_argument("--fragment-cache", default=None, help="A file to keep generated class sections and module listings in, so that only changed ones are generated again (disabled by default)")
+    parser.add_argument("--tool-jobs", default=None, type=int, help="The maximum number of Umbrello and rsvg-convert processes to run at once; fewer are started while memory is short (the number of CPUs by default)")
+    parser.add_argument("--tool-memory", default=None, type=int, help="Kill Umbrello and rsvg-convert processes using more than the given number of MiB and fail the run (unlimited by default)")
+    parser.add_argument("-c", "--converter", default="rsvg", choices=["rsvg", "builtin"], help="Convert SVGs with rsvg-convert processes or in-process, falling back to rsvg-convert ('rsvg' by default)")
+    parser.add_argument("-l", "--strings", default="de", help="The string table to write the document with: 'de', 'en' or the path of a JSON file ('de' by default)")
+    parser.add_argument("--target", default=[], action=_TargetAction, metavar="OUTPUT", help="Also write the document to OUTPUT, with the string table and template override directory of the main document unless --target-strings or --target-templates follow (may be repeated)")
+    parser.add_argument("--target-strings", dest="target", action=_TargetAction, const="strings", metavar="STRINGS", help="The string table of the document given by the last --target")
+    parser.add_argument("--target-templates", dest="target", action=_TargetAction, const="templates", metavar="TEMPLATES", help="The template override directory of the document given by the last --target")
+    parser.add_argument("--compact", default=False, action="store_true", help="Write class descriptions with macros defined at the top of the output")
+    parser.add_argument("--depfile", default=None, help="Write a make-style dependency file listing the inputs of the written document(s) and diagram PDFs to the given path")
+    parser.add_argument("--manifest", default=None, help="Write a JSON manifest mapping the written document(s), their package sections and the diagram PDFs to their inputs to the given path")
+    parser.add_argument("--progress", default=False, action="store_true", help="Show the progress of each stage on stderr")
+    parser.add_argument("--event-log", default=None, help="Append every pipeline event as a line of JSON to the given file")
+    parser.add_argument("--plugin", default=[], action="append", help="Import the given module before running, so that it can subscribe to events (may be repeated)")
     return parser.parse_args()
 
 def get_output(file):
@@ -47,32 +79,186 @@ def get_output(file):
     else:
         return open(file, "w")
 
+def parse_targets(args):
+    """Return the (output, string table name, template directory) triples of all documents to write.
+
+    The document given by -o, -l and -t comes first, followed by those given with --target.
+    """
+    targets = [(args.output, args.strings, args.templates)]
+    for target in args.target:
+        targets.append((target["output"], target["strings"] or args.strings, target["templates"] or args.templates))
+    return targets
+
+def subscribe(args):
+    """Subscribe the progress bar, event log and plugins requested on the command line to events.
+
+    Returns the event log file, or None if there is none.
+    """
+    import importlib
+    from uml2latex import events
+
+    if args.progress:
+        events.subscribe(events.ProgressBar())
+    log = None
+    if args.event_log is not None:
+        log = open(args.event_log, "a")
+        events.subscribe(events.EventLog(log))
+    for plugin in args.plugin:
+        importlib.import_module(plugin)
+    return log
+
+def _print_tools(tools, args):
+    """Print how the external tools ran on stderr, unless the progress bar already did or none ran."""
+    from uml2latex import events
+
+    if not args.progress and tools.get("total", {}).get("jobs"):
+        print("uml2latex: " + events.format_tools(tools), file=sys.stderr)
+
 def main():
     args = read_args()
+    log = subscribe(args)
+    try:
+        return run(args)
+    finally:
+        if log is not None:
+            log.close()
+
+def run(args):
+    from uml2latex import events
+    from uml2latex.parse import UMLData
+    from uml2latex.override import Override
+    from uml2latex.tex.strings import load_strings
+
+    with events.stage("parse"):
+        umlData = UMLData.parse_uml(args.file)
+        # Every target shares the parsed model and the rendered images,
+        # the diagrams are generated with the overrides of the main document
+        targets = [(output, load_strings(strings), Override(templates))
+                for output, strings, templates in parse_targets(args)]
+        override = targets[0][2]
+
+    if args.check:
+        from uml2latex.check import check
+
+        with events.stage("check"):
+            problems = [(output, problem) for output, _, target_override in targets
+                    for problem in check(umlData, target_override)]
+        for output, (name, message) in problems:
+            prefix = "{0}: ".format(output) if len(targets) > 1 else ""
+            print("{0}{1}: {2}".format(prefix, name, message))
+        if problems:
+            print("{0} problem(s) found".format(len(problems)), file=sys.stderr)
+        return 1 if problems else 0
 
-    umlData = UMLData.parse_uml(args.file)
-    override = Override(args.templates)
-    make_all_single_class_diagrams(umlData.tree, umlData.elements, override.custom_width)
+    if args.symbols is not None and not args.plan:
+        from uml2latex.symbols import write_symbol_index
+        with events.stage("symbols"):
+            write_symbol_index(umlData, args.symbols)
 
+    single_class_diagrams = None
     if not args.no_pics:
-        tmpfile, tmppath = tempfile.mkstemp(prefix="uml")
-        umlData.tree.write(tmpfile, xml_declaration=True, encoding="utf-8")
-        try:
-            os.mkdir(args.outImages)
-        except:
-            pass
-        # Unfortunately, umbrello can't output directly to PDF.
-        subprocess.run(["umbrello5", "--directory", args.outImages, "--export", "svg", tmppath],
-                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-        for file in glob.glob("{}/*.svg".format(args.outImages)):
-            subprocess.run(("rsvg-convert \"" + file + "\" -f pdf > \"" +
-                space_ul(file[:file.find("svg", -1) - 2]) + "pdf\""), shell=True)
-            os.remove(file)
-        os.remove(tmppath);
-
-    latex = generate_latex(umlData, args.outImages, override)
-    with get_output(args.output) as f:
-        f.write(latex)
-
-    return 0
+        from uml2latex.diagrams import make_all_single_class_diagrams
+        from uml2latex.images import render_images
+        from uml2latex.store import ImageStore
+        from uml2latex.scheduler import ToolScheduler, MemoryLimitExceeded
+
+        from uml2latex.data import ElementType
+
+        class_count = sum(1 for el in umlData.elements.values() if el.ty == ElementType.CLASS)
+        with events.stage("diagrams", total=class_count):
+            single_class_diagrams = make_all_single_class_diagrams(umlData.tree, umlData.elements, override.custom_width)
+        batch = [d.attrib["name"] for d in single_class_diagrams] if args.batch_classes else None
+        store = None
+        if args.image_store is not None:
+            max_size = args.image_store_size * 1024 * 1024 if args.image_store_size is not None else None
+            # Planning only looks into the store, it must not create it
+            store = ImageStore(args.image_store, max_size, create=not args.plan)
+
+    if args.plan:
+        from uml2latex.plan import make_plan, format_plan
+
+        print(format_plan(make_plan(umlData, override, args.outImages, args.output,
+            single_class_diagrams, store if not args.no_pics else None,
+            batch if not args.no_pics else None, args.converter, args.compact, targets[0][1])), end="")
+        return 0
+
+    failures = []
+    if not args.no_pics:
+        tools = {}
+        def collect(event):
+            if event.kind == "diagram_failed":
+                failures.append(event.payload)
+            elif event.kind == "tools_finished":
+                tools.update(event.payload["tools"])
+        events.subscribe(collect)
+        with events.stage("render"):
+            memory_limit = args.tool_memory * 1024 * 1024 if args.tool_memory is not None else None
+            try:
+                images = render_images(umlData.tree, args.outImages, store, args.compress_temp, batch, args.converter,
+                        ToolScheduler(args.tool_jobs, memory_limit))
+            except MemoryLimitExceeded as e:
+                _print_tools(tools, args)
+                print("uml2latex: {0}".format(e), file=sys.stderr)
+                return 1
+        _print_tools(tools, args)
+        for failure in failures:
+            print("uml2latex: rendering {0} failed ({1} exited with {2})".format(
+                failure["name"], failure["tool"], failure["code"]), file=sys.stderr)
+
+    class_pages = None
+    # Without rendering, a page index left behind by an earlier run may not match classes.pdf
+    if args.batch_classes and not args.no_pics:
+        from uml2latex.images import load_page_index
+        class_pages = load_page_index(args.outImages)
+
+    from uml2latex.tex.classes import description_ids
+    from uml2latex.tex.generate import generate_latex, sort_packages, has_descriptions
+    from uml2latex.tex.references import ReferenceTable
+
+    fragments = None
+    if args.fragment_cache is not None:
+        from uml2latex.tex.fragments import FragmentCache
+        fragments = FragmentCache(args.fragment_cache)
+
+    for output, strings, override in targets:
+        with events.stage("latex"):
+            refs = ReferenceTable(umlData.elements, override.noref)
+            if args.ref_report:
+                prefix = "{0}: ".format(output) if len(targets) > 1 else ""
+                ids = lambda cl, elements: description_ids(cl, elements, override.classes)
+                for name, target in refs.broken_references(sort_packages(umlData, override),
+                        umlData.elements, has_descriptions(override), ids):
+                    print("{0}{1}: broken reference to {2}".format(prefix, name, target), file=sys.stderr)
+
+            latex = generate_latex(umlData, args.outImages, override, refs, args.jobs, class_pages, args.compact,
+                    strings, fragments)
+        with events.stage("write"):
+            with get_output(output) as f:
+                f.write(latex)
+        events.emit("output_written", size=len(latex.encode("utf-8")), output=output)
+    if fragments is not None:
+        fragments.save()
+
+    if args.depfile is not None or args.manifest is not None:
+        write_dependencies(args, umlData, targets, images if not args.no_pics else None, single_class_diagrams)
+
+    # The document is still written, but a build shouldn't go on with missing diagrams
+    return 1 if failures else 0
+
+def write_dependencies(args, umlData, targets, images, single_class_diagrams):
+    from uml2latex import depfile
+
+    documents = [(output, depfile.document_entry(args.file, umlData, override, templates, strings))
+            for (output, strings, templates), (_, _, override) in zip(parse_targets(args), targets)]
+    entries = None
+    if images is not None:
+        from uml2latex.images import batch_index
+        page_index = os.path.join(args.outImages, batch_index) if args.batch_classes else None
+        entries = depfile.image_entries(args.file, images, [d.attrib["name"] for d in single_class_diagrams],
+                targets[0][2], page_index)
+    manifest = depfile.make_manifest(documents, entries)
+    depfile.touch_images(manifest)
+    if args.depfile is not None:
+        depfile.write_depfile(manifest, args.depfile)
+    if args.manifest is not None:
+        depfile.write_manifest(manifest, args.manifest)
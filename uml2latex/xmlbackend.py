@@ -0,0 +1,130 @@
+# vim: ft=python fileencoding=utf-8 sts=4 sw=4 et:
+
+# Copyright 2021 phesch <phesch@phesch.de>
+
+# This file is part of uml2latex.
+#
+# uml2latex is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# uml2latex is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with uml2latex.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Code for choosing the library Umbrello XML is read and written with.
+
+lxml is used if it is installed, since it parses and serializes large projects considerably faster
+and can read documents beyond the default size and depth limits of libxml2 (huge_tree).
+Otherwise, the standard library's ElementTree is used.
+The backend can be chosen explicitly with the UML2LATEX_XML environment variable ("lxml" or "stdlib").
+
+Code handling Umbrello XML should only go through the functions of this module,
+so that it works with trees from either backend.
+"""
+
+import os
+
+def _load_stdlib():
+    import xml.etree.ElementTree as etree
+    return etree
+
+def _load_lxml():
+    from lxml import etree
+    return etree
+
+_loaders = {"lxml": _load_lxml, "stdlib": _load_stdlib}
+
+def available_backends():
+    """Return the names of the XML backends that can be used, fastest first."""
+    names = []
+    for name, loader in _loaders.items():
+        try:
+            loader()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+def use(name):
+    """Switch to the XML backend with the given name ("lxml" or "stdlib").
+
+    Trees parsed with one backend can't be mixed with elements of another,
+    so this should only be called before any XML is read.
+    """
+    global backend, _etree
+    if name not in _loaders:
+        raise ValueError("Unknown XML backend '{}'".format(name))
+    try:
+        _etree = _loaders[name]()
+    except ImportError:
+        raise RuntimeError("The {} XML backend requires the lxml module".format(name))
+    backend = name
+
+def _default_backend():
+    requested = os.environ.get("UML2LATEX_XML")
+    if requested:
+        return requested
+    return available_backends()[0]
+
+backend = None
+_etree = None
+use(_default_backend())
+
+def register_namespace(prefix, uri):
+    """Register the prefix new elements in the given namespace are written with."""
+    _etree.register_namespace(prefix, uri)
+
+def parse(file):
+    """Parse an XML document from a binary file object and return its tree."""
+    if backend == "lxml":
+        return _etree.parse(file, _etree.XMLParser(huge_tree=True))
+    return _etree.parse(file)
+
+def sub_element(parent, tag, attrib=None):
+    """Append a new element with the given tag and attributes to parent and return it."""
+    return _etree.SubElement(parent, tag, attrib or {})
+
+def is_element(el):
+    """Return whether the given node is an element (lxml also yields comments and processing instructions)."""
+    return isinstance(el.tag, str)
+
+def tostring(el):
+    """Serialize a single element (without its tail text) to bytes."""
+    if backend == "lxml":
+        return _etree.tostring(el, with_tail=False)
+    return _etree.tostring(el)
+
+def _canonical_parts(el, parts):
+    parts.append(el.tag)
+    if el.attrib:
+        for item in sorted(el.attrib.items()):
+            parts.extend(item)
+    parts.append("\x01")
+    parts.append((el.text or "").strip())
+    for child in el:
+        if is_element(child):
+            _canonical_parts(child, parts)
+    parts.append("\x02")
+
+def canonical(el):
+    """Return bytes describing an element and its descendants the same way with every backend.
+
+    Unlike tostring, the result doesn't depend on how the backend serializes XML
+    (attribute order, namespace prefixes, quoting, whitespace), so it can be used in digests
+    that are shared between machines with different backends.
+    It covers the tags, attributes and (stripped) text of all elements, but no comments or tails.
+    The parts are separated by control characters, which can't occur in XML 1.0 documents.
+    """
+    parts = []
+    _canonical_parts(el, parts)
+    return "\x00".join(parts).encode("utf-8")
+
+def write(tree, file):
+    """Write a whole tree with an XML declaration to a binary file object."""
+    tree.write(file, xml_declaration=True, encoding="utf-8")